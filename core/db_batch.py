@@ -0,0 +1,260 @@
+# core/db_batch.py
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from core.supabase_client import supabase
+from core.db_retry import retry_standard, retry_patient, retry_critical
+from core.db_query import STREAM_PAGE_SIZE, apply_filters, stream_query
+
+
+# PostgREST đưa in_() lên query string nên mỗi lô giữ ở mức vài trăm giá trị
+IN_CHUNK_SIZE = 200
+UPSERT_CHUNK_SIZE = 500
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Chia danh sách thành các lô có kích thước tối đa `size`"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unique_keys(values: Iterable) -> List[str]:
+    """Loại bỏ giá trị rỗng / trùng, giữ nguyên thứ tự xuất hiện"""
+    seen = set()
+    result = []
+    for value in values:
+        if value is None:
+            continue
+        key = str(value).strip()
+        if key and key not in seen:
+            seen.add(key)
+            result.append(key)
+    return result
+
+
+@retry_standard
+def _select_in(table: str, columns: str, key: str, values: List[str]) -> List[Dict]:
+    res = supabase.table(table)\
+        .select(columns)\
+        .in_(key, values)\
+        .execute()
+    return res.data or []
+
+
+def fetch_by_keys(
+    table: str,
+    key: str,
+    values: Iterable,
+    columns: str = "*",
+    chunk_size: int = IN_CHUNK_SIZE
+) -> Dict[str, Dict]:
+    """
+    Lấy các bản ghi theo danh sách khóa bằng các lô in_()
+    Returns: {str(khóa): bản ghi}
+    """
+    found = {}
+    for chunk in chunked(unique_keys(values), chunk_size):
+        for row in _select_in(table, columns, key, chunk):
+            found[str(row.get(key))] = row
+    return found
+
+
+def fetch_in_order(
+    table: str,
+    key: str,
+    values: Iterable,
+    columns: str = "*",
+    chunk_size: int = IN_CHUNK_SIZE
+) -> List[Dict]:
+    """
+    Như fetch_by_keys nhưng trả danh sách theo đúng thứ tự `values` (VD thứ tự chọn trên màn hình),
+    bỏ qua khóa không tồn tại. `columns` phải có cột `key`.
+    """
+    keys = unique_keys(values)
+    found = fetch_by_keys(table, key, keys, columns, chunk_size)
+    return [found[k] for k in keys if k in found]
+
+
+@retry_patient
+def _upsert_chunk(table: str, records: List[Dict], on_conflict: str) -> List[Dict]:
+    res = supabase.table(table)\
+        .upsert(records, on_conflict=on_conflict)\
+        .execute()
+    return res.data or []
+
+
+def _write_chunks(write_fn, records: List[Dict], chunk_size: int) -> Tuple[int, List[Tuple[int, str]]]:
+    success_count = 0
+    failures = []
+
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+
+        try:
+            write_fn(chunk)
+            success_count += len(chunk)
+            continue
+        except Exception:
+            pass
+
+        for offset, record in enumerate(chunk):
+            try:
+                write_fn([record])
+                success_count += 1
+            except Exception as e:
+                failures.append((start + offset, str(e)))
+
+    return success_count, failures
+
+
+def bulk_upsert(
+    table: str,
+    records: List[Dict],
+    on_conflict: str,
+    chunk_size: int = UPSERT_CHUNK_SIZE
+) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Upsert theo lô. Lô nào lỗi (sau khi đã retry) sẽ được gửi lại từng bản ghi
+    để xác định chính xác dòng lỗi.
+
+    Returns:
+        (số_bản_ghi_thành_công, [(vị_trí_trong_records, thông_báo_lỗi)])
+    """
+    return _write_chunks(
+        lambda chunk: _upsert_chunk(table, chunk, on_conflict), records, chunk_size
+    )
+
+
+@retry_patient
+def _insert_chunk(table: str, records: List[Dict]) -> List[Dict]:
+    res = supabase.table(table)\
+        .insert(records)\
+        .execute()
+    return res.data or []
+
+
+def bulk_insert(
+    table: str,
+    records: List[Dict],
+    chunk_size: int = UPSERT_CHUNK_SIZE
+) -> Tuple[int, List[Tuple[int, str]]]:
+    """Insert theo lô, cùng cách xử lý lỗi như bulk_upsert"""
+    return _write_chunks(
+        lambda chunk: _insert_chunk(table, chunk), records, chunk_size
+    )
+
+
+@retry_patient
+def _update_in_chunk(table: str, key: str, values: List[str], payload: Dict) -> List[Dict]:
+    supabase.table(table)\
+        .update(payload)\
+        .in_(key, values)\
+        .execute()
+
+    verify = supabase.table(table)\
+        .select(key)\
+        .in_(key, values)\
+        .execute()
+    return verify.data or []
+
+
+def bulk_update_by_keys(
+    table: str,
+    key: str,
+    values: Iterable,
+    payload: Dict,
+    chunk_size: int = IN_CHUNK_SIZE
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Áp dụng cùng một payload cho nhiều bản ghi: mỗi lô 1 update().in_()
+    và 1 select đọc lại để verify. Lô lỗi chỉ retry riêng lô đó.
+
+    Returns:
+        (các_khóa_đã_verify, [(khóa, thông_báo_lỗi)])
+    """
+    updated = []
+    errors = []
+
+    for chunk in chunked(unique_keys(values), chunk_size):
+        try:
+            rows = _update_in_chunk(table, key, chunk, payload)
+        except Exception as e:
+            errors.extend((value, str(e)) for value in chunk)
+            continue
+
+        found = {str(row.get(key)) for row in rows}
+        for value in chunk:
+            if value in found:
+                updated.append(value)
+            else:
+                errors.append((value, "Không verify được"))
+
+    return updated, errors
+
+
+@retry_critical
+def _delete_in_chunk(table: str, key: str, values: List[str]) -> None:
+    supabase.table(table)\
+        .delete()\
+        .in_(key, values)\
+        .execute()
+
+
+def bulk_delete_by_keys(
+    table: str,
+    key: str,
+    values: Iterable,
+    chunk_size: int = IN_CHUNK_SIZE
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Xóa nhiều bản ghi: mỗi lô 1 select in_() kiểm tra tồn tại
+    và 1 delete().in_(). Lô lỗi chỉ retry riêng lô đó.
+
+    Returns:
+        (các_khóa_đã_xóa, [(khóa, thông_báo_lỗi)])
+    """
+    deleted = []
+    errors = []
+
+    for chunk in chunked(unique_keys(values), chunk_size):
+        try:
+            existing = {str(row.get(key)) for row in _select_in(table, key, key, chunk)}
+        except Exception as e:
+            errors.extend((value, str(e)) for value in chunk)
+            continue
+
+        to_delete = [value for value in chunk if value in existing]
+        errors.extend((value, "Không tồn tại") for value in chunk if value not in existing)
+
+        if not to_delete:
+            continue
+
+        try:
+            _delete_in_chunk(table, key, to_delete)
+            deleted.extend(to_delete)
+        except Exception as e:
+            errors.extend((value, str(e)) for value in to_delete)
+
+    return deleted, errors
+
+
+def stream_table(
+    table: str,
+    columns: str = "*",
+    spec: list = None,
+    keys: Sequence[str] = ("id",),
+    page_size: int = STREAM_PAGE_SIZE,
+    desc: bool = False
+) -> Iterator[Dict]:
+    """
+    Duyệt toàn bộ các dòng khớp filter spec theo keyset (xem stream_query)
+    VD: for row in stream_table("lich_truc", "id, ngay_truc", spec, keys=("ngay_truc", "id")): ...
+    """
+    def make_query():
+        return apply_filters(supabase.table(table).select(columns), spec or [])
+
+    return stream_query(make_query, keys=keys, page_size=page_size, desc=desc)
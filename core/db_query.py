@@ -0,0 +1,171 @@
+# core/db_query.py
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from core.db_retry import retry_standard
+
+
+# Cách PostgREST đếm tổng số dòng khi select(..., count=...):
+# - exact: COUNT(*) chính xác, đắt trên bảng lớn
+# - planned: lấy từ thống kê của query planner, gần như miễn phí
+# - estimated: exact khi ít dòng, planned khi vượt ngưỡng db-max-rows
+COUNT_EXACT = "exact"
+COUNT_PLANNED = "planned"
+COUNT_ESTIMATED = "estimated"
+
+
+def page_range(page: int, page_size: int) -> Tuple[int, int]:
+    """Trả về (start, end) cho .range() - trang bắt đầu từ 1"""
+    start = (max(page, 1) - 1) * page_size
+    return start, start + page_size - 1
+
+
+def execute_paged(query, page: int, page_size: int) -> Tuple[List[Dict], int]:
+    """
+    Thực thi query đã select(..., count=...) cho một trang.
+    Dòng dữ liệu và tổng số được trả về trong cùng một request.
+
+    Returns:
+        (rows, total) - total = 0 nếu query không yêu cầu count
+    """
+    start, end = page_range(page, page_size)
+    res = query.range(start, end).execute()
+    return res.data or [], res.count or 0
+
+
+def count_mode(count: Optional[str]) -> Optional[str]:
+    """Chuẩn hóa tham số count (None = không đếm)"""
+    if count in (COUNT_EXACT, COUNT_PLANNED, COUNT_ESTIMATED):
+        return count
+    if count:
+        raise ValueError(f"Kiểu count không hợp lệ: {count}")
+    return None
+
+
+# ===================== FILTER SPEC =====================
+# Bộ lọc khai báo dạng list[(cột, toán_tử, giá_trị)]:
+#   eq / neq / gt / gte / lt / lte  - so sánh
+#   ilike                           - khớp không phân biệt hoa thường (giữ nguyên pattern)
+#   prefix                          - ilike 'x%'  (dùng được index)
+#   contains                        - ilike '%x%'
+#   in                              - giá trị thuộc danh sách
+#   or                              - cột = None, giá trị là list điều kiện con (any_of)
+_COMPARE_OPS = {"eq", "neq", "gt", "gte", "lt", "lte"}
+_PATTERN_OPS = {"ilike", "prefix", "contains"}
+_OR_RESERVED = set(',()"\\')
+
+
+def any_of(conditions) -> tuple:
+    """Nhóm điều kiện OR: any_of([("a", "eq", 1), ("b", "contains", "x")])"""
+    return (None, "or", tuple(conditions))
+
+
+def _pattern(op: str, value) -> str:
+    value = str(value)
+    if op == "prefix":
+        return f"{value}%"
+    if op == "contains":
+        return f"%{value}%"
+    return value
+
+
+def _or_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    text = str(value)
+    if any(ch in _OR_RESERVED for ch in text):
+        text = text.replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{text}"'
+    return text
+
+
+def _or_condition(condition: tuple) -> str:
+    column, op, value = condition
+    if op in _PATTERN_OPS:
+        return f"{column}.ilike.{_or_value(_pattern(op, value))}"
+    if op in _COMPARE_OPS:
+        return f"{column}.{op}.{_or_value(value)}"
+    raise ValueError(f"Toán tử không hỗ trợ trong OR: {op}")
+
+
+def apply_filters(query, spec: list):
+    """Biên dịch filter spec thành chuỗi filter PostgREST trên query"""
+    for column, op, value in spec:
+        if op == "or":
+            if value:
+                query = query.or_(",".join(_or_condition(c) for c in value))
+        elif op in _PATTERN_OPS:
+            query = query.ilike(column, _pattern(op, value))
+        elif op in _COMPARE_OPS:
+            query = getattr(query, op)(column, value)
+        elif op == "in":
+            query = query.in_(column, list(value))
+        else:
+            raise ValueError(f"Toán tử không hỗ trợ: {op}")
+    return query
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def spec_key(spec: list) -> tuple:
+    """Khóa chuẩn hóa (hashable) của filter spec - dùng cho cache / prefetch"""
+    return tuple(sorted(
+        ((column or "", op, _freeze(value)) for column, op, value in spec),
+        key=repr
+    ))
+
+
+# ===================== KEYSET STREAMING =====================
+# Đọc hết một tập kết quả lớn theo từng trang cố định bằng keyset (WHERE key > key_cuối)
+# thay vì offset: không bị giới hạn db-max-rows, mỗi trang tốn như nhau, bộ nhớ phẳng.
+STREAM_PAGE_SIZE = 1000
+
+
+def keyset_after(keys: Sequence[str], row: Dict, desc: bool = False) -> str:
+    """
+    Điều kiện or=(...) của PostgREST cho (k1, k2, ...) > (v1, v2, ...) (desc -> <)
+    VD: ("ngay_truc", "id") -> "ngay_truc.gt.X,and(ngay_truc.eq.X,id.gt.Y)"
+    """
+    op = "lt" if desc else "gt"
+    parts = []
+    for i, key in enumerate(keys):
+        conditions = [f"{k}.eq.{_or_value(row[k])}" for k in keys[:i]]
+        conditions.append(f"{key}.{op}.{_or_value(row[key])}")
+        parts.append(conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})")
+    return ",".join(parts)
+
+
+@retry_standard
+def _execute_page(query) -> List[Dict]:
+    return query.execute().data or []
+
+
+def stream_query(
+    make_query: Callable,
+    keys: Sequence[str] = ("id",),
+    page_size: int = STREAM_PAGE_SIZE,
+    desc: bool = False
+) -> Iterator[Dict]:
+    """
+    Generator trả từng dòng của query, đọc theo trang keyset.
+
+    make_query(): tạo query mới đã select(...) + lọc, chưa order/range.
+    keys: cột sắp xếp - phải NOT NULL, có trong select, và cột cuối là duy nhất (VD id).
+    """
+    last = None
+    while True:
+        query = make_query()
+        if last is not None:
+            query = query.or_(keyset_after(keys, last, desc))
+        for key in keys:
+            query = query.order(key, desc=desc)
+        rows = _execute_page(query.limit(page_size))
+
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
@@ -0,0 +1,188 @@
+# core/query_cache.py
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+DEFAULT_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL", "60"))
+DEFAULT_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+def _estimate_size(value: Any) -> int:
+    """Ước lượng số byte của kết quả query (list[dict] / tuple / số)"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _copy_result(value: Any) -> Any:
+    """Sao chép nông list/dict để caller sửa kết quả không làm hỏng cache"""
+    if isinstance(value, tuple):
+        return tuple(_copy_result(v) for v in value)
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, dict) else v for v in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class QueryCache:
+    """
+    Cache kết quả list/count query trong process.
+    - LRU theo ngân sách byte + TTL cho từng entry
+    - Khóa luôn bắt đầu bằng tên bảng để invalidate theo bảng khi có ghi
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def version(self, table: str) -> int:
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: tuple, value: Any, version: Optional[int] = None) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # Kết quả đọc xong sau khi bảng vừa bị ghi -> bỏ, tránh cache dữ liệu cũ
+            if version is not None and version != self._versions.get(key[0], 0):
+                return
+
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_table(self, table: str) -> int:
+        """Xóa mọi entry của bảng. Returns: số entry bị xóa"""
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            keys = [key for key in self._entries if key[0] == table]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += 1
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _drop(self, key: tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+query_cache = QueryCache()
+
+
+def cached_query(table: str) -> Callable:
+    """
+    Cache kết quả hàm đọc theo (bảng, tên hàm, tham số đã chuẩn hóa).
+    Tham số gồm bộ lọc + page + page_size nên mỗi trang là 1 entry.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (table, func.__name__, _freeze(dict(bound.arguments)))
+
+            found, value = query_cache.get(key)
+            if found:
+                return _copy_result(value)
+
+            version = query_cache.version(table)
+            value = func(*args, **kwargs)
+            query_cache.set(key, _copy_result(value), version=version)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def invalidates(*tables: str) -> Callable:
+    """Đánh dấu hàm ghi: sau khi chạy xong (kể cả lỗi giữa chừng) xóa cache các bảng"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for table in tables:
+                    query_cache.invalidate_table(table)
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+-- Mốc thay đổi cho doan_vien_k74_k75 theo giờ server, dùng bởi services/student_index.py.
+-- BẮT BUỘC khi bật STUDENT_LOCAL_INDEX=1:
+-- - updated_at: trigger gán now() mỗi lần thêm / sửa (app không tự gán) -> đồng bộ tăng dần
+-- - doan_vien_k74_k75_xoa: ghi lại mỗi lần xóa -> phát hiện xóa kể cả khi tổng số dòng không đổi
+
+alter table doan_vien_k74_k75
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function doan_vien_set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists trg_doan_vien_updated_at on doan_vien_k74_k75;
+create trigger trg_doan_vien_updated_at
+before insert or update on doan_vien_k74_k75
+for each row execute function doan_vien_set_updated_at();
+
+create index if not exists idx_doan_vien_updated_at on doan_vien_k74_k75 (updated_at, mssv);
+
+create table if not exists doan_vien_k74_k75_xoa (
+    mssv text not null,
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists idx_doan_vien_xoa_deleted_at on doan_vien_k74_k75_xoa (deleted_at);
+
+create or replace function doan_vien_log_delete()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into doan_vien_k74_k75_xoa (mssv) values (old.mssv);
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_doan_vien_xoa on doan_vien_k74_k75;
+create trigger trg_doan_vien_xoa
+after delete on doan_vien_k74_k75
+for each row execute function doan_vien_log_delete();
+
+grant select on doan_vien_k74_k75_xoa to anon, authenticated;
@@ -0,0 +1,73 @@
+-- Bảng tổng hợp số buổi trực theo (tuần, người) cho tab Thống kê (services/noi_bo_service.py).
+-- Trigger trên lich_truc cập nhật tăng dần mỗi khi thêm / sửa / xóa lịch trực.
+-- Nếu chưa tạo bảng này, app tự tổng hợp từ lich_truc (chậm hơn nhưng cùng kết quả).
+
+create table if not exists lich_truc_tuan (
+    tuan date not null,              -- Thứ 2 của tuần
+    ho_ten_key text not null,        -- họ tên chữ thường, gộp khoảng trắng
+    ho_ten text not null,            -- tên hiển thị (lần gặp đầu tiên)
+    so_buoi integer not null default 0,   -- 'Đã đăng ký' + 'Đã trực'
+    da_truc integer not null default 0,   -- 'Đã trực'
+    primary key (tuan, ho_ten_key)
+);
+
+create or replace function lich_truc_tuan_cong(p_ngay date, p_ho_ten text, p_trang_thai text, p_delta integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_key text := lower(regexp_replace(btrim(coalesce(p_ho_ten, '')), '\s+', ' ', 'g'));
+    v_tuan date := date_trunc('week', p_ngay)::date;
+begin
+    if p_ngay is null or v_key = '' or coalesce(p_trang_thai, '') not in ('Đã đăng ký', 'Đã trực') then
+        return;
+    end if;
+
+    insert into lich_truc_tuan as t (tuan, ho_ten_key, ho_ten, so_buoi, da_truc)
+    values (v_tuan, v_key, btrim(p_ho_ten), p_delta, case when p_trang_thai = 'Đã trực' then p_delta else 0 end)
+    on conflict (tuan, ho_ten_key) do update
+        set so_buoi = t.so_buoi + excluded.so_buoi,
+            da_truc = t.da_truc + excluded.da_truc;
+
+    delete from lich_truc_tuan where tuan = v_tuan and ho_ten_key = v_key and so_buoi <= 0;
+end;
+$$;
+
+create or replace function lich_truc_tuan_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform lich_truc_tuan_cong(old.ngay_truc, old.ho_ten, old.trang_thai, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform lich_truc_tuan_cong(new.ngay_truc, new.ho_ten, new.trang_thai, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_lich_truc_tuan on lich_truc;
+create trigger trg_lich_truc_tuan
+after insert or update of ngay_truc, ho_ten, trang_thai or delete on lich_truc
+for each row execute function lich_truc_tuan_trigger();
+
+-- Dựng lại toàn bộ từ lich_truc (chạy 1 lần sau khi tạo bảng)
+truncate lich_truc_tuan;
+insert into lich_truc_tuan (tuan, ho_ten_key, ho_ten, so_buoi, da_truc)
+select
+    date_trunc('week', ngay_truc)::date,
+    lower(regexp_replace(btrim(ho_ten), '\s+', ' ', 'g')),
+    min(btrim(ho_ten)),
+    count(*),
+    count(*) filter (where trang_thai = 'Đã trực')
+from lich_truc
+where ngay_truc is not null
+  and coalesce(btrim(ho_ten), '') <> ''
+  and trang_thai in ('Đã đăng ký', 'Đã trực')
+group by 1, 2;
+
+grant select on lich_truc_tuan to anon, authenticated;
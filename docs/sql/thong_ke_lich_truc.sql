@@ -0,0 +1,36 @@
+-- Thống kê lịch trực gom nhóm ngay trong DB (dùng bởi services/noi_bo_service.py).
+-- Trả về vài chục dòng đếm thay vì toàn bộ lich_truc của tháng.
+-- Nếu chưa tạo các hàm này, app tự đếm bằng count='exact' / đọc theo trang.
+
+create or replace function thong_ke_lich_truc_trang_thai(tu_ngay date, den_ngay date)
+returns table (trang_thai text, so_ca bigint)
+language sql
+stable
+as $$
+    select lt.trang_thai, count(*)
+    from lich_truc lt
+    where lt.ngay_truc >= tu_ngay and lt.ngay_truc < den_ngay
+    group by lt.trang_thai;
+$$;
+
+create or replace function thong_ke_lich_truc_theo_nguoi(tu_ngay date, den_ngay date)
+returns table (ho_ten text, tong_ca bigint, da_hoan_thanh bigint, vang bigint)
+language sql
+stable
+as $$
+    select
+        lt.ho_ten,
+        count(*),
+        count(*) filter (where lt.trang_thai = 'Đã trực'),
+        count(*) filter (where lt.trang_thai = 'Vắng')
+    from lich_truc lt
+    where lt.ngay_truc >= tu_ngay and lt.ngay_truc < den_ngay
+      and coalesce(lt.ho_ten, '') <> ''
+    group by lt.ho_ten
+    order by lt.ho_ten;
+$$;
+
+create index if not exists idx_lich_truc_ngay_truc on lich_truc (ngay_truc);
+
+grant execute on function thong_ke_lich_truc_trang_thai(date, date) to anon, authenticated;
+grant execute on function thong_ke_lich_truc_theo_nguoi(date, date) to anon, authenticated;
@@ -0,0 +1,14 @@
+-- Tra nhiều tên cán bộ trong 1 lần gọi (dùng bởi services/sync_google_sheet.py).
+-- Bọc hàm tim_can_bo_theo_ten(search_name) sẵn có để giữ nguyên logic so khớp.
+-- Nếu chưa tạo hàm này, app tự gọi tim_can_bo_theo_ten từng tên.
+
+create or replace function tim_can_bo_theo_ten_nhieu(search_names text[])
+returns table (search_name text, can_bo_id text)
+language sql
+stable
+as $$
+    select n, tim_can_bo_theo_ten(n)::text
+    from unnest(search_names) as n;
+$$;
+
+grant execute on function tim_can_bo_theo_ten_nhieu(text[]) to anon, authenticated;
@@ -1,52 +1,66 @@
 # services/classes_service.py
 from core.supabase_client import supabase
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from core.db_retry import retry_standard, retry_patient, retry_critical
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, apply_filters
+from core.db_batch import fetch_in_order
 
 
-@retry_standard
 def fetch_classes(
     search: str = "",
     page: int = 1,
     page_size: int = 100,
     trang_thai: str = ""
 ) -> List[Dict]:
+    data, _ = fetch_classes_page(
+        search=search, page=page, page_size=page_size,
+        trang_thai=trang_thai, count=None
+    )
+    return data
+
+
+@cached_query("lop_k76")
+@retry_standard
+def fetch_classes_page(
+    search: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    trang_thai: str = "",
+    count: str = COUNT_EXACT
+) -> Tuple[List[Dict], int]:
     query = supabase.table("lop_k76").select(
         "id, chi_doan, si_so, doan_phi, hoi_phi, tien_da_nop, "
-        "so_luong_da_ky, trang_thai_so, vi_tri_luu_so, ghi_chu"
+        "so_luong_da_ky, trang_thai_so, vi_tri_luu_so, ghi_chu",
+        count=count_mode(count)
     )
+    query = apply_filters(query, classes_filter_spec(search, trang_thai))
     
-    if search:
-        query = query.ilike("chi_doan", f"%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai_so", trang_thai)
-    
-    start = (page - 1) * page_size
-    end = start + page_size - 1
-    
-    res = query.order("chi_doan").range(start, end).execute()
-    
-    return res.data or []
+    return execute_paged(query.order("chi_doan"), page, page_size)
 
 
+@cached_query("lop_k76")
 @retry_standard
 def count_classes(
     search: str = "",
     trang_thai: str = ""
 ) -> int:
     query = supabase.table("lop_k76").select("id", count="exact")
-    
-    if search:
-        query = query.ilike("chi_doan", f"%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai_so", trang_thai)
+    query = apply_filters(query, classes_filter_spec(search, trang_thai))
     
     res = query.execute()
     return res.count or 0
 
 
+def classes_filter_spec(search: str = "", trang_thai: str = "") -> list:
+    spec = []
+    if search:
+        spec.append(("chi_doan", "contains", search))
+    if trang_thai:
+        spec.append(("trang_thai_so", "eq", trang_thai))
+    return spec
+
+
 @retry_standard
 def get_class_by_id(class_id: str) -> Optional[Dict]:
     res = supabase.table("lop_k76")\
@@ -68,6 +82,7 @@ def get_class_by_chi_doan(chi_doan: str) -> Optional[Dict]:
     return res.data[0] if res.data else None
 
 
+@invalidates("lop_k76")
 @retry_patient
 def update_class(class_id: str, data: Dict) -> Dict:
     validated_data = _validate_class_data(data)
@@ -83,6 +98,7 @@ def update_class(class_id: str, data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates("lop_k76")
 @retry_patient
 def bulk_update_classes(class_ids: List[str], data: Dict) -> int:
     if not class_ids:
@@ -112,6 +128,7 @@ def bulk_update_classes(class_ids: List[str], data: Dict) -> int:
     return success_count
 
 
+@invalidates("lop_k76")
 @retry_patient
 def create_class(data: Dict) -> Dict:
     if "chi_doan" not in data or not data["chi_doan"]:
@@ -131,6 +148,7 @@ def create_class(data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates("lop_k76")
 @retry_critical
 def delete_class(class_id: str) -> bool:
     res = supabase.table("lop_k76").delete().eq("id", class_id).execute()
@@ -203,17 +221,9 @@ def _validate_class_data(data: Dict, is_create: bool = False) -> Dict:
     return validated
 
 
-@retry_standard
-def get_classes_by_ids(class_ids: List[str]) -> List[Dict]:
-    if not class_ids:
-        return []
-    
-    res = supabase.table("lop_k76")\
-        .select("*")\
-        .in_("id", class_ids)\
-        .execute()
-    
-    return res.data or []
+def get_classes_by_ids(class_ids: List[str], columns: str = "*") -> List[Dict]:
+    """Lấy lớp theo lô in_(), giữ thứ tự class_ids (columns phải có id)"""
+    return fetch_in_order("lop_k76", "id", class_ids, columns)
 
 
 @retry_standard
@@ -242,11 +252,16 @@ def search_classes_advanced(
     
     return res.data or []
 
+VALID_TRANG_THAI_SO = ["Chưa tiếp nhận", "Đang lưu VP", "Đã tiếp nhận"]
+
+
+@invalidates("lop_k76")
 @retry_patient
 def import_classes(file_bytes: bytes) -> tuple[int, list[str]]:
     """Import classes từ Excel file"""
     import pandas as pd
     from io import BytesIO
+    from utils.excel import normalize_frame, format_errors, text_series, TEXT, INT, FLOAT
     
     errors = []
     success_count = 0
@@ -260,59 +275,41 @@ def import_classes(file_bytes: bytes) -> tuple[int, list[str]]:
         if missing_cols:
             raise ValueError(f"Thiếu cột bắt buộc: {', '.join(missing_cols)}")
         
-        # Process each row
-        for idx, row in df.iterrows():
+        # Làm sạch + ép kiểu theo cột cho cả file
+        records, error_table = normalize_frame(df, {
+            "chi_doan": (TEXT, ""),
+            "si_so": (INT, 0),
+            "so_luong_da_ky": (INT, 0),
+            "doan_phi": (FLOAT, 0.0),
+            "hoi_phi": (FLOAT, 0.0),
+            "tien_da_nop": (FLOAT, 0.0),
+            # Trạng thái không hợp lệ -> "Chưa tiếp nhận"
+            "trang_thai_so": (
+                lambda s: text_series(s, "Chưa tiếp nhận").where(
+                    lambda t: t.isin(VALID_TRANG_THAI_SO), "Chưa tiếp nhận"
+                ),
+                "Chưa tiếp nhận"
+            ),
+            "vi_tri_luu_so": (TEXT, ""),
+            "ghi_chu": (TEXT, ""),
+        }, [("chi_doan", "Dòng {row}: Thiếu chi đoàn")])
+        errors.extend(format_errors(error_table))
+        
+        for row_num, payload in records:
             try:
-                chi_doan = str(row.get("chi_doan", "")).strip()
-                if not chi_doan:
-                    errors.append(f"Dòng {idx + 2}: Thiếu chi đoàn")
-                    continue
+                chi_doan = payload["chi_doan"]
                 
                 # Check if already exists
                 existing = get_class_by_chi_doan(chi_doan)
                 if existing:
-                    errors.append(f"Dòng {idx + 2}: Chi đoàn '{chi_doan}' đã tồn tại")
+                    errors.append(f"Dòng {row_num}: Chi đoàn '{chi_doan}' đã tồn tại")
                     continue
                 
-                # Parse numeric fields
-                def safe_int(val, default=0):
-                    try:
-                        return int(val) if pd.notna(val) and str(val).strip() else default
-                    except:
-                        return default
-                
-                def safe_float(val, default=0.0):
-                    try:
-                        return float(val) if pd.notna(val) and str(val).strip() else default
-                    except:
-                        return default
-                
-                def safe_str(val, default=""):
-                    return str(val).strip() if pd.notna(val) else default
-                
-                # Build payload
-                payload = {
-                    "chi_doan": chi_doan,
-                    "si_so": safe_int(row.get("si_so")),
-                    "so_luong_da_ky": safe_int(row.get("so_luong_da_ky")),
-                    "doan_phi": safe_float(row.get("doan_phi")),
-                    "hoi_phi": safe_float(row.get("hoi_phi")),
-                    "tien_da_nop": safe_float(row.get("tien_da_nop")),
-                    "trang_thai_so": safe_str(row.get("trang_thai_so"), "Chưa tiếp nhận"),
-                    "vi_tri_luu_so": safe_str(row.get("vi_tri_luu_so")),
-                    "ghi_chu": safe_str(row.get("ghi_chu")),
-                }
-                
-                # Validate trang_thai_so
-                valid_statuses = ["Chưa tiếp nhận", "Đang lưu VP", "Đã tiếp nhận"]
-                if payload["trang_thai_so"] not in valid_statuses:
-                    payload["trang_thai_so"] = "Chưa tiếp nhận"
-                
                 create_class(payload)
                 success_count += 1
                 
             except Exception as e:
-                errors.append(f"Dòng {idx + 2}: {str(e)}")
+                errors.append(f"Dòng {row_num}: {str(e)}")
         
         return success_count, errors
         
@@ -329,8 +326,12 @@ def export_classes(class_ids: List[str]) -> bytes:
     if not class_ids:
         raise ValueError("Danh sách class_ids rỗng")
     
-    # Fetch classes data
-    classes = get_classes_by_ids(class_ids)
+    # Fetch classes data (chỉ các cột export, đúng thứ tự đã chọn)
+    classes = get_classes_by_ids(
+        class_ids,
+        "id, chi_doan, si_so, so_luong_da_ky, doan_phi, hoi_phi, "
+        "tien_da_nop, trang_thai_so, vi_tri_luu_so, ghi_chu"
+    )
     
     if not classes:
         raise ValueError("Không tìm thấy dữ liệu để export")
@@ -0,0 +1,207 @@
+# services/fake_sheets.py
+"""
+Giả lập Google Sheets API (spreadsheets().get, values().get / batchGet) đọc từ file JSON.
+Dùng để chạy thử và đo thời gian pipeline đồng bộ lịch trực mà không cần mạng.
+
+Định dạng file:
+{
+    "latency": 0.2,                      # (tuỳ chọn) giây chờ mỗi request
+    "sheets": {
+        "Lịch làm việc": [[...hàng 1 từ cột A...], [...hàng 2...], ...]
+    }
+}
+
+Bật trong app / scheduler: đặt biến môi trường FAKE_SHEETS_FILE=đường_dẫn.json
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+_A1_RE = re.compile(r"^([A-Z]+)(\d+)?$")
+
+
+def _col_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index - 1
+
+
+def _col_letters(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+
+def parse_a1_range(range_name: str) -> Tuple[str, int, int, Optional[int], Optional[int]]:
+    """
+    "'Lịch làm việc'!B6:F14" -> ("Lịch làm việc", hàng_đầu, cột_đầu, hàng_cuối, cột_cuối)
+    Chỉ số tính từ 0; hàng_cuối = None nghĩa là tới hết dữ liệu (VD: "A:C").
+    """
+    if "!" in range_name:
+        sheet_part, cells = range_name.rsplit("!", 1)
+    else:
+        sheet_part, cells = range_name, "A1:ZZZ"
+
+    sheet_part = sheet_part.strip()
+    if sheet_part.startswith("'") and sheet_part.endswith("'"):
+        sheet_part = sheet_part[1:-1].replace("''", "'")
+
+    start, _, end = cells.upper().partition(":")
+    end = end or start
+
+    m_start, m_end = _A1_RE.match(start), _A1_RE.match(end)
+    if not m_start or not m_end:
+        raise ValueError(f"Range không hợp lệ: {range_name}")
+
+    first_row = int(m_start.group(2)) - 1 if m_start.group(2) else 0
+    last_row = int(m_end.group(2)) - 1 if m_end.group(2) else None
+    return sheet_part, first_row, _col_index(m_start.group(1)), last_row, _col_index(m_end.group(1))
+
+
+class _Request:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0):
+        return self._fn()
+
+
+class _Values:
+    def __init__(self, owner: "FakeSheetsService"):
+        self._owner = owner
+
+    def get(self, spreadsheetId: str, range: str, **kwargs) -> _Request:
+        def run():
+            self._owner._request()
+            return {"range": range, "majorDimension": "ROWS", "values": self._owner.read(range)}
+        return _Request(run)
+
+    def batchGet(self, spreadsheetId: str, ranges: List[str], **kwargs) -> _Request:
+        def run():
+            self._owner._request()
+            return {
+                "spreadsheetId": spreadsheetId,
+                "valueRanges": [
+                    {"range": r, "majorDimension": "ROWS", "values": self._owner.read(r)}
+                    for r in ranges
+                ],
+            }
+        return _Request(run)
+
+
+class _Spreadsheets:
+    def __init__(self, owner: "FakeSheetsService"):
+        self._owner = owner
+
+    def values(self) -> _Values:
+        return _Values(self._owner)
+
+    def get(self, spreadsheetId: str, fields: str = None, **kwargs) -> _Request:
+        def run():
+            self._owner._request()
+            return {
+                "spreadsheetId": spreadsheetId,
+                "sheets": [{"properties": {"title": name}} for name in self._owner.sheets()],
+            }
+        return _Request(run)
+
+
+class FakeSheetsService:
+    """
+    Thay cho client trả về từ googleapiclient.discovery.build('sheets', 'v4').
+    File được đọc lại khi thay đổi -> sửa file giữa các lần sync như sửa sheet thật.
+    """
+
+    def __init__(self, path: str, latency: Optional[float] = None):
+        self.path = path
+        self.latency = latency
+        self.request_count = 0
+        self._data: Dict = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def spreadsheets(self) -> _Spreadsheets:
+        return _Spreadsheets(self)
+
+    def _load(self) -> Dict:
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+                self._mtime = mtime
+            return self._data
+
+    def _request(self) -> None:
+        data = self._load()
+        self.request_count += 1
+        latency = self.latency if self.latency is not None else data.get("latency", 0)
+        if latency:
+            time.sleep(latency)
+
+    def sheets(self) -> List[str]:
+        return list(self._load().get("sheets", {}).keys())
+
+    def read(self, range_name: str) -> List[List[str]]:
+        """Giống API thật: bỏ ô trống cuối hàng và hàng trống cuối range"""
+        sheet_name, first_row, first_col, last_row, last_col = parse_a1_range(range_name)
+        grid = self._load().get("sheets", {}).get(sheet_name)
+        if grid is None:
+            raise ValueError(f"Unable to parse range: {range_name}")
+
+        rows = grid[first_row:None if last_row is None else last_row + 1]
+        values = []
+        for row in rows:
+            cells = ["" if v is None else str(v) for v in row[first_col:last_col + 1]]
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+
+def write_fake_sheets(path: str, sheets: Dict[str, Dict[str, str]], latency: float = 0) -> None:
+    """
+    Tạo file giả lập từ các ô dạng {"tên tab": {"B4": "20/10", "B6": "Nguyễn Văn A - 09..."}}
+    """
+    grids = {}
+    for name, cells in sheets.items():
+        grid: List[List[str]] = []
+        for addr, value in cells.items():
+            _, row, col, _, _ = parse_a1_range(f"'{name}'!{addr}")
+            while len(grid) <= row:
+                grid.append([])
+            while len(grid[row]) <= col:
+                grid[row].append("")
+            grid[row][col] = value
+        grids[name] = grid
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"latency": latency, "sheets": grids}, f, ensure_ascii=False, indent=2)
+
+
+def snapshot_sheets(service, path: str, ranges: List[str], spreadsheet_id: str) -> None:
+    """Chụp các range của sheet thật vào file giả lập để chạy lại offline"""
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id, ranges=ranges
+    ).execute()
+
+    sheets: Dict[str, Dict[str, str]] = {}
+    for range_name, value_range in zip(ranges, result.get("valueRanges", [])):
+        sheet_name, first_row, first_col, _, _ = parse_a1_range(range_name)
+        cells = sheets.setdefault(sheet_name, {})
+        for r, row in enumerate(value_range.get("values", [])):
+            for c, value in enumerate(row):
+                if value != "":
+                    cells[f"{_col_letters(first_col + c)}{first_row + r + 1}"] = value
+
+    write_fake_sheets(path, sheets)
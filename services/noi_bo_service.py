@@ -1,11 +1,14 @@
 # services/noi_bo_service.py
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient, retry_critical
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, page_range, apply_filters, any_of
+from core.db_batch import stream_table
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Tuple
+from itertools import islice
 
 
-@retry_standard
 def fetch_can_bo_bvp_bch(
     loai: str = "",
     search: str = "",
@@ -13,51 +16,41 @@ def fetch_can_bo_bvp_bch(
     page_size: int = 100
 ) -> List[Dict]:
     """Lấy danh sách cán bộ BVP/BCH"""
+    data, _ = fetch_can_bo_bvp_bch_page(
+        loai=loai, search=search, page=page, page_size=page_size, count=None
+    )
+    return data
+
+
+@cached_query('can_bo_cap_truong')
+@retry_standard
+def fetch_can_bo_bvp_bch_page(
+    loai: str = "",
+    search: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    count: str = COUNT_EXACT
+) -> Tuple[List[Dict], int]:
+    """Lấy 1 trang cán bộ BVP/BCH kèm tổng số"""
     try:
-        query = supabase.table('can_bo_cap_truong').select('*')
-        
-        if loai:
-            query = query.eq('loai_can_bo', loai)
-        
-        if search:
-            search_term = search.strip()
-            query = query.or_(
-                f"ho_ten.ilike.%{search_term}%,"
-                f"mssv.ilike.%{search_term}%,"
-                f"sdt.ilike.%{search_term}%"
-            )
+        query = supabase.table('can_bo_cap_truong').select('*', count=count_mode(count))
+        query = apply_filters(query, can_bo_filter_spec(loai, search))
         
         query = query.order('created_at', desc=True)
         
-        start = (page - 1) * page_size
-        end = start + page_size - 1
-        query = query.range(start, end)
-        
-        response = query.execute()
-        data = response.data or []
-        
-        return data
+        return execute_paged(query, page, page_size)
         
     except Exception as ex:
         raise Exception(f"Lỗi lấy danh sách cán bộ: {str(ex)}")
 
 
+@cached_query('can_bo_cap_truong')
 @retry_standard
 def count_can_bo_bvp_bch(loai: str = "", search: str = "") -> int:
     """Đếm số lượng cán bộ"""
     try:
         query = supabase.table('can_bo_cap_truong').select('id', count='exact')
-        
-        if loai:
-            query = query.eq('loai_can_bo', loai)
-        
-        if search:
-            search_term = search.strip()
-            query = query.or_(
-                f"ho_ten.ilike.%{search_term}%,"
-                f"mssv.ilike.%{search_term}%,"
-                f"sdt.ilike.%{search_term}%"
-            )
+        query = apply_filters(query, can_bo_filter_spec(loai, search))
         
         response = query.execute()
         count = response.count or 0
@@ -68,6 +61,22 @@ def count_can_bo_bvp_bch(loai: str = "", search: str = "") -> int:
         raise Exception(f"Lỗi đếm cán bộ: {str(ex)}")
 
 
+def can_bo_filter_spec(loai: str = "", search: str = "") -> List:
+    """Bộ lọc danh sách cán bộ BVP/BCH"""
+    spec = []
+    if loai:
+        spec.append(('loai_can_bo', 'eq', loai))
+    
+    search_term = (search or "").strip()
+    if search_term:
+        spec.append(any_of([
+            ('ho_ten', 'contains', search_term),
+            ('mssv', 'contains', search_term),
+            ('sdt', 'contains', search_term),
+        ]))
+    return spec
+
+
 @retry_standard
 def get_can_bo_by_id(can_bo_id: str) -> Optional[Dict]:
     """Lấy 1 cán bộ theo ID"""
@@ -83,6 +92,7 @@ def get_can_bo_by_id(can_bo_id: str) -> Optional[Dict]:
         raise Exception(f"Lỗi lấy thông tin cán bộ: {str(ex)}")
 
 
+@invalidates('can_bo_cap_truong')
 @retry_patient
 def create_can_bo(data: Dict) -> Dict:
     """Tạo cán bộ mới"""
@@ -96,6 +106,7 @@ def create_can_bo(data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates('can_bo_cap_truong')
 @retry_patient
 def update_can_bo(can_bo_id: str, data: Dict) -> Dict:
     """Cập nhật thông tin cán bộ"""
@@ -112,6 +123,7 @@ def update_can_bo(can_bo_id: str, data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates('can_bo_cap_truong')
 @retry_critical
 def delete_can_bo(can_bo_id: str) -> bool:
     """Xóa cán bộ"""
@@ -126,6 +138,7 @@ def delete_can_bo(can_bo_id: str) -> bool:
     return True
 
 
+@invalidates('can_bo_cap_truong')
 @retry_patient
 def bulk_update_can_bo(can_bo_ids: List[str], data: Dict) -> int:
     """Cập nhật hàng loạt cán bộ"""
@@ -153,7 +166,6 @@ def bulk_update_can_bo(can_bo_ids: List[str], data: Dict) -> int:
     return success_count
 
 
-@retry_standard
 def fetch_lich_truc(
     ca_truc: str = "",
     trang_thai: str = "",
@@ -163,34 +175,42 @@ def fetch_lich_truc(
     page_size: int = 100
 ) -> List[Dict]:
     """Lấy danh sách lịch trực"""
+    data, _ = fetch_lich_truc_page(
+        ca_truc=ca_truc, trang_thai=trang_thai, tu_ngay=tu_ngay, den_ngay=den_ngay,
+        page=page, page_size=page_size, count=None
+    )
+    return data
+
+
+@cached_query('lich_truc')
+@retry_standard
+def fetch_lich_truc_page(
+    ca_truc: str = "",
+    trang_thai: str = "",
+    tu_ngay: str = "",
+    den_ngay: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    count: str = COUNT_EXACT
+) -> Tuple[List[Dict], int]:
+    """Lấy 1 trang lịch trực kèm tổng số"""
     try:
-        query = supabase.table('lich_truc').select('*')
-        
-        if ca_truc:
-            query = query.eq('ca_truc', ca_truc)
-        
-        if trang_thai:
-            query = query.eq('trang_thai', trang_thai)
-        
-        if tu_ngay:
-            query = query.gte('ngay_truc', tu_ngay)
-        
-        if den_ngay:
-            query = query.lte('ngay_truc', den_ngay)
+        query = supabase.table('lich_truc').select('*', count=count_mode(count))
+        query = apply_filters(query, lich_truc_filter_spec(ca_truc, trang_thai, tu_ngay, den_ngay))
         
         query = query.order('ngay_truc', desc=True).order('ca_truc')
         
-        start = (page - 1) * page_size
-        end = start + page_size - 1
-        query = query.range(start, end)
-        
-        response = query.execute()
-        data = response.data or []
-        
-        return data
+        return execute_paged(query, page, page_size)
         
     except Exception as ex:
-        return _fetch_lich_truc_with_python_filter(ca_truc, trang_thai, tu_ngay, den_ngay, page, page_size)
+        # Chỉ giữ các dòng của trang cần lấy, phần còn lại chỉ đếm
+        start, end = page_range(page, page_size)
+        rows, total = [], 0
+        for record in _filter_lich_truc_in_python(ca_truc, trang_thai, tu_ngay, den_ngay):
+            if start <= total <= end:
+                rows.append(record)
+            total += 1
+        return rows, total
 
 
 def _fetch_lich_truc_with_python_filter(
@@ -202,43 +222,45 @@ def _fetch_lich_truc_with_python_filter(
     page_size: int
 ) -> List[Dict]:
     """Fallback: Filter dates in Python if Supabase date filter fails"""
+    start = (page - 1) * page_size
+    return list(islice(
+        _filter_lich_truc_in_python(ca_truc, trang_thai, tu_ngay, den_ngay),
+        start, start + page_size
+    ))
+
+
+def _filter_lich_truc_in_python(
+    ca_truc: str,
+    trang_thai: str,
+    tu_ngay: str,
+    den_ngay: str
+) -> Iterator[Dict]:
+    """
+    Duyệt lich_truc theo keyset (ngay_truc, id) mới nhất trước, lọc ngày trong Python.
+    Không giới hạn 1000 dòng, bộ nhớ không tăng theo kích thước bảng.
+    """
     try:
-        query = supabase.table('lich_truc').select('*')
-        
-        if ca_truc:
-            query = query.eq('ca_truc', ca_truc)
-        
-        if trang_thai:
-            query = query.eq('trang_thai', trang_thai)
-        
-        query = query.order('ngay_truc', desc=True).order('ca_truc')
-        query = query.range(0, 999)
-        
-        response = query.execute()
-        all_data = response.data or []
-        
-        filtered_data = []
-        for record in all_data:
+        records = stream_table(
+            'lich_truc', '*', lich_truc_filter_spec(ca_truc, trang_thai),
+            keys=('ngay_truc', 'id'), desc=True
+        )
+        for record in records:
             ngay_str = str(record.get('ngay_truc', ''))
             if not ngay_str:
                 continue
             
             if tu_ngay and ngay_str < tu_ngay:
-                continue
+                break  # Đang đi lùi theo ngày -> các dòng sau đều cũ hơn
             if den_ngay and ngay_str > den_ngay:
                 continue
             
-            filtered_data.append(record)
-        
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        return filtered_data[start:end]
+            yield record
         
     except Exception as ex:
         raise Exception(f"Lỗi lấy lịch trực: {str(ex)}")
 
 
+@cached_query('lich_truc')
 @retry_standard
 def count_lich_truc(
     ca_truc: str = "",
@@ -249,30 +271,37 @@ def count_lich_truc(
     """Đếm số lượng ca trực"""
     try:
         query = supabase.table('lich_truc').select('id', count='exact')
-        
-        if ca_truc:
-            query = query.eq('ca_truc', ca_truc)
-        
-        if trang_thai:
-            query = query.eq('trang_thai', trang_thai)
-        
-        if tu_ngay:
-            query = query.gte('ngay_truc', tu_ngay)
-        
-        if den_ngay:
-            query = query.lte('ngay_truc', den_ngay)
+        query = apply_filters(query, lich_truc_filter_spec(ca_truc, trang_thai, tu_ngay, den_ngay))
         
         response = query.execute()
         return response.count or 0
         
     except Exception as ex:
         try:
-            data = _fetch_lich_truc_with_python_filter(ca_truc, trang_thai, tu_ngay, den_ngay, 1, 9999)
-            return len(data)
+            return sum(1 for _ in _filter_lich_truc_in_python(ca_truc, trang_thai, tu_ngay, den_ngay))
         except:
             return 0
 
 
+def lich_truc_filter_spec(
+    ca_truc: str = "",
+    trang_thai: str = "",
+    tu_ngay: str = "",
+    den_ngay: str = ""
+) -> List:
+    """Bộ lọc danh sách lịch trực"""
+    spec = []
+    if ca_truc:
+        spec.append(('ca_truc', 'eq', ca_truc))
+    if trang_thai:
+        spec.append(('trang_thai', 'eq', trang_thai))
+    if tu_ngay:
+        spec.append(('ngay_truc', 'gte', tu_ngay))
+    if den_ngay:
+        spec.append(('ngay_truc', 'lte', den_ngay))
+    return spec
+
+
 @retry_standard
 def get_lich_truc_by_id(lich_truc_id: str) -> Optional[Dict]:
     """Lấy 1 lịch trực theo ID"""
@@ -288,6 +317,7 @@ def get_lich_truc_by_id(lich_truc_id: str) -> Optional[Dict]:
         raise Exception(f"Lỗi lấy lịch trực: {str(ex)}")
 
 
+@invalidates('lich_truc')
 @retry_patient
 def create_lich_truc(data: Dict) -> Dict:
     """Tạo lịch trực thủ công"""
@@ -303,6 +333,7 @@ def create_lich_truc(data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates('lich_truc')
 @retry_patient
 def update_lich_truc(lich_truc_id: str, data: Dict) -> Dict:
     """Cập nhật lịch trực"""
@@ -319,6 +350,7 @@ def update_lich_truc(lich_truc_id: str, data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates('lich_truc')
 @retry_critical
 def delete_lich_truc(lich_truc_id: str) -> bool:
     """Xóa lịch trực"""
@@ -333,6 +365,7 @@ def delete_lich_truc(lich_truc_id: str) -> bool:
     return True
 
 
+@invalidates('lich_truc')
 @retry_patient
 def bulk_confirm_lich_truc(lich_truc_ids: List[str]) -> int:
     """Xác nhận hàng loạt ca trực"""
@@ -360,53 +393,71 @@ def bulk_confirm_lich_truc(lich_truc_ids: List[str]) -> int:
     return success_count
 
 
+def _month_bounds(year: int, month: int) -> Tuple[str, str]:
+    """[ngày đầu tháng, ngày đầu tháng sau) dạng ISO"""
+    first_day = datetime(year, month, 1).date().isoformat()
+    if month == 12:
+        last_day = datetime(year + 1, 1, 1).date().isoformat()
+    else:
+        last_day = datetime(year, month + 1, 1).date().isoformat()
+    return first_day, last_day
+
+
+def _count_lich_truc_in(first_day: str, last_day: str, trang_thai: str = None) -> int:
+    query = supabase.table('lich_truc')\
+        .select('id', count=COUNT_EXACT)\
+        .gte('ngay_truc', first_day)\
+        .lt('ngay_truc', last_day)
+    if trang_thai:
+        query = query.eq('trang_thai', trang_thai)
+    return query.limit(1).execute().count or 0
+
+
+def _dem_trang_thai(first_day: str, last_day: str) -> Dict[str, int]:
+    """
+    Số ca theo trạng thái trong [first_day, last_day)
+    RPC thong_ke_lich_truc_trang_thai (docs/sql) - nếu DB chưa có thì đếm bằng count='exact'
+    Returns: {trang_thai: so_ca, ..., '__tong__': tổng}
+    """
+    try:
+        res = supabase.rpc('thong_ke_lich_truc_trang_thai', {
+            'tu_ngay': first_day, 'den_ngay': last_day
+        }).execute()
+        counts = {row.get('trang_thai'): int(row.get('so_ca') or 0) for row in res.data or []}
+        counts['__tong__'] = sum(counts.values())
+        return counts
+    except Exception:
+        pass
+
+    return {
+        'Đã trực': _count_lich_truc_in(first_day, last_day, 'Đã trực'),
+        '__tong__': _count_lich_truc_in(first_day, last_day),
+    }
+
+
 @retry_standard
 def get_thong_ke_tong_quan() -> Dict:
     """Lấy thống kê tổng quan"""
     try:
         can_bo_response = supabase.table('can_bo_cap_truong')\
-            .select('id', count='exact')\
+            .select('id', count=COUNT_EXACT)\
+            .limit(1)\
             .execute()
         
         today = datetime.now()
-        first_day = today.replace(day=1).date().isoformat()
+        first_day, last_day = _month_bounds(today.year, today.month)
         
-        if today.month == 12:
-            last_day = today.replace(year=today.year + 1, month=1, day=1).date().isoformat()
-        else:
-            last_day = today.replace(month=today.month + 1, day=1).date().isoformat()
-        
-        try:
-            lich_truc_response = supabase.table('lich_truc')\
-                .select('trang_thai', count='exact')\
-                .gte('ngay_truc', first_day)\
-                .lt('ngay_truc', last_day)\
-                .execute()
-            
-            all_lich = lich_truc_response.data or []
-        except:
-            all_response = supabase.table('lich_truc')\
-                .select('ngay_truc, trang_thai')\
-                .range(0, 999)\
-                .execute()
-            
-            all_lich = [
-                lt for lt in (all_response.data or [])
-                if lt.get('ngay_truc') and first_day <= str(lt['ngay_truc']) < last_day
-            ]
-        
-        hoan_thanh = [
-            lt for lt in all_lich
-            if lt.get('trang_thai') == 'Đã trực'
-        ]
+        counts = _dem_trang_thai(first_day, last_day)
+        tong_ca = counts['__tong__']
+        ca_hoan_thanh = counts.get('Đã trực', 0)
         
         result = {
             'tong_can_bo': can_bo_response.count or 0,
-            'tong_ca_truc_thang': len(all_lich),
-            'ca_hoan_thanh': len(hoan_thanh),
+            'tong_ca_truc_thang': tong_ca,
+            'ca_hoan_thanh': ca_hoan_thanh,
             'ty_le_hoan_thanh': round(
-                (len(hoan_thanh) / len(all_lich) * 100) 
-                if len(all_lich) > 0 else 0, 
+                (ca_hoan_thanh / tong_ca * 100) 
+                if tong_ca > 0 else 0, 
                 1
             )
         }
@@ -417,59 +468,207 @@ def get_thong_ke_tong_quan() -> Dict:
         raise Exception(f"Lỗi lấy thống kê: {str(ex)}")
 
 
+def _thong_ke_theo_nguoi_python(first_day: str, last_day: str) -> List[Dict]:
+    """Dự phòng khi chưa có RPC: duyệt theo keyset (không bị cắt ở 1000 dòng) rồi gom nhóm"""
+    stats = {}
+    rows = stream_table(
+        'lich_truc', 'id, ho_ten, trang_thai',
+        [('ngay_truc', 'gte', first_day), ('ngay_truc', 'lt', last_day)]
+    )
+    for lt in rows:
+        ho_ten = lt.get('ho_ten', '')
+        if not ho_ten:
+            continue
+        
+        if ho_ten not in stats:
+            stats[ho_ten] = {
+                'ho_ten': ho_ten,
+                'tong_ca': 0,
+                'da_hoan_thanh': 0,
+                'vang': 0,
+            }
+        
+        stats[ho_ten]['tong_ca'] += 1
+        
+        if lt.get('trang_thai') == 'Đã trực':
+            stats[ho_ten]['da_hoan_thanh'] += 1
+        elif lt.get('trang_thai') == 'Vắng':
+            stats[ho_ten]['vang'] += 1
+    
+    return sorted(stats.values(), key=lambda s: s['ho_ten'])
+
+
+@cached_query('lich_truc')
 @retry_standard
 def fetch_thong_ke_thang(year: int, month: int) -> List[Dict]:
-    """Lấy thống kê theo tháng"""
+    """Lấy thống kê theo tháng: mỗi người 1 dòng {ho_ten, tong_ca, da_hoan_thanh, vang}"""
     try:
-        first_day = datetime(year, month, 1).date().isoformat()
-        
-        if month == 12:
-            last_day = datetime(year + 1, 1, 1).date().isoformat()
-        else:
-            last_day = datetime(year, month + 1, 1).date().isoformat()
+        first_day, last_day = _month_bounds(year, month)
         
         try:
-            lich_truc_response = supabase.table('lich_truc')\
-                .select('can_bo_id, ho_ten, trang_thai, ngay_truc')\
-                .gte('ngay_truc', first_day)\
-                .lt('ngay_truc', last_day)\
-                .execute()
-            
-            lich_thang = lich_truc_response.data or []
-        except:
-            all_response = supabase.table('lich_truc')\
-                .select('can_bo_id, ho_ten, trang_thai, ngay_truc')\
-                .range(0, 999)\
-                .execute()
-            
-            lich_thang = [
-                lt for lt in (all_response.data or [])
-                if lt.get('ngay_truc') and first_day <= str(lt['ngay_truc']) < last_day
+            res = supabase.rpc('thong_ke_lich_truc_theo_nguoi', {
+                'tu_ngay': first_day, 'den_ngay': last_day
+            }).execute()
+            return [
+                {
+                    'ho_ten': row['ho_ten'],
+                    'tong_ca': int(row.get('tong_ca') or 0),
+                    'da_hoan_thanh': int(row.get('da_hoan_thanh') or 0),
+                    'vang': int(row.get('vang') or 0),
+                }
+                for row in res.data or []
             ]
+        except Exception:
+            return _thong_ke_theo_nguoi_python(first_day, last_day)
+        
+    except Exception as ex:
+        raise Exception(f"Lỗi lấy thống kê tháng: {str(ex)}")
+
+# ===================== TỔNG HỢP THEO TUẦN (TAB THỐNG KÊ) =====================
+# Số buổi trực theo (tuần, người) đọc từ bảng lich_truc_tuan (docs/sql/lich_truc_tuan.sql)
+# Mỗi lần đọc lấy nguyên 1 khối ROLLUP_BLOCK_WEEKS tuần -> lật tuần trong học kỳ không tốn request
+
+ROLLUP_BLOCK_WEEKS = 16
+TRANG_THAI_TINH_BUOI = ('Đã đăng ký', 'Đã trực')
+_ROLLUP_EPOCH = datetime(2024, 1, 1).date()  # Thứ 2
+
+
+def normalize_ho_ten(name: str) -> str:
+    """Khóa gom nhóm theo người: chữ thường + gộp khoảng trắng (giống ho_ten_key trong DB)"""
+    return " ".join((name or "").lower().split())
+
+
+def week_start(day) -> date:
+    """Thứ 2 của tuần chứa ngày `day`"""
+    if isinstance(day, str):
+        day = datetime.fromisoformat(day[:10]).date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    return day - timedelta(days=day.weekday())
+
+
+def _rollup_block_start(monday) -> date:
+    weeks = (monday - _ROLLUP_EPOCH).days // 7
+    return _ROLLUP_EPOCH + timedelta(weeks=weeks - weeks % ROLLUP_BLOCK_WEEKS)
+
+
+def _rollup_from_lich_truc(tu_ngay: str, den_ngay: str) -> List[Dict]:
+    """Dự phòng khi DB chưa có lich_truc_tuan: gom nhóm từ lich_truc (duyệt theo keyset)"""
+    rollup = {}
+    rows = stream_table('lich_truc', 'id, ngay_truc, ho_ten, trang_thai', [
+        ('ngay_truc', 'gte', tu_ngay),
+        ('ngay_truc', 'lt', den_ngay),
+        ('trang_thai', 'in', TRANG_THAI_TINH_BUOI),
+    ])
+    for lt in rows:
+        ho_ten = (lt.get('ho_ten') or '').strip()
+        if not ho_ten or not lt.get('ngay_truc'):
+            continue
+        key = (week_start(lt['ngay_truc']).isoformat(), normalize_ho_ten(ho_ten))
+        item = rollup.setdefault(key, {
+            'tuan': key[0], 'ho_ten_key': key[1], 'ho_ten': ho_ten,
+            'so_buoi': 0, 'da_truc': 0,
+        })
+        item['so_buoi'] += 1
+        if lt.get('trang_thai') == 'Đã trực':
+            item['da_truc'] += 1
+    return list(rollup.values())
+
+
+@cached_query('lich_truc')
+@retry_standard
+def fetch_rollup_block(block_start: str) -> Dict[str, List[Dict]]:
+    """
+    Tổng hợp ROLLUP_BLOCK_WEEKS tuần bắt đầu từ block_start (đọc theo keyset tuan, ho_ten_key)
+    Returns: {thứ 2 (ISO): [{ho_ten_key, ho_ten, so_buoi, da_truc}, ...]}
+    """
+    try:
+        start = datetime.fromisoformat(block_start).date()
+        end = (start + timedelta(weeks=ROLLUP_BLOCK_WEEKS)).isoformat()
         
-        stats = {}
-        for lt in lich_thang:
-            ho_ten = lt.get('ho_ten', '')
-            if not ho_ten:
+        try:
+            # PostgREST cắt mỗi response ở db-max-rows -> đọc theo trang keyset
+            rows = list(stream_table(
+                'lich_truc_tuan', 'tuan, ho_ten_key, ho_ten, so_buoi, da_truc',
+                [('tuan', 'gte', block_start), ('tuan', 'lt', end)],
+                keys=('tuan', 'ho_ten_key')
+            ))
+        except Exception:
+            rows = _rollup_from_lich_truc(block_start, end)
+        
+        weeks = {}
+        for row in rows:
+            weeks.setdefault(str(row['tuan'])[:10], []).append(row)
+        return weeks
+        
+    except Exception as ex:
+        raise Exception(f"Lỗi tổng hợp lịch trực: {str(ex)}")
+
+
+@cached_query('can_bo_cap_truong')
+@retry_standard
+def fetch_can_bo_roles() -> Dict[str, Dict]:
+    """
+    {họ tên chuẩn hóa: {ho_ten_display, loai_can_bo[], chuc_vu[]}} của mọi cán bộ
+    UV Ban Kiểm tra không tính vào thống kê trực.
+    """
+    try:
+        roles = {}
+        # Keyset theo id (created_at có thể null -> hỏng điều kiện trang tiếp)
+        rows = stream_table(
+            'can_bo_cap_truong', 'id, ho_ten, loai_can_bo, chuc_vu',
+            keys=('id',)
+        )
+        for cb in rows:
+            ho_ten = (cb.get('ho_ten') or '').strip()
+            chuc_vu = cb.get('chuc_vu') or ''
+            if not ho_ten or chuc_vu == 'UV Ban Kiểm tra':
                 continue
             
-            if ho_ten not in stats:
-                stats[ho_ten] = {
-                    'ho_ten': ho_ten,
-                    'tong_ca': 0,
-                    'da_hoan_thanh': 0,
-                    'vang': 0,
-                }
-            
-            stats[ho_ten]['tong_ca'] += 1
-            
-            if lt.get('trang_thai') == 'Đã trực':
-                stats[ho_ten]['da_hoan_thanh'] += 1
-            elif lt.get('trang_thai') == 'Vắng':
-                stats[ho_ten]['vang'] += 1
+            info = roles.setdefault(normalize_ho_ten(ho_ten), {
+                'ho_ten_display': ho_ten, 'loai_can_bo': [], 'chuc_vu': [],
+            })
+            loai = cb.get('loai_can_bo') or ''
+            if loai and loai not in info['loai_can_bo']:
+                info['loai_can_bo'].append(loai)
+            if chuc_vu and chuc_vu not in info['chuc_vu']:
+                info['chuc_vu'].append(chuc_vu)
         
-        result = list(stats.values())
-        return result
+        return roles
         
     except Exception as ex:
-        raise Exception(f"Lỗi lấy thống kê tháng: {str(ex)}")
\ No newline at end of file
+        raise Exception(f"Lỗi lấy danh sách cán bộ: {str(ex)}")
+
+
+def fetch_thong_ke_truc(tu_ngay, den_ngay) -> List[Dict]:
+    """
+    Thống kê số buổi trực từng người cho các tuần từ tuần chứa tu_ngay tới tuần chứa den_ngay
+    (1 tuần, 1 tháng hay cả học kỳ đều đọc từ rollup theo khối).
+    Returns: [{ho_ten_display, so_buoi, da_truc, loai_can_bo[], chuc_vu[]}]
+    """
+    first_week, last_week = week_start(tu_ngay), week_start(den_ngay)
+    
+    stats = {}
+    block = _rollup_block_start(first_week)
+    while block <= last_week:
+        for tuan, rows in fetch_rollup_block(block.isoformat()).items():
+            if not first_week.isoformat() <= tuan <= last_week.isoformat():
+                continue
+            for row in rows:
+                item = stats.setdefault(row['ho_ten_key'], {
+                    'ho_ten_display': row['ho_ten'], 'so_buoi': 0, 'da_truc': 0,
+                    'loai_can_bo': [], 'chuc_vu': [],
+                })
+                item['so_buoi'] += row['so_buoi']
+                item['da_truc'] += row['da_truc']
+        block += timedelta(weeks=ROLLUP_BLOCK_WEEKS)
+    
+    roles = fetch_can_bo_roles()
+    for key, item in stats.items():
+        info = roles.get(key)
+        if info:
+            item['ho_ten_display'] = info['ho_ten_display']
+            item['loai_can_bo'] = list(info['loai_can_bo'])
+            item['chuc_vu'] = list(info['chuc_vu'])
+    
+    return list(stats.values())
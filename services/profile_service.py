@@ -1,6 +1,7 @@
 # services/profile_service.py
 from core.supabase_client import supabase, supabase_admin
 from core.db_retry import retry_standard, retry_patient, retry_critical
+from core.db_query import apply_filters, any_of
 from typing import List, Dict, Optional
 from datetime import datetime
 import secrets
@@ -95,23 +96,9 @@ def fetch_all_users(
     """Lấy danh sách tất cả users (ADMIN only)"""
     try:
         query = supabase.table('users').select('*')
-        
-        if search:
-            query = query.or_(
-                f"full_name.ilike.%{search}%,"
-                f"email.ilike.%{search}%,"
-                f"username.ilike.%{search}%,"
-                f"mssv.ilike.%{search}%"
-            )
-        
-        if role_filter:
-            query = query.eq('role', role_filter)
-        
-        if department_filter:
-            query = query.eq('department', department_filter)
-        
-        if is_active_filter is not None:
-            query = query.eq('is_active', is_active_filter)
+        query = apply_filters(query, users_filter_spec(
+            search, role_filter, department_filter, is_active_filter
+        ))
         
         query = query.order('created_at', desc=True)
         
@@ -136,23 +123,9 @@ def count_all_users(
     """Đếm số lượng users"""
     try:
         query = supabase.table('users').select('id', count='exact')
-        
-        if search:
-            query = query.or_(
-                f"full_name.ilike.%{search}%,"
-                f"email.ilike.%{search}%,"
-                f"username.ilike.%{search}%,"
-                f"mssv.ilike.%{search}%"
-            )
-        
-        if role_filter:
-            query = query.eq('role', role_filter)
-        
-        if department_filter:
-            query = query.eq('department', department_filter)
-        
-        if is_active_filter is not None:
-            query = query.eq('is_active', is_active_filter)
+        query = apply_filters(query, users_filter_spec(
+            search, role_filter, department_filter, is_active_filter
+        ))
         
         res = query.execute()
         return res.count or 0
@@ -161,6 +134,30 @@ def count_all_users(
         return 0
 
 
+def users_filter_spec(
+    search: str = "",
+    role_filter: str = "",
+    department_filter: str = "",
+    is_active_filter: Optional[bool] = None
+) -> List:
+    """Bộ lọc danh sách users"""
+    spec = []
+    if search:
+        spec.append(any_of([
+            ('full_name', 'contains', search),
+            ('email', 'contains', search),
+            ('username', 'contains', search),
+            ('mssv', 'contains', search),
+        ]))
+    if role_filter:
+        spec.append(('role', 'eq', role_filter))
+    if department_filter:
+        spec.append(('department', 'eq', department_filter))
+    if is_active_filter is not None:
+        spec.append(('is_active', 'eq', is_active_filter))
+    return spec
+
+
 @retry_patient
 def create_user_account(data: Dict) -> Dict:
     """Tạo tài khoản mới với Admin API (ADMIN only)"""
@@ -1,11 +1,12 @@
 # services/so_doan_service.py
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient, retry_critical
-from typing import List, Dict, Optional
-from datetime import datetime
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, apply_filters, any_of
+from typing import List, Dict, Optional, Tuple
+from utils.dates import parse_date_str
 
 
-@retry_standard
 def fetch_so_doan(
     search: str = "",
     page: int = 1,
@@ -13,43 +14,60 @@ def fetch_so_doan(
     trang_thai: str = ""
 ) -> List[Dict]:
     """Lấy danh sách Sổ Đoàn"""
+    data, _ = fetch_so_doan_page(
+        search=search, page=page, page_size=page_size,
+        trang_thai=trang_thai, count=None
+    )
+    return data
+
+
+@cached_query("so_doan")
+@retry_standard
+def fetch_so_doan_page(
+    search: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    trang_thai: str = "",
+    count: str = COUNT_EXACT
+) -> Tuple[List[Dict], int]:
+    """Lấy 1 trang Sổ Đoàn kèm tổng số"""
     query = supabase.table("so_doan").select(
         "id, ho_ten, ngay_sinh, que_quan, noi_ket_nap, ngay_ket_nap, "
-        "trang_thai, ghi_chu, created_at"
+        "trang_thai, ghi_chu, created_at",
+        count=count_mode(count)
     )
+    query = apply_filters(query, so_doan_filter_spec(search, trang_thai))
     
-    if search:
-        query = query.or_(f"ho_ten.ilike.%{search}%,que_quan.ilike.%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai", trang_thai)
-    
-    start = (page - 1) * page_size
-    end = start + page_size - 1
+    query = query.order("trang_thai", desc=False)\
+                 .order("ngay_sinh", desc=True)
     
-    res = query.order("trang_thai", desc=False)\
-               .order("ngay_sinh", desc=True)\
-               .range(start, end)\
-               .execute()
-    
-    return res.data or []
+    return execute_paged(query, page, page_size)
 
 
+@cached_query("so_doan")
 @retry_standard
 def count_so_doan(search: str = "", trang_thai: str = "") -> int:
     """Đếm tổng số"""
     query = supabase.table("so_doan").select("id", count="exact")
-    
-    if search:
-        query = query.or_(f"ho_ten.ilike.%{search}%,que_quan.ilike.%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai", trang_thai)
+    query = apply_filters(query, so_doan_filter_spec(search, trang_thai))
     
     res = query.execute()
     return res.count or 0
 
 
+def so_doan_filter_spec(search: str = "", trang_thai: str = "") -> list:
+    """Bộ lọc danh sách Sổ Đoàn"""
+    spec = []
+    if search:
+        spec.append(any_of([
+            ("ho_ten", "contains", search),
+            ("que_quan", "contains", search),
+        ]))
+    if trang_thai:
+        spec.append(("trang_thai", "eq", trang_thai))
+    return spec
+
+
 @retry_standard
 def get_so_doan_by_id(id: str) -> Optional[Dict]:
     """Lấy 1 record theo ID"""
@@ -61,6 +79,7 @@ def get_so_doan_by_id(id: str) -> Optional[Dict]:
     return res.data[0] if res.data else None
 
 
+@invalidates("so_doan")
 @retry_patient
 def create_so_doan(data: Dict) -> Dict:
     """Thêm Sổ Đoàn mới"""
@@ -84,6 +103,7 @@ def create_so_doan(data: Dict) -> Dict:
         raise Exception(f"Lỗi tạo sổ đoàn: {str(ex)}")
 
 
+@invalidates("so_doan")
 @retry_patient
 def update_so_doan(id: str, data: Dict) -> Dict:
     """Cập nhật"""
@@ -100,6 +120,7 @@ def update_so_doan(id: str, data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates("so_doan")
 @retry_critical
 def delete_so_doan(id: str) -> bool:
     """Xóa"""
@@ -111,6 +132,7 @@ def delete_so_doan(id: str) -> bool:
     return True
 
 
+@invalidates("so_doan")
 @retry_patient
 def bulk_update_so_doan(ids: List[str], data: Dict) -> int:
     """Cập nhật hàng loạt"""
@@ -190,16 +212,10 @@ def _validate_so_doan_data(data: Dict, is_create: bool = False) -> Dict:
         if field in data and data[field]:
             value = str(data[field]).strip()
             if value:
-                try:
-                    if "/" in value:
-                        parts = value.split("/")
-                        if len(parts) == 3:
-                            value = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                    
-                    datetime.strptime(value, "%Y-%m-%d")
-                    validated[field] = value
-                except ValueError:
+                parsed = parse_date_str(value)
+                if not parsed:
                     raise ValueError(f"Ngày không hợp lệ: {value}")
+                validated[field] = parsed
     
     if is_create:
         validated.setdefault("trang_thai", "Đang lưu VP")
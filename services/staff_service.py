@@ -1,9 +1,11 @@
 # services/staff_service.py
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient, retry_critical
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, apply_filters
+from core.db_batch import fetch_in_order
 
 
-@retry_standard
 def fetch_staff_with_filters(
     search: str = "",
     lop: str = "",
@@ -11,50 +13,60 @@ def fetch_staff_with_filters(
     page: int = 1,
     page_size: int = 100
 ) -> list[dict]:
+    data, _ = fetch_staff_page(
+        search=search, lop=lop, khoa=khoa,
+        page=page, page_size=page_size, count=None
+    )
+    return data
+
+
+@cached_query("can_bo_lop")
+@retry_standard
+def fetch_staff_page(
+    search: str = "",
+    lop: str = "",
+    khoa: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    count: str = COUNT_EXACT
+) -> tuple[list[dict], int]:
     query = supabase.table("can_bo_lop").select(
         "id, csdt, khoa_vien, chi_doan, chuc_vu, ho_ten, mssv, "
-        "ngay_sinh, sdt, email, ghi_chu"
+        "ngay_sinh, sdt, email, ghi_chu",
+        count=count_mode(count)
     )
+    query = apply_filters(query, staff_filter_spec(search, lop, khoa))
     
-    if search:
-        search_normalized = search.strip()
-        if any(char.isdigit() for char in search_normalized):
-            query = query.ilike("chi_doan", f"%{search_normalized}%")
-        else:
-            query = query.ilike("ho_ten", f"%{search_normalized}%")
-    
-    if lop:
-        query = query.ilike("chi_doan", lop.strip())
-    
-    if khoa:
-        query = query.ilike("khoa_vien", f"%{khoa.strip()}%")
-    
-    start = (page - 1) * page_size
-    end = start + page_size - 1
-    
-    res = query.range(start, end).execute()
-    return res.data or []
+    return execute_paged(query, page, page_size)
 
 
+@cached_query("can_bo_lop")
 @retry_standard
 def count_staff_with_filters(search: str = "", lop: str = "", khoa: str = "") -> int:
     query = supabase.table("can_bo_lop").select("id", count="exact")
+    query = apply_filters(query, staff_filter_spec(search, lop, khoa))
     
+    res = query.execute()
+    return res.count or 0
+
+
+def staff_filter_spec(search: str = "", lop: str = "", khoa: str = "") -> list:
+    spec = []
+    
+    search = (search or "").strip()
     if search:
-        search_normalized = search.strip()
-        if any(char.isdigit() for char in search_normalized):
-            query = query.ilike("chi_doan", f"%{search_normalized}%")
+        if any(char.isdigit() for char in search):
+            spec.append(("chi_doan", "contains", search))
         else:
-            query = query.ilike("ho_ten", f"%{search_normalized}%")
+            spec.append(("ho_ten", "contains", search))
     
-    if lop:
-        query = query.ilike("chi_doan", lop.strip())
+    if lop and lop.strip():
+        spec.append(("chi_doan", "ilike", lop.strip()))
     
-    if khoa:
-        query = query.ilike("khoa_vien", f"%{khoa.strip()}%")
+    if khoa and khoa.strip():
+        spec.append(("khoa_vien", "contains", khoa.strip()))
     
-    res = query.execute()
-    return res.count or 0
+    return spec
 
 
 @retry_standard
@@ -67,6 +79,7 @@ def count_staff(search: str = "") -> int:
     return count_staff_with_filters(search=search)
 
 
+@invalidates("can_bo_lop")
 @retry_patient
 def update_staff(staff_id: str, data: dict):
     if not staff_id:
@@ -98,6 +111,7 @@ def update_staff(staff_id: str, data: dict):
     return res.data[0]
 
 
+@invalidates("can_bo_lop")
 @retry_patient
 def bulk_update_staff(staff_ids: list[str], data: dict):
     if not staff_ids:
@@ -146,6 +160,7 @@ def bulk_update_staff(staff_ids: list[str], data: dict):
     return success_count
 
 
+@invalidates("can_bo_lop")
 @retry_patient
 def create_staff(data: dict):
     required = ["khoa_vien", "chi_doan", "chuc_vu", "ho_ten"]
@@ -157,6 +172,7 @@ def create_staff(data: dict):
     return res.data[0] if res.data else None
 
 
+@invalidates("can_bo_lop")
 @retry_critical
 def delete_staff(staff_id: str):
     if not staff_id:
@@ -183,23 +199,25 @@ def export_staff_to_excel(staff_ids: list[str]) -> bytes:
     if not staff_ids:
         raise ValueError("Danh sách cán bộ rỗng")
     
-    # Lấy data từ DB
+    # Lấy data từ DB: lô in_() chỉ các cột export, đúng thứ tự đã chọn
+    staff_rows = fetch_in_order(
+        "can_bo_lop", "id", staff_ids,
+        "id, khoa_vien, chi_doan, ho_ten, chuc_vu, mssv, ngay_sinh, sdt, email, csdt, ghi_chu"
+    )
     data = []
-    for staff_id in staff_ids:
-        staff = get_staff_by_id(staff_id)
-        if staff:
-            data.append({
-                "Khoa/Viện": staff.get("khoa_vien", ""),
-                "Lớp": staff.get("chi_doan", ""),
-                "Họ tên": staff.get("ho_ten", ""),
-                "Chức vụ": staff.get("chuc_vu", ""),
-                "MSSV": staff.get("mssv", ""),
-                "Ngày sinh": staff.get("ngay_sinh", ""),
-                "SĐT": staff.get("sdt", ""),
-                "Email": staff.get("email", ""),
-                "CSĐT": staff.get("csdt", ""),
-                "Ghi chú": staff.get("ghi_chu", ""),
-            })
+    for staff in staff_rows:
+        data.append({
+            "Khoa/Viện": staff.get("khoa_vien", ""),
+            "Lớp": staff.get("chi_doan", ""),
+            "Họ tên": staff.get("ho_ten", ""),
+            "Chức vụ": staff.get("chuc_vu", ""),
+            "MSSV": staff.get("mssv", ""),
+            "Ngày sinh": staff.get("ngay_sinh", ""),
+            "SĐT": staff.get("sdt", ""),
+            "Email": staff.get("email", ""),
+            "CSĐT": staff.get("csdt", ""),
+            "Ghi chú": staff.get("ghi_chu", ""),
+        })
     
     df = pd.DataFrame(data)
     
@@ -216,10 +234,16 @@ def export_staff_to_excel(staff_ids: list[str]) -> bytes:
     return output.getvalue()
 
 
+STAFF_REQUIRED_COLUMNS = ["ho_ten", "chuc_vu", "chi_doan", "khoa_vien"]
+STAFF_OPTIONAL_COLUMNS = ["mssv", "ngay_sinh", "sdt", "email", "csdt", "ghi_chu"]
+
+
+@invalidates("can_bo_lop")
 def import_staff_from_excel(file_bytes: bytes) -> tuple[int, list[str]]:
     """Import cán bộ từ Excel. Returns (số lượng thành công, danh sách lỗi)"""
     import pandas as pd
     from io import BytesIO
+    from utils.excel import normalize_frame, format_errors, TEXT
     
     errors = []
     success_count = 0
@@ -230,43 +254,17 @@ def import_staff_from_excel(file_bytes: bytes) -> tuple[int, list[str]]:
         # Chuẩn hóa tên cột
         df.columns = df.columns.str.strip()
         
-        required_cols = ["ho_ten", "chuc_vu", "chi_doan", "khoa_vien"]
+        # Làm sạch + kiểm tra theo cột cho cả file (cột tùy chọn trống -> không gửi)
+        columns = {c: (TEXT, "") for c in STAFF_REQUIRED_COLUMNS}
+        columns.update({c: (TEXT, None) for c in STAFF_OPTIONAL_COLUMNS})
+        records, error_table = normalize_frame(df, columns, [(
+            lambda f: (f[STAFF_REQUIRED_COLUMNS] == "").any(axis=1),
+            lambda r: f"Dòng {r['row']}: Thiếu {', '.join(c for c in STAFF_REQUIRED_COLUMNS if not r[c])}",
+        )])
+        errors.extend(format_errors(error_table))
         
-        for idx, row in df.iterrows():
+        for row_num, payload in records:
             try:
-                row_num = idx + 2
-                
-                # Validate required fields
-                missing = []
-                for col in required_cols:
-                    if col not in row or pd.isna(row[col]) or str(row[col]).strip() == "":
-                        missing.append(col)
-                
-                if missing:
-                    errors.append(f"Dòng {row_num}: Thiếu {', '.join(missing)}")
-                    continue
-                
-                # Build payload
-                payload = {
-                    "ho_ten": str(row["ho_ten"]).strip(),
-                    "chuc_vu": str(row["chuc_vu"]).strip(),
-                    "chi_doan": str(row["chi_doan"]).strip(),
-                    "khoa_vien": str(row["khoa_vien"]).strip(),
-                }
-                
-                if "mssv" in row and not pd.isna(row["mssv"]):
-                    payload["mssv"] = str(row["mssv"]).strip()
-                if "ngay_sinh" in row and not pd.isna(row["ngay_sinh"]):
-                    payload["ngay_sinh"] = str(row["ngay_sinh"]).strip()
-                if "sdt" in row and not pd.isna(row["sdt"]):
-                    payload["sdt"] = str(row["sdt"]).strip()
-                if "email" in row and not pd.isna(row["email"]):
-                    payload["email"] = str(row["email"]).strip()
-                if "csdt" in row and not pd.isna(row["csdt"]):
-                    payload["csdt"] = str(row["csdt"]).strip()
-                if "ghi_chu" in row and not pd.isna(row["ghi_chu"]):
-                    payload["ghi_chu"] = str(row["ghi_chu"]).strip()
-                
                 create_staff(payload)
                 success_count += 1
                 
@@ -0,0 +1,258 @@
+# services/student_index.py
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from core.supabase_client import supabase
+from core.db_retry import retry_standard
+from core.db_batch import stream_table
+from core.query_cache import query_cache
+from services.students_service import STUDENT_LIST_COLUMNS, TRANG_THAI_CONDITIONS, sort_students
+from utils.text import fold_vietnamese, fold_tokens, tokens_match_prefix
+
+
+COLUMNS = [c.strip() for c in STUDENT_LIST_COLUMNS.split(",")]
+LOAD_BATCH_SIZE = 1000
+# Quá khoảng này mới hỏi server xem có thay đổi từ máy khác không
+REFRESH_INTERVAL_SECONDS = float(os.getenv("STUDENT_INDEX_REFRESH", "30"))
+# Các cột ít giá trị khác nhau -> intern để dùng chung 1 object chuỗi
+_INTERNED_COLUMNS = {"lop", "khoa", "trang_thai_so", "noi_sinh", "vi_tri_luu_so"}
+
+
+def local_index_enabled() -> bool:
+    """
+    Bật chế độ tìm kiếm cục bộ bằng biến môi trường STUDENT_LOCAL_INDEX=1
+    Cần chạy docs/sql/doan_vien_updated_at.sql (trigger updated_at + bảng ghi dòng bị xóa)
+    """
+    return os.getenv("STUDENT_LOCAL_INDEX", "").strip().lower() in ("1", "true", "yes")
+
+
+@retry_standard
+def _count_server() -> int:
+    res = supabase.table("doan_vien_k74_k75")\
+        .select("mssv", count="exact")\
+        .limit(1)\
+        .execute()
+    return res.count or 0
+
+
+@retry_standard
+def _last_deletion(after: Optional[str] = None) -> Optional[str]:
+    """Thời điểm xóa mới nhất (sau `after` nếu có) trong doan_vien_k74_k75_xoa, None nếu không có"""
+    query = supabase.table("doan_vien_k74_k75_xoa").select("deleted_at")
+    if after:
+        query = query.gt("deleted_at", after)
+    res = query.order("deleted_at", desc=True).limit(1).execute()
+    return res.data[0]["deleted_at"] if res.data else None
+
+
+def _fetch_all(since: Optional[str] = None) -> List[Dict]:
+    """Toàn bộ bảng (hoặc các dòng có updated_at >= since), đọc theo keyset"""
+    columns = f"{STUDENT_LIST_COLUMNS}, updated_at"
+    if since:
+        rows = stream_table(
+            "doan_vien_k74_k75", columns, [("updated_at", "gte", since)],
+            keys=("updated_at", "mssv"), page_size=LOAD_BATCH_SIZE
+        )
+    else:
+        rows = stream_table("doan_vien_k74_k75", columns, keys=("mssv",), page_size=LOAD_BATCH_SIZE)
+    return list(rows)
+
+
+def _like_matcher(pattern: str):
+    """ilike của PostgREST: '%' = chuỗi bất kỳ, '_' = 1 ký tự, còn lại so khớp nguyên"""
+    folded = fold_vietnamese(pattern)
+    if "%" not in folded and "_" not in folded:
+        return lambda value: value == folded
+    regex = re.compile(
+        "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in folded)
+        + r"\Z"
+    )
+    return lambda value: regex.match(value) is not None
+
+
+class StudentIndex:
+    """
+    Bản sao cục bộ bảng doan_vien_k74_k75 dạng cột (mỗi cột 1 list).
+    - Tải toàn bộ 1 lần, sau đó đồng bộ tăng dần theo updated_at
+    - Tìm tên không dấu, khớp tiền tố từng từ ("ng v a" -> "Nguyễn Văn An")
+    - Lọc / sắp xếp / phân trang hoàn toàn trong bộ nhớ
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._version: Optional[int] = None
+        self._watermark: Optional[str] = None
+        self._deleted_mark: Optional[str] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._columns: Dict[str, list] = {c: [] for c in COLUMNS}
+        self._name_tokens: List[tuple] = []
+        self._lop_key: List[str] = []
+        self._khoa_key: List[str] = []
+        self._pos: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def _put(self, row: Dict) -> None:
+        mssv = str(row.get("mssv") or "").strip()
+        if not mssv:
+            return
+
+        i = self._pos.get(mssv)
+        if i is None:
+            i = len(self._pos)
+            self._pos[mssv] = i
+            for c in COLUMNS:
+                self._columns[c].append(None)
+            self._name_tokens.append(())
+            self._lop_key.append("")
+            self._khoa_key.append("")
+
+        for c in COLUMNS:
+            value = row.get(c)
+            if c in _INTERNED_COLUMNS and isinstance(value, str):
+                value = sys.intern(value)
+            self._columns[c][i] = value
+        self._name_tokens[i] = fold_tokens(row.get("ho_ten") or "")
+        self._lop_key[i] = fold_vietnamese(row.get("lop") or "")
+        self._khoa_key[i] = fold_vietnamese(row.get("khoa") or "")
+
+        updated_at = row.get("updated_at")
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _full_load(self) -> None:
+        # Lấy mốc xóa trước khi tải -> lần xóa xảy ra trong lúc tải sẽ bị phát hiện ở lần sau
+        deleted_mark = _last_deletion()
+        rows = _fetch_all()
+        self._reset()
+        self._watermark = None
+        for row in rows:
+            self._put(row)
+        self._deleted_mark = deleted_mark
+        self._loaded = True
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Đồng bộ với server khi cần:
+        - Lần đầu / force -> tải toàn bộ
+        - Có ghi từ app này (query_cache bị invalidate) hoặc quá REFRESH_INTERVAL
+          -> lấy các dòng có updated_at mới; có dòng bị xóa từ lần trước
+             (bảng doan_vien_k74_k75_xoa) hoặc lệch số lượng -> tải lại toàn bộ
+        """
+        with self._lock:
+            version = query_cache.version("doan_vien_k74_k75")
+            stale = (
+                version != self._version
+                or time.monotonic() - self._loaded_at > REFRESH_INTERVAL_SECONDS
+            )
+            if self._loaded and not stale and not force:
+                return
+
+            if not self._loaded or force:
+                self._full_load()
+            else:
+                try:
+                    for row in _fetch_all(since=self._watermark):
+                        self._put(row)
+                    deleted = _last_deletion(self._deleted_mark) is not None
+                    if deleted or _count_server() != len(self._pos):
+                        self._full_load()
+                except Exception:
+                    self._full_load()
+
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def _row(self, i: int) -> Dict:
+        return {c: self._columns[c][i] for c in COLUMNS}
+
+    def _match(
+        self,
+        search: str,
+        lop: str,
+        khoa: str,
+        trang_thai: Optional[set]
+    ) -> List[int]:
+        checks = []
+
+        search = (search or "").strip()
+        if search:
+            if search.isdigit():
+                mssv_col = self._columns["mssv"]
+                checks.append(lambda i: str(mssv_col[i]).startswith(search))
+            else:
+                query_tokens = fold_tokens(search)
+                checks.append(lambda i: tokens_match_prefix(query_tokens, self._name_tokens[i]))
+
+        if lop and lop.strip():
+            lop_match = _like_matcher(lop.strip())
+            checks.append(lambda i: lop_match(self._lop_key[i]))
+
+        if khoa and khoa.strip():
+            khoa_folded = fold_vietnamese(khoa)
+            checks.append(lambda i: khoa_folded in self._khoa_key[i])
+
+        if trang_thai:
+            conditions = [
+                (self._columns[column], value)
+                for key, (column, _, value) in TRANG_THAI_CONDITIONS.items()
+                if key in trang_thai
+            ]
+            if conditions:
+                checks.append(lambda i: any(col[i] == value for col, value in conditions))
+
+        if not checks:
+            return list(range(len(self._pos)))
+        return [i for i in range(len(self._pos)) if all(check(i) for check in checks)]
+
+    def query(
+        self,
+        search: str = "",
+        lop: str = "",
+        khoa: str = "",
+        trang_thai: set = None,
+        page: int = 1,
+        page_size: int = 100
+    ) -> Tuple[List[Dict], int]:
+        """Lọc + sắp xếp + phân trang giống fetch_students_page. Returns: (rows, total)"""
+        self.refresh()
+
+        with self._lock:
+            matched = self._match(search, lop, khoa, trang_thai)
+            start = (max(page, 1) - 1) * page_size
+
+            sorting = bool((lop or "").strip()) or (
+                bool((search or "").strip()) and not search.strip().isdigit()
+            )
+            if sorting:
+                rows = sort_students([self._row(i) for i in matched], search, lop)
+                return rows[start:start + page_size], len(matched)
+
+            return [self._row(i) for i in matched[start:start + page_size]], len(matched)
+
+
+student_index = StudentIndex()
+
+
+def fetch_students_local(
+    search: str = "",
+    lop: str = "",
+    khoa: str = "",
+    trang_thai: set = None,
+    page: int = 1,
+    page_size: int = 100,
+    count: str = None
+) -> Tuple[List[Dict], int]:
+    """Cùng chữ ký với fetch_students_page nhưng trả lời từ index cục bộ (total luôn chính xác)"""
+    return student_index.query(
+        search=search, lop=lop, khoa=khoa, trang_thai=trang_thai,
+        page=page, page_size=page_size
+    )
@@ -1,9 +1,18 @@
 # services/students_service.py
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient, retry_critical
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, apply_filters, any_of
+from core.db_batch import fetch_by_keys, bulk_upsert, bulk_update_by_keys, bulk_delete_by_keys
+
+
+# Các cột hiển thị trên tab Sinh viên
+STUDENT_LIST_COLUMNS = (
+    "mssv, ho_ten, ngay_sinh, noi_sinh, lop, khoa, trang_thai_so, "
+    "da_nop_doan_phi, da_nop_hoi_phi, vi_tri_luu_so, ghi_chu"
+)
 
 
-@retry_standard
 def fetch_students(
     search: str = "", 
     lop: str = "",
@@ -12,87 +21,88 @@ def fetch_students(
     page: int = 1, 
     page_size: int = 100
 ) -> list[dict]:
+    data, _ = fetch_students_page(
+        search=search, lop=lop, khoa=khoa, trang_thai=trang_thai,
+        page=page, page_size=page_size, count=None
+    )
+    return data
+
+
+@cached_query("doan_vien_k74_k75")
+@retry_standard
+def fetch_students_page(
+    search: str = "", 
+    lop: str = "",
+    khoa: str = "",
+    trang_thai: set = None,
+    page: int = 1, 
+    page_size: int = 100,
+    count: str = COUNT_EXACT
+) -> tuple[list[dict], int]:
+    """Lấy 1 trang sinh viên kèm tổng số trong cùng 1 request"""
     query = supabase.table("doan_vien_k74_k75").select(
-        "mssv, ho_ten, ngay_sinh, noi_sinh, lop, khoa, trang_thai_so, "
-        "da_nop_doan_phi, da_nop_hoi_phi, vi_tri_luu_so, ghi_chu"
+        STUDENT_LIST_COLUMNS,
+        count=count_mode(count)
     )
     
-    sort_by_class_then_name = False
-    sort_by_name_only = False
-    
-    if search:
-        search_normalized = search.strip()
-        if search_normalized.isdigit():
-            query = query.ilike("mssv", f"{search_normalized}%")
-        else:
-            query = query.ilike("ho_ten", f"%{search_normalized}%")
-            sort_by_name_only = True
-    
-    if lop:
-        lop_normalized = lop.strip()
-        query = query.ilike("lop", lop_normalized)
-        
-        if lop_normalized and lop_normalized[-1].isdigit():
-            sort_by_name_only = True
-        else:
-            sort_by_class_then_name = True
+    query = apply_filters(query, students_filter_spec(search, lop, khoa, trang_thai))
     
-    if khoa:
-        query = query.ilike("khoa", f"%{khoa.strip()}%")
+    data, total = execute_paged(query, page, page_size)
+    sort_students(data, search, lop)
     
-    if trang_thai:
-        conditions = []
-        
-        if "dang_luu_vp" in trang_thai:
-            conditions.append(("trang_thai_so", "eq", "Đang lưu VP"))
-        if "da_tra_so" in trang_thai:
-            conditions.append(("trang_thai_so", "eq", "Đã tiếp nhận"))
-        if "chua_doan_phi" in trang_thai:
-            conditions.append(("da_nop_doan_phi", "eq", False))
-        if "chua_hoi_phi" in trang_thai:
-            conditions.append(("da_nop_hoi_phi", "eq", False))
+    return data, total
+
+
+def normalize_vietnamese_for_sort(text: str) -> str:
+    if not text:
+        return ""
+    return text.replace("Đ", "D~").replace("đ", "d~")
+
+
+def get_name_sort_key(ho_ten: str):
+    """Khóa sắp xếp theo tên chính -> họ -> tên đệm"""
+    if not ho_ten:
+        return ("",)
+    
+    parts = ho_ten.strip().split()
+    if len(parts) == 0:
+        return ("",)
+    elif len(parts) == 1:
+        return (normalize_vietnamese_for_sort(parts[0]), "")
+    elif len(parts) == 2:
+        return (
+            normalize_vietnamese_for_sort(parts[1]),
+            normalize_vietnamese_for_sort(parts[0])
+        )
+    else:
+        ten_chinh = parts[-1]
+        ho = parts[0]
+        ten_dem_list = parts[1:-1]
         
-        if conditions:
-            or_filters = ",".join([
-                f"{field}.{op}.{value}" for field, op, value in conditions
-            ])
-            query = query.or_(or_filters)
-    
-    start = (page - 1) * page_size
-    end = start + page_size - 1
-    
-    res = query.range(start, end).execute()
-    data = res.data or []
+        return (
+            normalize_vietnamese_for_sort(ten_chinh),
+            normalize_vietnamese_for_sort(ho),
+            *[normalize_vietnamese_for_sort(t) for t in ten_dem_list]
+        )
+
+
+def sort_students(data: list[dict], search: str = "", lop: str = "") -> list[dict]:
+    """
+    Sắp xếp tại chỗ giống tab Sinh viên:
+    - Lọc theo lớp cụ thể / tìm theo tên -> theo tên
+    - Lọc theo tiền tố lớp (VD: 74DCHT) -> theo lớp rồi tên
+    """
+    search_normalized = (search or "").strip()
+    lop_normalized = (lop or "").strip()
     
-    def normalize_vietnamese_for_sort(text: str) -> str:
-        if not text:
-            return ""
-        return text.replace("Đ", "D~").replace("đ", "d~")
+    sort_by_class_then_name = False
+    sort_by_name_only = bool(search_normalized) and not search_normalized.isdigit()
     
-    def get_name_sort_key(ho_ten: str):
-        if not ho_ten:
-            return ("",)
-        
-        parts = ho_ten.strip().split()
-        if len(parts) == 0:
-            return ("",)
-        elif len(parts) == 1:
-            return (normalize_vietnamese_for_sort(parts[0]), "")
-        elif len(parts) == 2:
-            return (
-                normalize_vietnamese_for_sort(parts[1]),
-                normalize_vietnamese_for_sort(parts[0])
-            )
+    if lop_normalized:
+        if lop_normalized[-1].isdigit():
+            sort_by_name_only = True
         else:
-            ten_chinh = parts[-1]
-            ho = parts[0]
-            ten_dem_list = parts[1:-1]
-            
-            return (
-                normalize_vietnamese_for_sort(ten_chinh),
-                normalize_vietnamese_for_sort(ho),
-                *[normalize_vietnamese_for_sort(t) for t in ten_dem_list]
-            )
+            sort_by_class_then_name = True
     
     if sort_by_class_then_name:
         data.sort(key=lambda x: (
@@ -105,42 +115,55 @@ def fetch_students(
     return data
 
 
+@cached_query("doan_vien_k74_k75")
 @retry_standard
 def count_students(search: str = "", lop: str = "", khoa: str = "", trang_thai: set = None) -> int:
     query = supabase.table("doan_vien_k74_k75").select("mssv", count="exact")
+    query = apply_filters(query, students_filter_spec(search, lop, khoa, trang_thai))
+    
+    res = query.execute()
+    return res.count or 0
+
+
+# Bộ lọc trạng thái (nút lọc trên tab Sinh viên) -> điều kiện OR
+TRANG_THAI_CONDITIONS = {
+    "dang_luu_vp": ("trang_thai_so", "eq", "Đang lưu VP"),
+    "da_tra_so": ("trang_thai_so", "eq", "Đã tiếp nhận"),
+    "chua_doan_phi": ("da_nop_doan_phi", "eq", False),
+    "chua_hoi_phi": ("da_nop_hoi_phi", "eq", False),
+}
+
+
+def students_filter_spec(
+    search: str = "",
+    lop: str = "",
+    khoa: str = "",
+    trang_thai: set = None
+) -> list:
+    spec = []
     
+    search = (search or "").strip()
     if search:
-        search_normalized = search.strip()
-        if search_normalized.isdigit():
-            query = query.ilike("mssv", f"{search_normalized}%")
+        if search.isdigit():
+            spec.append(("mssv", "prefix", search))
         else:
-            query = query.ilike("ho_ten", f"%{search_normalized}%")
+            spec.append(("ho_ten", "contains", search))
     
-    if lop:
-        query = query.ilike("lop", lop.strip())
+    if lop and lop.strip():
+        spec.append(("lop", "ilike", lop.strip()))
     
-    if khoa:
-        query = query.ilike("khoa", f"%{khoa.strip()}%")
+    if khoa and khoa.strip():
+        spec.append(("khoa", "contains", khoa.strip()))
     
     if trang_thai:
-        conditions = []
-        if "dang_luu_vp" in trang_thai:
-            conditions.append(("trang_thai_so", "eq", "Đang lưu VP"))
-        if "da_tra_so" in trang_thai:
-            conditions.append(("trang_thai_so", "eq", "Đã tiếp nhận"))
-        if "chua_doan_phi" in trang_thai:
-            conditions.append(("da_nop_doan_phi", "eq", False))
-        if "chua_hoi_phi" in trang_thai:
-            conditions.append(("da_nop_hoi_phi", "eq", False))
-        
+        conditions = [
+            condition for key, condition in TRANG_THAI_CONDITIONS.items()
+            if key in trang_thai
+        ]
         if conditions:
-            or_filters = ",".join([
-                f"{field}.{op}.{value}" for field, op, value in conditions
-            ])
-            query = query.or_(or_filters)
+            spec.append(any_of(conditions))
     
-    res = query.execute()
-    return res.count or 0
+    return spec
 
 
 @retry_standard
@@ -161,6 +184,7 @@ def get_student_by_mssv(mssv: str) -> dict | None:
         .execute()
     return res.data[0] if res.data else None
 
+@invalidates("doan_vien_k74_k75")
 @retry_patient
 def add_student(data: dict):
     """Thêm sinh viên mới"""
@@ -216,6 +240,7 @@ def add_student(data: dict):
     
     return result.data[0]
 
+@invalidates("doan_vien_k74_k75")
 @retry_patient
 def update_student(mssv: str, data: dict):
     if not mssv:
@@ -268,7 +293,7 @@ def update_student(mssv: str, data: dict):
     return verify_query.data[0]
 
 
-@retry_patient
+@invalidates("doan_vien_k74_k75")
 def bulk_update_students(student_ids: list[str], data: dict):
     if not student_ids:
         raise ValueError("Danh sách sinh viên rỗng")
@@ -293,29 +318,12 @@ def bulk_update_students(student_ids: list[str], data: dict):
     if not cleaned_data:
         raise ValueError("Không có dữ liệu hợp lệ")
 
-    success_count = 0
-    errors = []
+    updated, failures = bulk_update_by_keys(
+        "doan_vien_k74_k75", "mssv", student_ids, cleaned_data
+    )
     
-    for mssv in student_ids:
-        try:
-            supabase.table("doan_vien_k74_k75")\
-                .update(cleaned_data)\
-                .eq("mssv", mssv)\
-                .execute()
-            
-            verify = supabase.table("doan_vien_k74_k75")\
-                .select("mssv")\
-                .eq("mssv", mssv)\
-                .execute()
-            
-            if verify.data:
-                success_count += 1
-            else:
-                errors.append(f"MSSV {mssv}: Không verify được")
-                
-        except Exception as e:
-            error_msg = f"MSSV {mssv}: {str(e)}"
-            errors.append(error_msg)
+    success_count = len(updated)
+    errors = [f"MSSV {mssv}: {error}" for mssv, error in failures]
     
     if errors:
         if success_count == 0:
@@ -332,6 +340,7 @@ def bulk_update_students(student_ids: list[str], data: dict):
     return success_count
 
 
+@invalidates("doan_vien_k74_k75")
 @retry_critical
 def delete_student(mssv: str) -> bool:
     if not mssv:
@@ -353,37 +362,83 @@ def delete_student(mssv: str) -> bool:
     return True
 
 
-@retry_critical
+@invalidates("doan_vien_k74_k75")
 def bulk_delete_students(student_ids: list[str]) -> tuple[int, list[str]]:
     if not student_ids:
         raise ValueError("Danh sách rỗng")
     
-    success_count = 0
-    errors = []
+    deleted, failures = bulk_delete_by_keys("doan_vien_k74_k75", "mssv", student_ids)
     
-    for mssv in student_ids:
-        try:
-            check_query = supabase.table("doan_vien_k74_k75")\
-                .select("mssv, ho_ten")\
-                .eq("mssv", mssv)\
-                .execute()
-            
-            if not check_query.data:
-                errors.append(f"MSSV {mssv}: Không tồn tại")
-                continue
-            
-            supabase.table("doan_vien_k74_k75")\
-                .delete()\
-                .eq("mssv", mssv)\
-                .execute()
-            
-            success_count += 1
-            
-        except Exception as e:
-            error_msg = f"MSSV {mssv}: {str(e)}"
-            errors.append(error_msg)
+    success_count = len(deleted)
+    errors = [f"MSSV {mssv}: {error}" for mssv, error in failures]
     
     if errors and success_count == 0:
         raise Exception("Xóa thất bại hoàn toàn:\n" + "\n".join(errors[:5]))
     
-    return success_count, errors
\ No newline at end of file
+    return success_count, errors
+
+
+@invalidates("doan_vien_k74_k75")
+def upsert_students(rows: list[tuple[int, dict]]) -> tuple[int, list[str]]:
+    """
+    Ghi hàng loạt sinh viên từ file import (thêm mới hoặc cập nhật theo MSSV)
+
+    Args:
+        rows: [(số_dòng_excel, data)] - data phải có "mssv" và "ho_ten"
+
+    Returns:
+        (số_dòng_thành_công, danh_sách_lỗi theo dòng)
+    """
+    if not rows:
+        return 0, []
+
+    # MSSV trùng trong file: dòng sau ghi đè dòng trước (như khi ghi tuần tự)
+    grouped: dict[str, tuple[list[int], dict]] = {}
+    for row_num, data in rows:
+        mssv = data["mssv"]
+        row_nums = grouped[mssv][0] if mssv in grouped else []
+        row_nums.append(row_num)
+        grouped[mssv] = (row_nums, dict(data))
+
+    try:
+        existing = fetch_by_keys("doan_vien_k74_k75", "mssv", grouped.keys(), columns="mssv, ho_ten")
+    except Exception as e:
+        # Không tra được MSSV đã có -> cả lô báo lỗi theo dòng (như lỗi ghi), không ném ra ngoài
+        failed_rows = sorted(
+            (row_num, mssv)
+            for mssv, (row_nums, _) in grouped.items()
+            for row_num in row_nums
+        )
+        return 0, [f"Dòng {row_num} (MSSV {mssv}): {e}" for row_num, mssv in failed_rows]
+
+    inserts, updates = [], []
+    for mssv, (row_nums, data) in grouped.items():
+        if mssv in existing:
+            # Không ghi đè họ tên của sinh viên đã có
+            data["ho_ten"] = existing[mssv].get("ho_ten") or data["ho_ten"]
+            updates.append((row_nums, data))
+        else:
+            inserts.append((row_nums, data))
+
+    success_count = 0
+    errors = []
+
+    for group in (inserts, updates):
+        if not group:
+            continue
+
+        _, failures = bulk_upsert(
+            "doan_vien_k74_k75",
+            [data for _, data in group],
+            on_conflict="mssv"
+        )
+
+        failed = dict(failures)
+        for idx, (row_nums, data) in enumerate(group):
+            if idx in failed:
+                for row_num in row_nums:
+                    errors.append(f"Dòng {row_num} (MSSV {data['mssv']}): {failed[idx]}")
+            else:
+                success_count += len(row_nums)
+
+    return success_count, errors
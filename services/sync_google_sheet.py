@@ -2,11 +2,18 @@ from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient
+from core.query_cache import invalidates
+from core.db_batch import bulk_upsert, bulk_insert, bulk_delete_by_keys
+from utils.text import fold_vietnamese
 from datetime import datetime, timedelta
 from typing import Tuple, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 import re
 import os
 import sys
+import threading
+import functools
+import hashlib
 
 # ============================================================================
 # CREDENTIALS LOADING - Hỗ trợ cả encrypted và plain file
@@ -58,6 +65,119 @@ RANGE_DATES = f"'{SHEET_NAME}'!B4:F4"
 RANGE_SANG = f"'{SHEET_NAME}'!B6:F14"
 RANGE_CHIEU = f"'{SHEET_NAME}'!B17:F25"
 
+# Số range tối đa trong 1 request batchGet khi sync nhiều tuần
+BATCH_GET_MAX_RANGES = 60
+# Số tuần xử lý song song khi sync nhiều tuần
+SYNC_MAX_WORKERS = 4
+
+
+def week_ranges(sheet_name: str = SHEET_NAME) -> Dict[str, str]:
+    """Các range của 1 tuần (1 tab) theo cùng bố cục với tab 'Lịch làm việc'"""
+    quoted = "'" + sheet_name.replace("'", "''") + "'"
+    return {
+        'dates': f"{quoted}!B4:F4",
+        'sang': f"{quoted}!B6:F14",
+        'chieu': f"{quoted}!B17:F25",
+    }
+
+_sheets_service = None
+_sheets_lock = threading.Lock()
+
+# Mỗi lần chỉ 1 lượt sync (nút "Đồng bộ", sync nhiều tuần, lịch nền): các lượt chạy song song
+# diff cùng 1 snapshot lich_truc -> insert trùng, và client googleapiclient/httplib2 không thread-safe.
+# RLock: sync_date_range giữ khóa rồi gọi sync_weeks.
+sync_lock = threading.RLock()
+
+
+def serialized_sync(func):
+    """Decorator: chạy hàm sync khi đang giữ sync_lock"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with sync_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def get_sheets_service():
+    """
+    Client Sheets API dùng chung giữa các lần sync.
+    Dùng discovery doc tĩnh đi kèm thư viện -> không tốn request discovery.
+    """
+    global _sheets_service
+    with _sheets_lock:
+        if _sheets_service is None and os.getenv('FAKE_SHEETS_FILE'):
+            # Chạy offline với sheet giả lập từ file JSON (xem services/fake_sheets.py)
+            from services.fake_sheets import FakeSheetsService
+            _sheets_service = FakeSheetsService(os.environ['FAKE_SHEETS_FILE'])
+        if _sheets_service is None:
+            credentials_file = get_credentials_file()
+            creds = Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
+            _sheets_service = build(
+                'sheets', 'v4',
+                credentials=creds,
+                static_discovery=True,
+                cache_discovery=False
+            )
+        return _sheets_service
+
+
+def reset_sheets_service() -> None:
+    """Bỏ client đã cache (lần sync sau sẽ tạo lại, VD khi đổi credentials)"""
+    global _sheets_service
+    with _sheets_lock:
+        _sheets_service = None
+
+
+def batch_get_many(service, ranges: List[str], spreadsheet_id: str = SHEET_ID) -> Dict[str, List[List]]:
+    """batchGet cho danh sách range dài: chia lô BATCH_GET_MAX_RANGES range / request"""
+    values = {}
+    for start in range(0, len(ranges), BATCH_GET_MAX_RANGES):
+        values.update(batch_get_values(service, ranges[start:start + BATCH_GET_MAX_RANGES], spreadsheet_id))
+    return values
+
+
+@retry_standard
+def list_sheet_tabs(service, spreadsheet_id: str = SHEET_ID) -> List[str]:
+    """Tên các tab trong spreadsheet (mỗi tab lịch là 1 tuần)"""
+    result = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets.properties.title'
+    ).execute()
+    return [sheet['properties']['title'] for sheet in result.get('sheets', [])]
+
+
+@retry_standard
+def batch_get_values(service, ranges: List[str], spreadsheet_id: str = SHEET_ID) -> Dict[str, List[List]]:
+    """
+    Đọc nhiều range trong 1 request values().batchGet
+    Returns: {range: values} - theo đúng thứ tự range truyền vào
+    """
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=ranges
+    ).execute()
+    
+    value_ranges = result.get('valueRanges', [])
+    return {
+        range_name: (value_ranges[i].get('values', []) if i < len(value_ranges) else [])
+        for i, range_name in enumerate(ranges)
+    }
+
+
+def sheet_revision(values: Dict[str, List[List]]) -> str:
+    """
+    Mã phiên bản nội dung các range đã đọc (scope readonly của Sheets API không trả revision)
+    Cùng mã -> sheet không đổi, bỏ qua lần sync
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for range_name in sorted(values):
+        digest.update(range_name.encode('utf-8'))
+        for row in values[range_name]:
+            digest.update(b'\x1e')
+            digest.update('\x1f'.join(str(v) for v in row).encode('utf-8'))
+        digest.update(b'\x1d')
+    return digest.hexdigest()
+
 
 def parse_cell_value(raw_value: str) -> Tuple[str, Optional[str], bool]:
     if not raw_value or str(raw_value).strip() == "":
@@ -96,33 +216,133 @@ def normalize_name(name: str) -> str:
 
 
 @retry_standard
-def find_can_bo_by_name(ho_ten: str) -> Optional[str]:
-    if not ho_ten:
-        return None
-    
-    ho_ten_normalized = normalize_name(ho_ten)
-    
+def _fetch_active_can_bo() -> List[Dict]:
+    result = supabase.table('can_bo_cap_truong')\
+        .select('id, ho_ten')\
+        .eq('trang_thai', 'Đang hoạt động')\
+        .execute()
+    return result.data or []
+
+
+class CanBoNameIndex:
+    """
+    Tra cứu cán bộ theo tên cho 1 lần sync: tải danh sách cán bộ 1 lần,
+    khớp tên đã chuẩn hóa trước, sau đó tên không dấu (chỉ khi không trùng).
+    Tên không khớp mới gọi RPC tim_can_bo_theo_ten, gom thành 1 lần gọi.
+    """
+
+    def __init__(self, can_bo_list: Optional[List[Dict]] = None):
+        """can_bo_list = None -> chỉ tải danh sách cán bộ khi thật sự cần tra tên"""
+        self._by_name: Dict[str, str] = {}
+        self._by_folded: Dict[str, Optional[str]] = {}
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._loaded = False
+        # Dùng chung giữa các tuần sync song song
+        self._lock = threading.RLock()
+
+        if can_bo_list is not None:
+            self._build(can_bo_list)
+
+    def _build(self, can_bo_list: List[Dict]) -> None:
+        for can_bo in can_bo_list:
+            if not can_bo.get('ho_ten'):
+                continue
+            self._by_name.setdefault(normalize_name(can_bo['ho_ten']), can_bo['id'])
+
+            folded = fold_vietnamese(can_bo['ho_ten'])
+            if folded in self._by_folded and self._by_folded[folded] != can_bo['id']:
+                self._by_folded[folded] = None  # Trùng tên không dấu -> không đoán
+            else:
+                self._by_folded[folded] = can_bo['id']
+        self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                self._build(_fetch_active_can_bo())
+            except Exception as e:
+                print(f"✗ Không tải được danh sách cán bộ: {e}")
+                self._loaded = True
+
+    @classmethod
+    def load(cls) -> 'CanBoNameIndex':
+        index = cls()
+        index._ensure_loaded()
+        return index
+
+    def lookup(self, ho_ten: str) -> Optional[str]:
+        """Chỉ tra trong bộ nhớ"""
+        if not ho_ten:
+            return None
+        self._ensure_loaded()
+        key = normalize_name(ho_ten)
+        if key in self._by_name:
+            return self._by_name[key]
+        if key in self._resolved:
+            return self._resolved[key]
+        return self._by_folded.get(fold_vietnamese(ho_ten))
+
+    def resolve_many(self, names: List[str]) -> Dict[str, Optional[str]]:
+        """Tra cả danh sách tên. Returns: {tên: can_bo_id hoặc None}"""
+        if not names:
+            return {}
+        with self._lock:
+            return self._resolve_many(names)
+
+    def _resolve_many(self, names: List[str]) -> Dict[str, Optional[str]]:
+        result = {name: self.lookup(name) for name in names if name}
+
+        misses = []
+        for name, can_bo_id in result.items():
+            key = normalize_name(name)
+            if can_bo_id is None and key not in self._resolved and key not in misses:
+                misses.append(key)
+
+        if misses:
+            self._resolved.update(_rpc_find_can_bo(misses))
+            for name in result:
+                if result[name] is None:
+                    result[name] = self._resolved.get(normalize_name(name))
+
+        return result
+
+
+def _rpc_find_can_bo(names: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Gọi RPC cho các tên chưa khớp: 1 lần tim_can_bo_theo_ten_nhieu (docs/sql),
+    nếu DB chưa có hàm đó thì gọi tim_can_bo_theo_ten từng tên.
+    """
+    found = {name: None for name in names}
+
     try:
-        result = supabase.table('can_bo_cap_truong')\
-            .select('id, ho_ten')\
-            .eq('trang_thai', 'Đang hoạt động')\
-            .execute()
-        
-        if result.data:
-            for can_bo in result.data:
-                if normalize_name(can_bo['ho_ten']) == ho_ten_normalized:
-                    return can_bo['id']
+        result = supabase.rpc('tim_can_bo_theo_ten_nhieu', {'search_names': names}).execute()
+        for item in result.data or []:
+            found[item['search_name']] = item.get('can_bo_id')
+        return found
     except Exception:
         pass
+
+    for name in names:
+        try:
+            result = supabase.rpc('tim_can_bo_theo_ten', {'search_name': name}).execute()
+            if result.data:
+                found[name] = result.data
+        except Exception:
+            pass
+
+    return found
+
+
+def find_can_bo_by_name(ho_ten: str, can_bo_index: Optional[CanBoNameIndex] = None) -> Optional[str]:
+    if not ho_ten:
+        return None
     
-    try:
-        result = supabase.rpc('tim_can_bo_theo_ten', {'search_name': ho_ten_normalized}).execute()
-        if result.data:
-            return result.data
-    except Exception:
-        pass
+    if can_bo_index is None:
+        can_bo_index = CanBoNameIndex.load()
     
-    return None
+    return can_bo_index.resolve_many([ho_ten]).get(ho_ten)
 
 
 def parse_date_from_sheet(date_str: str, year: int = None) -> Optional[datetime]:
@@ -147,20 +367,141 @@ def parse_date_from_sheet(date_str: str, year: int = None) -> Optional[datetime]
         return None
 
 
+LICH_TRUC_SYNC_COLUMNS = 'id, ngay_truc, ca_truc, ho_ten, sdt, can_bo_id, nguon, google_sheet_cell, raw_value, trang_thai'
+# Chỉ bản ghi ở trạng thái này mới được ghi đè / xóa bởi dữ liệu từ sheet
+OVERWRITABLE_STATUSES = ['Đã đăng ký']
+# Các cột so sánh để bỏ qua dòng không đổi
+_DIFF_FIELDS = ['sdt', 'can_bo_id', 'google_sheet_cell', 'raw_value']
+
+
+def cell_fingerprint(cell_addr: str, raw_value: str) -> str:
+    """Dấu vân tay của 1 ô: địa chỉ + nội dung thô (cột google_sheet_cell + raw_value)"""
+    return hashlib.blake2b(
+        f"{cell_addr}\x1f{str(raw_value).strip()}".encode('utf-8'),
+        digest_size=8
+    ).hexdigest()
+
+
+@retry_standard
+def load_lich_truc_for_dates(dates: List[datetime]) -> Dict[tuple, Dict]:
+    """
+    Lấy toàn bộ lịch trực của các ngày trong 1 query
+    Returns: {(ngay_truc, ca_truc, ho_ten): bản ghi}
+    """
+    res = supabase.table('lich_truc')\
+        .select(LICH_TRUC_SYNC_COLUMNS)\
+        .in_('ngay_truc', [d.date().isoformat() for d in dates])\
+        .execute()
+    
+    existing = {}
+    for row in res.data or []:
+        existing.setdefault((row['ngay_truc'], row['ca_truc'], row['ho_ten']), row)
+    return existing
+
+
+def sheet_fingerprints(existing: Dict[tuple, Dict], ca_truc: str) -> Dict[tuple, Tuple[str, Dict]]:
+    """
+    Vân tay các ô đã sync lần trước (dòng có nguồn Google Sheet) của 1 ca
+    Returns: {(ngay_truc, ô): (vân_tay, bản ghi)}
+    """
+    fingerprints = {}
+    for row in existing.values():
+        if row['ca_truc'] != ca_truc or row.get('nguon') != 'Google Sheet':
+            continue
+        if not row.get('google_sheet_cell'):
+            continue
+        fingerprints[(row['ngay_truc'], row['google_sheet_cell'])] = (
+            cell_fingerprint(row['google_sheet_cell'], row.get('raw_value') or ''),
+            row
+        )
+    return fingerprints
+
+
+def diff_lich_truc(
+    cells: List[Dict],
+    existing: Dict[tuple, Dict]
+) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    So dữ liệu sheet với DB.
+    Returns: (inserts, updates, skips) - mỗi phần tử là cell kèm 'data' / 'record'
+    """
+    inserts, updates, skips = [], [], []
+    
+    # Trùng (ngày, ca, tên) trong sheet -> ô sau cùng thắng, như khi ghi lần lượt
+    latest = {}
+    for cell in cells:
+        data = cell['data']
+        key = (data['ngay_truc'], data['ca_truc'], data['ho_ten'])
+        if key in latest:
+            skips.append({**latest[key], 'reason': 'duplicate'})
+        latest[key] = cell
+    
+    for key, cell in latest.items():
+        record = existing.get(key)
+        if record is None:
+            inserts.append(cell)
+        elif record['trang_thai'] not in OVERWRITABLE_STATUSES:
+            skips.append({**cell, 'record': record, 'reason': 'protected'})
+        elif all((record.get(f) or None) == (cell['data'].get(f) or None) for f in _DIFF_FIELDS):
+            skips.append({**cell, 'record': record, 'reason': 'unchanged'})
+        else:
+            updates.append({**cell, 'record': record})
+    
+    return inserts, updates, skips
+
+
+def parse_week_dates(date_rows: List[List], year: int = None) -> List[datetime]:
+    """Parse hàng ngày (B4:F4) thành 5 ngày trong tuần"""
+    date_values = date_rows[0] if date_rows else []
+    
+    dates = []
+    current_year = year or datetime.now().year
+    
+    for date_str in date_values[:5]:
+        parsed_date = parse_date_from_sheet(str(date_str), current_year)
+        # Tuần vắt qua năm mới (VD: 30/12 -> 03/01)
+        if parsed_date and dates and parsed_date < dates[-1]:
+            current_year += 1
+            parsed_date = parse_date_from_sheet(str(date_str), current_year)
+        if parsed_date:
+            dates.append(parsed_date)
+        else:
+            print(f"✗ Không parse được ngày: '{date_str}'")
+    
+    if len(dates) != 5:
+        raise ValueError(f"Không đủ 5 ngày hợp lệ. Chỉ parse được {len(dates)} ngày: {date_values[:5]}")
+    
+    return dates
+
+
 @retry_patient
 def sync_one_range(
     service,
     range_name: str,
     ca_truc: str,
-    dates: List[datetime]
-) -> Tuple[int, int, List[str]]:
+    dates: List[datetime],
+    can_bo_index: Optional[CanBoNameIndex] = None,
+    existing: Optional[Dict[tuple, Dict]] = None,
+    values: Optional[List[List]] = None
+) -> Tuple[int, int, List[str], Dict]:
+    """
+    Đồng bộ 1 range (1 ca x 5 ngày). Chỉ xử lý ô được thêm / sửa / xóa
+    so với lần sync trước (so vân tay ô), ô không đổi tính là bỏ qua
+    - trừ ô chưa gắn được cán bộ (can_bo_id null): luôn tra tên lại.
+    
+    Returns:
+        (thành_công, số_lỗi, danh_sách_lỗi, thống_kê)
+        thống_kê = {'inserted', 'updated', 'deleted', 'skipped'}
+    """
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+    
     try:
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range=range_name
-        ).execute()
-        
-        values = result.get('values', [])
+        if values is None:
+            result = service.spreadsheets().values().get(
+                spreadsheetId=SHEET_ID,
+                range=range_name
+            ).execute()
+            values = result.get('values', [])
         
         success_count = 0
         error_count = 0
@@ -170,175 +511,227 @@ def sync_one_range(
         print(f"Số hàng: {len(values)}")
         print(f"Ngày: {[d.strftime('%d/%m/%Y') for d in dates]}")
         
+        if can_bo_index is None:
+            can_bo_index = CanBoNameIndex()
+        if existing is None:
+            existing = load_lich_truc_for_dates(dates)
+        
+        previous = sheet_fingerprints(existing, ca_truc)
+        start_row = int(range_name.split('!')[1].split(':')[0][1:])
+        
+        # Lọc các ô thay đổi so với lần sync trước
+        changed = []
+        seen = set()
         for row_idx, row in enumerate(values):
-            for col_idx in range(min(len(row), 5)):
-                cell_value = row[col_idx] if col_idx < len(row) else ""
+            for col_idx in range(min(len(row), 5, len(dates))):
+                cell_value = row[col_idx]
                 
                 if not cell_value or str(cell_value).strip() == "":
                     continue
                 
-                if col_idx >= len(dates):
-                    continue
-                
                 ngay_truc = dates[col_idx]
+                cell_addr = f"{chr(ord('B') + col_idx)}{start_row + row_idx}"
+                key = (ngay_truc.date().isoformat(), cell_addr)
+                seen.add(key)
                 
-                col_letter = chr(ord('B') + col_idx)
-                row_number = int(range_name.split('!')[1].split(':')[0][1:]) + row_idx
-                cell_addr = f"{col_letter}{row_number}"
-                
-                cell_str_val = str(cell_value)
-                
-                print(f"\n  Cell {cell_addr} ({ngay_truc.strftime('%d/%m/%Y')}): '{cell_str_val}'")
-                
-                try:
-                    ho_ten, sdt, is_valid = parse_cell_value(cell_str_val)
-                    
-                    print(f"    → Parsed: tên='{ho_ten}', sđt='{sdt}', valid={is_valid}")
-                    
-                    if not is_valid or not ho_ten:
-                        error_msg = f"Parse thất bại hoặc không có tên"
-                        print(f"{error_msg}")
-                        error_count += 1
-                        errors.append(f"{cell_addr} ({ngay_truc.strftime('%d/%m')}): {error_msg}")
-                        continue
-                    
-                    can_bo_id = find_can_bo_by_name(ho_ten)
-                    
-                    if can_bo_id:
-                        print(f"✓ Tìm thấy cán bộ ID: {can_bo_id}")
-                    else:
-                        print(f"✗ Không tìm thấy cán bộ trong DB")
-                    
-                    existing = supabase.table('lich_truc')\
-                        .select('id, trang_thai')\
-                        .eq('ngay_truc', ngay_truc.date().isoformat())\
-                        .eq('ca_truc', ca_truc)\
-                        .eq('ho_ten', ho_ten)\
-                        .limit(1)\
-                        .execute()
-                    
-                    data = {
-                        'ngay_truc': ngay_truc.date().isoformat(),
-                        'ca_truc': ca_truc,
-                        'ho_ten': ho_ten,
-                        'sdt': sdt if sdt else "",
-                        'can_bo_id': can_bo_id,
-                        'nguon': 'Google Sheet',
-                        'google_sheet_cell': cell_addr,
-                        'raw_value': cell_str_val,
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    if existing.data:
-                        record = existing.data[0]
-                        
-                        if record['trang_thai'] in ['Đã đăng ký']:
-                            supabase.table('lich_truc')\
-                                .update(data)\
-                                .eq('id', record['id'])\
-                                .execute()
-                            print(f"✓ Updated existing record (ID: {record['id']})")
-                        else:
-                            print(f"⊘ Skip: Trạng thái '{record['trang_thai']}' không cho phép update")
-                    else:
-                        data['trang_thai'] = 'Đã đăng ký'
-                        data['created_at'] = datetime.now().isoformat()
-                        supabase.table('lich_truc').insert(data).execute()
-                        print(f"✓ Inserted new record")
-                    
-                    success_count += 1
+                # Bản ghi chưa gắn cán bộ -> tra tên lại (cán bộ có thể mới được thêm)
+                old = previous.get(key)
+                if old and old[1].get('can_bo_id') and old[0] == cell_fingerprint(cell_addr, str(cell_value)):
+                    stats['skipped'] += 1
+                    continue
                 
-                except Exception as e:
-                    error_msg = str(e)
-                    print(f"✗ Error: {error_msg}")
-                    error_count += 1
-                    errors.append(f"{cell_addr} ({ngay_truc.strftime('%d/%m')}): {error_msg}")
+                changed.append((ngay_truc, cell_addr, str(cell_value)))
+        
+        # Ô đã xóa / đổi người trên sheet -> bản ghi cũ của ô đó có thể phải bỏ
+        cleared = [row for key, (_, row) in previous.items() if key not in seen]
+        replaced = [
+            previous[(d.date().isoformat(), addr)][1] for d, addr, _ in changed
+            if (d.date().isoformat(), addr) in previous
+        ]
+        stale = cleared + replaced
+        
+        success_count += stats['skipped']
+        print(f"Ô không đổi: {stats['skipped']}, ô thay đổi: {len(changed)}, ô bị xóa: {len(cleared)}")
+        
+        # Tra tên của các ô thay đổi 1 lần trước khi ghi
+        can_bo_ids = can_bo_index.resolve_many([parse_cell_value(raw)[0] for _, _, raw in changed])
+        now = datetime.now().isoformat()
+        cells = []
         
+        for ngay_truc, cell_addr, cell_str_val in changed:
+            label = f"{cell_addr} ({ngay_truc.strftime('%d/%m')})"
+            
+            print(f"\n  Cell {cell_addr} ({ngay_truc.strftime('%d/%m/%Y')}): '{cell_str_val}'")
+            
+            ho_ten, sdt, is_valid = parse_cell_value(cell_str_val)
+            
+            print(f"    → Parsed: tên='{ho_ten}', sđt='{sdt}', valid={is_valid}")
+            
+            if not is_valid or not ho_ten:
+                error_msg = f"Parse thất bại hoặc không có tên"
+                print(f"{error_msg}")
+                error_count += 1
+                errors.append(f"{label}: {error_msg}")
+                continue
+            
+            can_bo_id = can_bo_ids.get(ho_ten)
+            
+            if can_bo_id:
+                print(f"✓ Tìm thấy cán bộ ID: {can_bo_id}")
+            else:
+                print(f"✗ Không tìm thấy cán bộ trong DB")
+            
+            cells.append({
+                'label': label,
+                'data': {
+                    'ngay_truc': ngay_truc.date().isoformat(),
+                    'ca_truc': ca_truc,
+                    'ho_ten': ho_ten,
+                    'sdt': sdt if sdt else "",
+                    'can_bo_id': can_bo_id,
+                    'nguon': 'Google Sheet',
+                    'google_sheet_cell': cell_addr,
+                    'raw_value': cell_str_val,
+                    'updated_at': now
+                }
+            })
+        
+        inserts, updates, skips = diff_lich_truc(cells, existing)
+        
+        for cell in skips:
+            if cell['reason'] == 'protected':
+                print(f"⊘ Skip {cell['label']}: Trạng thái '{cell['record']['trang_thai']}' không cho phép update")
+        stats['skipped'] += len(skips)
+        success_count += len(skips)
+        
+        update_records = [
+            {**cell['data'], 'id': cell['record']['id'], 'trang_thai': cell['record']['trang_thai']}
+            for cell in updates
+        ]
+        written, failures = bulk_upsert('lich_truc', update_records, on_conflict='id')
+        stats['updated'] += written
+        success_count += written
+        for index, error_msg in failures:
+            error_count += 1
+            errors.append(f"{updates[index]['label']}: {error_msg}")
+        
+        insert_records = [
+            {**cell['data'], 'trang_thai': 'Đã đăng ký', 'created_at': now}
+            for cell in inserts
+        ]
+        written, failures = bulk_insert('lich_truc', insert_records)
+        stats['inserted'] += written
+        success_count += written
+        for index, error_msg in failures:
+            error_count += 1
+            errors.append(f"{inserts[index]['label']}: {error_msg}")
+        
+        # Bản ghi của ô cũ không còn tương ứng với ô nào trên sheet -> xóa
+        # (bản ghi vừa được update giữ lại; trạng thái đã xác nhận thì không đụng)
+        current_keys = {(c['data']['ngay_truc'], c['data']['ca_truc'], c['data']['ho_ten']) for c in cells}
+        to_delete = {
+            row['id'] for row in stale
+            if (row['ngay_truc'], row['ca_truc'], row['ho_ten']) not in current_keys
+            and row['trang_thai'] in OVERWRITABLE_STATUSES
+        }
+        if to_delete:
+            deleted, failures = bulk_delete_by_keys('lich_truc', 'id', to_delete)
+            stats['deleted'] += len(deleted)
+            for record_id, error_msg in failures:
+                error_count += 1
+                errors.append(f"Xóa lịch trực {record_id}: {error_msg}")
+        
+        print(f"\n✓ Ghi DB: {stats['inserted']} thêm, {stats['updated']} cập nhật, "
+              f"{stats['deleted']} xóa, {stats['skipped']} bỏ qua")
         print(f"\nKết quả {ca_truc}: {success_count} thành công, {error_count} lỗi")
-        return (success_count, error_count, errors)
+        return (success_count, error_count, errors, stats)
     
     except Exception as e:
         error_msg = f"Lỗi đọc range {range_name}: {str(e)}"
         print(f"✗ {error_msg}")
-        return (0, 1, [error_msg])
+        return (0, 1, [error_msg], stats)
 
 
-@retry_patient
-def sync_full_week() -> Dict:
+def _error_result(error_msg: str, duration: float) -> Dict:
+    return {
+        'success': False,
+        'sang': {'success': 0, 'errors': 0},
+        'chieu': {'success': 0, 'errors': 0},
+        'total_success': 0,
+        'total_errors': 1,
+        'total_skipped': 0,
+        'total_writes': 0,
+        'error_details': [error_msg],
+        'duration': duration
+    }
+
+
+def sync_week(
+    service,
+    dates: List[datetime],
+    sang_values: List[List],
+    chieu_values: List[List],
+    sheet_name: str = SHEET_NAME,
+    can_bo_index: Optional[CanBoNameIndex] = None
+) -> Dict:
+    """
+    Đồng bộ 1 tuần đã đọc sẵn từ sheet vào lich_truc và ghi 1 dòng google_sheet_sync_log
+    Returns: dict kết quả (cùng dạng với sync_full_week)
+    """
     start_time = datetime.now()
+    ranges = week_ranges(sheet_name)
+    
+    print(f"✓ Tuần {dates[0].strftime('%d/%m')} - {dates[-1].strftime('%d/%m/%Y')} ({sheet_name}):")
+    for d in dates:
+        weekday = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật"][d.weekday()]
+        print(f"  - {weekday}: {d.strftime('%d/%m/%Y')}")
+    
+    all_errors = []
+    if can_bo_index is None:
+        can_bo_index = CanBoNameIndex()
+    existing = load_lich_truc_for_dates(dates)
+    
+    print(f"\nĐang sync ca SÁNG...")
+    success_sang, error_sang, errors_sang, stats_sang = sync_one_range(
+        service, ranges['sang'], "Sáng", dates, can_bo_index, existing,
+        values=sang_values
+    )
+    all_errors.extend([f"[Sáng] {e}" for e in errors_sang])
+    
+    print(f"\nĐang sync ca CHIỀU...")
+    success_chieu, error_chieu, errors_chieu, stats_chieu = sync_one_range(
+        service, ranges['chieu'], "Chiều", dates, can_bo_index, existing,
+        values=chieu_values
+    )
+    all_errors.extend([f"[Chiều] {e}" for e in errors_chieu])
+    
+    total_success = success_sang + success_chieu
+    total_errors = error_sang + error_chieu
+    total_skipped = stats_sang['skipped'] + stats_chieu['skipped']
+    total_writes = sum(
+        stats[k] for stats in (stats_sang, stats_chieu)
+        for k in ('inserted', 'updated', 'deleted')
+    )
+    duration = (datetime.now() - start_time).total_seconds()
+    week_str = f"{dates[0].strftime('%d/%m')} - {dates[-1].strftime('%d/%m/%Y')}"
     
     print(f"\n{'='*60}")
-    print(f"BẮT ĐẦU ĐỒNG BỘ TUẦN")
-    print(f"{'='*60}")
+    print(f"KẾT QUẢ TUẦN {week_str}:")
+    print(f"Thành công: {total_success}")
+    print(f"Lỗi: {total_errors}")
+    print(f"Không đổi: {total_skipped}")
+    print(f"Thời gian: {duration:.2f}s")
+    print(f"{'='*60}\n")
     
-    try:
-        # Lấy credentials file (encrypted hoặc plain)
-        credentials_file = get_credentials_file()
-        
-        # Tạo credentials từ file
-        creds = Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
-        service = build('sheets', 'v4', credentials=creds)
-        
-        print(f"\n✓ Đã kết nối Google Sheets API")
-        print(f"Đọc ngày từ sheet...")
-        
-        date_result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range=RANGE_DATES
-        ).execute()
-        
-        date_values = date_result.get('values', [[]])[0] if date_result.get('values') else []
-        
-        dates = []
-        current_year = datetime.now().year
-        
-        for date_str in date_values[:5]:
-            parsed_date = parse_date_from_sheet(str(date_str), current_year)
-            if parsed_date:
-                dates.append(parsed_date)
-            else:
-                print(f"✗ Không parse được ngày: '{date_str}'")
-        
-        if len(dates) != 5:
-            raise ValueError(f"Không đủ 5 ngày hợp lệ. Chỉ parse được {len(dates)} ngày: {date_values[:5]}")
-        
-        print(f"✓ Đã parse 5 ngày:")
-        for i, d in enumerate(dates):
-            weekday = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật"][d.weekday()]
-            print(f"  - {weekday}: {d.strftime('%d/%m/%Y')}")
-        
-        all_errors = []
-        
-        print(f"\nĐang sync ca SÁNG...")
-        success_sang, error_sang, errors_sang = sync_one_range(
-            service, RANGE_SANG, "Sáng", dates
-        )
-        all_errors.extend([f"[Sáng] {e}" for e in errors_sang])
-        
-        print(f"\nĐang sync ca CHIỀU...")
-        success_chieu, error_chieu, errors_chieu = sync_one_range(
-            service, RANGE_CHIEU, "Chiều", dates
-        )
-        all_errors.extend([f"[Chiều] {e}" for e in errors_chieu])
-        
-        total_success = success_sang + success_chieu
-        total_errors = error_sang + error_chieu
-        duration = (datetime.now() - start_time).total_seconds()
-        
-        print(f"\n{'='*60}")
-        print(f"KẾT QUẢ TỔNG HỢP:")
-        print(f"Thành công: {total_success}")
-        print(f"Lỗi: {total_errors}")
-        print(f"Thời gian: {duration:.2f}s")
-        print(f"{'='*60}\n")
-        
+    # Tuần không có gì thay đổi -> không ghi gì vào DB, kể cả log
+    if total_writes == 0 and total_errors == 0:
+        print("⊘ Sheet không thay đổi - bỏ qua ghi log")
+    else:
         try:
-            week_str = f"{dates[0].strftime('%d/%m')} - {dates[-1].strftime('%d/%m/%Y')}"
-            
             supabase.table('google_sheet_sync_log').insert({
                 'sheet_id': SHEET_ID,
                 'sheet_name': f'Tuần {week_str}',
-                'range_sync': f'{RANGE_SANG}, {RANGE_CHIEU}',
+                'range_sync': f"{ranges['sang']}, {ranges['chieu']}",
                 'so_dong_thanh_cong': total_success,
                 'so_dong_loi': total_errors,
                 'danh_sach_loi': str(all_errors)[:1000] if all_errors else None,
@@ -351,17 +744,48 @@ def sync_full_week() -> Dict:
             print("✓ Đã log kết quả vào database")
         except Exception as log_error:
             print(f"✗ Không thể log vào DB: {log_error}")
+    
+    return {
+        'success': total_errors == 0,
+        'sang': {'success': success_sang, 'errors': error_sang, **stats_sang},
+        'chieu': {'success': success_chieu, 'errors': error_chieu, **stats_chieu},
+        'total_success': total_success,
+        'total_errors': total_errors,
+        'total_skipped': total_skipped,
+        'total_writes': total_writes,
+        'error_details': all_errors,
+        'duration': duration,
+        'week_range': week_str,
+        'sheet_name': sheet_name
+    }
+
+
+@invalidates('lich_truc')
+@retry_patient
+@serialized_sync
+def sync_full_week() -> Dict:
+    start_time = datetime.now()
+    
+    print(f"\n{'='*60}")
+    print(f"BẮT ĐẦU ĐỒNG BỘ TUẦN")
+    print(f"{'='*60}")
+    
+    try:
+        service = get_sheets_service()
         
-        return {
-            'success': total_errors == 0,
-            'sang': {'success': success_sang, 'errors': error_sang},
-            'chieu': {'success': success_chieu, 'errors': error_chieu},
-            'total_success': total_success,
-            'total_errors': total_errors,
-            'error_details': all_errors,
-            'duration': duration,
-            'week_range': f"{dates[0].strftime('%d/%m')} - {dates[-1].strftime('%d/%m/%Y')}"
-        }
+        print(f"\n✓ Đã kết nối Google Sheets API")
+        print(f"Đọc ngày + ca sáng + ca chiều từ sheet (1 request)...")
+        
+        sheet_values = batch_get_values(service, [RANGE_DATES, RANGE_SANG, RANGE_CHIEU])
+        
+        dates = parse_week_dates(sheet_values[RANGE_DATES])
+        
+        result = sync_week(
+            service, dates,
+            sheet_values[RANGE_SANG], sheet_values[RANGE_CHIEU]
+        )
+        result['duration'] = (datetime.now() - start_time).total_seconds()
+        return result
     
     except FileNotFoundError as e:
         error_msg = str(e)
@@ -372,36 +796,185 @@ def sync_full_week() -> Dict:
         print(f"Chi tiết: {error_msg}")
         print(f"{'='*60}\n")
         
-        return {
-            'success': False,
-            'sang': {'success': 0, 'errors': 0},
-            'chieu': {'success': 0, 'errors': 0},
-            'total_success': 0,
-            'total_errors': 1,
-            'error_details': [error_msg],
-            'duration': duration
-        }
+        return _error_result(error_msg, duration)
     
     except Exception as e:
         error_msg = str(e)
         duration = (datetime.now() - start_time).total_seconds()
+        reset_sheets_service()
         
         print(f"\n{'='*60}")
         print(f"✗ LỖI NGHIÊM TRỌNG: {error_msg}")
         print(f"{'='*60}\n")
         
+        return _error_result(f"Lỗi nghiêm trọng: {error_msg}", duration)
+
+
+def _weeks_in_range(
+    date_rows: Dict[str, List[List]],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> Dict[str, List[datetime]]:
+    """Parse hàng ngày của từng tab, giữ các tab có ngày nằm trong [start_date, end_date]"""
+    years = [None]
+    if start_date and end_date:
+        years = list(range(start_date.year, end_date.year + 1))
+    elif start_date or end_date:
+        years = [(start_date or end_date).year]
+    
+    weeks = {}
+    for sheet_name, rows in date_rows.items():
+        for year in years:
+            try:
+                dates = parse_week_dates(rows, year)
+            except ValueError:
+                break  # Tab không theo bố cục lịch tuần
+            
+            if start_date and dates[-1].date() < start_date.date():
+                continue
+            if end_date and dates[0].date() > end_date.date():
+                continue
+            weeks[sheet_name] = dates
+            break
+    return weeks
+
+
+@invalidates('lich_truc')
+@serialized_sync
+def sync_weeks(
+    sheet_names: List[str],
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    max_workers: int = SYNC_MAX_WORKERS
+) -> Dict:
+    """
+    Đồng bộ nhiều tuần (mỗi tab 1 tuần) trong 1 lần:
+    - Đọc hàng ngày của mọi tab bằng batchGet, lọc theo khoảng ngày (nếu có)
+    - Đọc ca sáng / chiều của các tuần được chọn bằng batchGet
+    - Xử lý các tuần song song (tối đa max_workers), mỗi tuần 1 dòng sync log
+    
+    Returns:
+        {'success', 'weeks': [kết quả từng tuần], 'total_success', 'total_errors',
+         'total_skipped', 'error_details', 'skipped_tabs' (tab trùng tuần), 'duration'}
+    """
+    start_time = datetime.now()
+    
+    print(f"\n{'='*60}")
+    print(f"BẮT ĐẦU ĐỒNG BỘ {len(sheet_names)} TAB")
+    print(f"{'='*60}")
+    
+    try:
+        service = get_sheets_service()
+        
+        date_ranges = {name: week_ranges(name)['dates'] for name in sheet_names}
+        date_values = batch_get_many(service, list(date_ranges.values()))
+        weeks = _weeks_in_range(
+            {name: date_values.get(r, []) for name, r in date_ranges.items()},
+            start_date, end_date
+        )
+        
+        # Tab copy / đổi tên cùng 1 tuần -> chỉ giữ tab sau cùng, tránh 2 worker insert trùng 1 tuần
+        week_tabs = {}
+        for name, dates in weeks.items():
+            week_tabs[tuple(dates)] = name
+        kept_tabs = set(week_tabs.values())
+        skipped_tabs = [name for name in weeks if name not in kept_tabs]
+        weeks = {name: dates for name, dates in weeks.items() if name in kept_tabs}
+        for name in skipped_tabs:
+            print(f"⊘ Bỏ qua tab '{name}': trùng tuần với tab khác")
+        
+        print(f"✓ {len(weeks)} tuần cần đồng bộ")
+        
+        shift_ranges = []
+        for name in weeks:
+            ranges = week_ranges(name)
+            shift_ranges.extend([ranges['sang'], ranges['chieu']])
+        shift_values = batch_get_many(service, shift_ranges)
+    
+    except Exception as e:
+        duration = (datetime.now() - start_time).total_seconds()
+        reset_sheets_service()
+        print(f"✗ LỖI ĐỌC SHEET: {e}")
         return {
             'success': False,
-            'sang': {'success': 0, 'errors': 0},
-            'chieu': {'success': 0, 'errors': 0},
+            'weeks': [],
             'total_success': 0,
             'total_errors': 1,
-            'error_details': [f"Lỗi nghiêm trọng: {error_msg}"],
+            'total_skipped': 0,
+            'error_details': [f"Lỗi đọc sheet: {e}"],
+            'skipped_tabs': [],
             'duration': duration
         }
+    
+    can_bo_index = CanBoNameIndex()
+    
+    def _run(name: str) -> Dict:
+        ranges = week_ranges(name)
+        try:
+            return sync_week(
+                service, weeks[name],
+                shift_values.get(ranges['sang'], []),
+                shift_values.get(ranges['chieu'], []),
+                sheet_name=name,
+                can_bo_index=can_bo_index
+            )
+        except Exception as e:
+            result = _error_result(f"[{name}] {e}", 0)
+            result['sheet_name'] = name
+            return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(_run, weeks))
+    
+    results.sort(key=lambda r: weeks.get(r.get('sheet_name'), [datetime.min])[0])
+    error_details = [
+        f"[{r.get('week_range', r.get('sheet_name'))}] {e}"
+        for r in results for e in r['error_details']
+    ]
+    
+    return {
+        'success': all(r['success'] for r in results),
+        'weeks': results,
+        'total_success': sum(r['total_success'] for r in results),
+        'total_errors': sum(r['total_errors'] for r in results),
+        'total_skipped': sum(r.get('total_skipped', 0) for r in results),
+        'total_writes': sum(r.get('total_writes', 0) for r in results),
+        'error_details': error_details,
+        'skipped_tabs': skipped_tabs,
+        'duration': (datetime.now() - start_time).total_seconds()
+    }
+
+
+@serialized_sync
+def sync_date_range(start_date: datetime, end_date: datetime, max_workers: int = SYNC_MAX_WORKERS) -> Dict:
+    """Đồng bộ mọi tuần (tab) có ngày trực nằm trong khoảng - dùng để backfill cả học kỳ"""
+    try:
+        sheet_names = list_sheet_tabs(get_sheets_service())
+    except Exception as e:
+        reset_sheets_service()
+        return {
+            'success': False,
+            'weeks': [],
+            'total_success': 0,
+            'total_errors': 1,
+            'total_skipped': 0,
+            'error_details': [f"Không lấy được danh sách tab: {e}"],
+            'skipped_tabs': [],
+            'duration': 0
+        }
+    
+    return sync_weeks(sheet_names, start_date, end_date, max_workers)
 
 
-@retry_patient
 def sync_specific_week(year: int, month: int, day: int) -> Dict:
-    print(f"sync_specific_week() deprecated - redirecting to sync_full_week()")
-    return sync_full_week()
\ No newline at end of file
+    """Đồng bộ tuần (tab) chứa ngày year-month-day"""
+    target = datetime(year, month, day)
+    # Lọc theo cả tuần Thứ 2 - Chủ nhật: tab chỉ có Thứ 2 - Thứ 6 vẫn khớp khi target là Thứ 7 / CN
+    monday = target - timedelta(days=target.weekday())
+    result = sync_date_range(monday, monday + timedelta(days=6))
+    
+    if result['weeks']:
+        return result['weeks'][0]
+    error_msg = "; ".join(result['error_details']) or \
+        f"Không tìm thấy tab lịch chứa ngày {target.strftime('%d/%m/%Y')}"
+    return _error_result(error_msg, result['duration'])
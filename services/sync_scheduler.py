@@ -0,0 +1,208 @@
+# services/sync_scheduler.py
+"""
+Đồng bộ lịch trực từ Google Sheet định kỳ ở nền (thread riêng, không chặn UI).
+- Tắt mặc định (SHEET_SYNC_INTERVAL=0): sync_lock chỉ khóa trong 1 tiến trình,
+  chỉ bật trên 1 máy admin để 2 máy không cùng chèn 1 dòng
+- Mỗi lượt: 1 request batchGet; sheet không đổi (cùng revision) -> bỏ qua đọc / ghi DB
+- Lỗi -> giãn cách lượt sau theo cấp số nhân, tối đa SHEET_SYNC_MAX_BACKOFF
+- Có ghi dữ liệu -> báo cho các listener (tab Lịch trực tải lại)
+
+Chạy độc lập không cần UI:
+    python -m services.sync_scheduler [--once] [--interval 60] [--fake sheet.json]
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from core.query_cache import query_cache
+from services.sync_google_sheet import (
+    SHEET_NAME, week_ranges, get_sheets_service, reset_sheets_service,
+    batch_get_values, sheet_revision, parse_week_dates, sync_week, sync_lock
+)
+
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("SHEET_SYNC_INTERVAL", "0"))
+SYNC_MAX_BACKOFF_SECONDS = float(os.getenv("SHEET_SYNC_MAX_BACKOFF", "3600"))
+
+
+class SheetSyncScheduler:
+    """Lịch đồng bộ nền cho 1 tab tuần hiện tại của sheet lịch trực"""
+
+    def __init__(
+        self,
+        interval: float = SYNC_INTERVAL_SECONDS,
+        max_backoff: float = SYNC_MAX_BACKOFF_SECONDS,
+        sheet_name: str = SHEET_NAME
+    ):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.sheet_name = sheet_name
+        self.failures = 0
+        self.last_result: Optional[Dict] = None
+        self.last_run: Optional[datetime] = None
+        self._revision: Optional[str] = None
+        self._listeners: Dict[object, Callable[[Dict], None]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_listener(self, listener: Callable[[Dict], None], key: object = None) -> None:
+        """Đăng ký listener; cùng key -> thay listener cũ (VD tab được tạo lại)"""
+        with self._lock:
+            self._listeners[listener if key is None else key] = listener
+
+    def remove_listener(self, listener: Callable[[Dict], None] = None, key: object = None) -> None:
+        with self._lock:
+            if key is None:
+                key = next((k for k, v in self._listeners.items() if v is listener), None)
+            self._listeners.pop(key, None)
+
+    def _notify(self, result: Dict) -> None:
+        with self._lock:
+            listeners = list(self._listeners.items())
+        for key, listener in listeners:
+            try:
+                listener(result)
+            except Exception as e:
+                # Listener lỗi (VD trang đã đóng) -> gỡ ra, không ảnh hưởng lượt sync
+                print(f"[SYNC] Gỡ listener lỗi: {e}")
+                self.remove_listener(key=key)
+
+    def next_delay(self) -> float:
+        """Khoảng chờ tới lượt sau: interval, nhân đôi sau mỗi lần lỗi liên tiếp"""
+        if self.failures == 0:
+            return self.interval
+        return min(self.interval * (2 ** self.failures), self.max_backoff)
+
+    def run_once(self) -> Optional[Dict]:
+        """
+        Chạy 1 lượt đồng bộ.
+        Returns: kết quả sync_week, hoặc None nếu sheet không đổi từ lượt trước (không chạm DB)
+        """
+        # Cùng khóa với sync_full_week / sync_weeks: không chạy song song với nút "Đồng bộ"
+        with sync_lock:
+            ranges = week_ranges(self.sheet_name)
+            service = get_sheets_service()
+            values = batch_get_values(service, [ranges['dates'], ranges['sang'], ranges['chieu']])
+
+            # Sheets API không có revision rẻ hơn batchGet -> vẫn đọc sheet, chỉ bỏ qua phần DB
+            revision = sheet_revision(values)
+            if revision == self._revision:
+                print(f"[SYNC] ⊘ Sheet không đổi - bỏ qua đọc / ghi DB")
+                return None
+
+            result = sync_week(
+                service, parse_week_dates(values[ranges['dates']]),
+                values[ranges['sang']], values[ranges['chieu']],
+                sheet_name=self.sheet_name
+            )
+            query_cache.invalidate_table('lich_truc')
+            self._revision = revision
+            return result
+
+    def _tick(self) -> None:
+        try:
+            result = self.run_once()
+            self.failures = 0
+        except Exception as e:
+            self.failures += 1
+            reset_sheets_service()
+            print(f"[SYNC] ✗ Lỗi đồng bộ nền (lần {self.failures}): {e}")
+            return
+        finally:
+            self.last_run = datetime.now()
+
+        if result is not None:
+            self.last_result = result
+            self._notify(result)
+
+    def _loop(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            self._tick()
+            self._wake.wait(self.next_delay())
+            self._wake.clear()
+
+    def start(self) -> bool:
+        """Bắt đầu chạy nền (interval <= 0 -> tắt). Returns: True nếu đang chạy"""
+        if self.interval <= 0:
+            return False
+        if not self.running:
+            # Event riêng cho mỗi thread -> thread cũ đang dừng dở không chạy tiếp
+            self._stop = threading.Event()
+            self._wake.clear()
+            self._thread = threading.Thread(
+                target=self._loop, args=(self._stop,), name="sheet-sync", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def trigger(self) -> None:
+        """Chạy lượt tiếp theo ngay, không chờ hết interval"""
+        self._wake.set()
+
+    def stop(self, timeout: float = None) -> None:
+        """Dừng thread nền và gỡ mọi listener (VD khi đăng xuất)"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            self._listeners.clear()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._revision = None
+
+
+sheet_sync_scheduler = SheetSyncScheduler()
+
+
+def start_sheet_sync_scheduler() -> bool:
+    return sheet_sync_scheduler.start()
+
+
+def stop_sheet_sync_scheduler() -> None:
+    sheet_sync_scheduler.stop()
+
+
+def main(argv: List[str] = None) -> None:
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Đồng bộ lịch trực từ Google Sheet định kỳ")
+    parser.add_argument("--once", action="store_true", help="Chạy 1 lượt rồi thoát")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_SECONDS, help="Giây giữa 2 lượt")
+    parser.add_argument("--fake", help="File JSON giả lập sheet (services/fake_sheets.py)")
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        os.environ["FAKE_SHEETS_FILE"] = args.fake
+        reset_sheets_service()
+
+    scheduler = SheetSyncScheduler(interval=args.interval)
+
+    if args.once:
+        start = time.perf_counter()
+        result = scheduler.run_once()
+        changes = 0 if result is None else result['total_writes']
+        print(f"[SYNC] Xong trong {time.perf_counter() - start:.2f}s: {changes} thay đổi")
+        return
+
+    scheduler.add_listener(
+        lambda result: print(f"[SYNC] ✓ {result['week_range']}: {result['total_writes']} thay đổi")
+    )
+    if not scheduler.start():
+        print("[SYNC] interval <= 0 - không chạy (đặt SHEET_SYNC_INTERVAL hoặc --interval)")
+        return
+    try:
+        while scheduler.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        scheduler.stop(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 # services/tai_san_service.py
 from core.supabase_client import supabase
 from core.db_retry import retry_standard, retry_patient, retry_critical
-from typing import List, Dict, Optional
-from datetime import datetime
+from core.query_cache import cached_query, invalidates
+from core.db_query import COUNT_EXACT, count_mode, execute_paged, apply_filters, any_of
+from typing import List, Dict, Optional, Tuple
+from utils.dates import parse_date_str
 
 
-@retry_standard
 def fetch_tai_san(
     search: str = "",
     page: int = 1,
@@ -13,40 +14,57 @@ def fetch_tai_san(
     trang_thai: str = ""
 ) -> List[Dict]:
     """Lấy danh sách Tài sản"""
+    data, _ = fetch_tai_san_page(
+        search=search, page=page, page_size=page_size,
+        trang_thai=trang_thai, count=None
+    )
+    return data
+
+
+@cached_query("tai_san")
+@retry_standard
+def fetch_tai_san_page(
+    search: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    trang_thai: str = "",
+    count: str = COUNT_EXACT
+) -> Tuple[List[Dict], int]:
+    """Lấy 1 trang Tài sản kèm tổng số"""
     query = supabase.table("tai_san").select(
         "id, ma_tai_san, ten_tai_san, so_luong, tinh_trang, "
-        "trang_thai, nguoi_muon, ngay_muon, ghi_chu, created_at"
+        "trang_thai, nguoi_muon, ngay_muon, ghi_chu, created_at",
+        count=count_mode(count)
     )
+    query = apply_filters(query, tai_san_filter_spec(search, trang_thai))
     
-    if search:
-        query = query.or_(f"ma_tai_san.ilike.%{search}%,ten_tai_san.ilike.%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai", trang_thai)
-    
-    start = (page - 1) * page_size
-    end = start + page_size - 1
-    
-    res = query.order("ma_tai_san").range(start, end).execute()
-    
-    return res.data or []
+    return execute_paged(query.order("ma_tai_san"), page, page_size)
 
 
+@cached_query("tai_san")
 @retry_standard
 def count_tai_san(search: str = "", trang_thai: str = "") -> int:
     """Đếm tổng số"""
     query = supabase.table("tai_san").select("id", count="exact")
-    
-    if search:
-        query = query.or_(f"ma_tai_san.ilike.%{search}%,ten_tai_san.ilike.%{search}%")
-    
-    if trang_thai:
-        query = query.eq("trang_thai", trang_thai)
+    query = apply_filters(query, tai_san_filter_spec(search, trang_thai))
     
     res = query.execute()
     return res.count or 0
 
 
+def tai_san_filter_spec(search: str = "", trang_thai: str = "") -> list:
+    """Bộ lọc danh sách Tài sản"""
+    spec = []
+    if search:
+        spec.append(any_of([
+            ("ma_tai_san", "contains", search),
+            ("ten_tai_san", "contains", search),
+        ]))
+    if trang_thai:
+        spec.append(("trang_thai", "eq", trang_thai))
+    return spec
+
+
 @retry_standard
 def get_tai_san_by_id(id: str) -> Optional[Dict]:
     """Lấy 1 tài sản theo ID"""
@@ -69,6 +87,7 @@ def get_tai_san_by_ma(ma_tai_san: str) -> Optional[Dict]:
     return res.data[0] if res.data else None
 
 
+@invalidates("tai_san")
 @retry_patient
 def create_tai_san(data: Dict) -> Dict:
     """Thêm tài sản mới"""
@@ -101,6 +120,7 @@ def create_tai_san(data: Dict) -> Dict:
         raise Exception(f"Lỗi tạo tài sản: {error_msg}")
 
 
+@invalidates("tai_san")
 @retry_patient
 def update_tai_san(id: str, data: Dict) -> Dict:
     """Cập nhật"""
@@ -117,6 +137,7 @@ def update_tai_san(id: str, data: Dict) -> Dict:
     return res.data[0]
 
 
+@invalidates("tai_san")
 @retry_critical
 def delete_tai_san(id: str) -> bool:
     """Xóa"""
@@ -128,6 +149,7 @@ def delete_tai_san(id: str) -> bool:
     return True
 
 
+@invalidates("tai_san")
 @retry_patient
 def bulk_update_tai_san(ids: List[str], data: Dict) -> int:
     """Cập nhật hàng loạt"""
@@ -213,16 +235,10 @@ def _validate_tai_san_data(data: Dict, is_create: bool = False) -> Dict:
     if "ngay_muon" in data and data["ngay_muon"]:
         value = str(data["ngay_muon"]).strip()
         if value:
-            try:
-                if "/" in value:
-                    parts = value.split("/")
-                    if len(parts) == 3:
-                        value = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                
-                datetime.strptime(value, "%Y-%m-%d")
-                validated["ngay_muon"] = value
-            except ValueError:
+            parsed = parse_date_str(value)
+            if not parsed:
                 raise ValueError(f"Ngày không hợp lệ: {value}")
+            validated["ngay_muon"] = parsed
     
     if is_create:
         validated.setdefault("so_luong", 1)
@@ -0,0 +1,307 @@
+# ui/data_loader.py
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from core.query_cache import query_cache, DEFAULT_TTL_SECONDS
+
+
+async def load_page_async(
+    fetch_page_fn: Callable,
+    filters: dict,
+    page: int,
+    page_size: int
+) -> Tuple[list, int]:
+    """
+    Lấy 1 trang + tổng số (fetch_*_page trả về cả hai trong 1 request)
+    trong thread pool để không chặn event loop của Flet.
+
+    Returns:
+        (rows, total)
+    """
+    return await asyncio.to_thread(
+        fetch_page_fn, page=page, page_size=page_size, **filters
+    )
+
+
+PROGRESS_MIN_INTERVAL = 0.5
+
+
+def loop_progress(
+    callback: Callable[[int, Optional[int]], None],
+    min_interval: float = PROGRESS_MIN_INTERVAL
+) -> Callable[[int, Optional[int]], None]:
+    """
+    Bọc callback tiến độ để gọi từ worker thread (asyncio.to_thread):
+    chuyển về event loop của Flet bằng call_soon_threadsafe, bỏ bớt các lần gọi
+    dày hơn min_interval (lần cuối done == total luôn được gửi).
+    Phải tạo trong coroutine đang chạy trên loop.
+    """
+    loop = asyncio.get_running_loop()
+    last_sent = [0.0]
+
+    def report(done: int, total: Optional[int]) -> None:
+        now = time.monotonic()
+        if now - last_sent[0] < min_interval and done != total:
+            return
+        last_sent[0] = now
+        loop.call_soon_threadsafe(callback, done, total)
+
+    return report
+
+
+def _snapshot(filters: dict) -> dict:
+    """Chụp lại bộ lọc - state của tab có thể sửa set/list tại chỗ"""
+    return {
+        k: (type(v)(v) if isinstance(v, (set, list)) else v)
+        for k, v in filters.items()
+    }
+
+
+def _filters_key(filters: dict) -> tuple:
+    items = []
+    for k, v in filters.items():
+        if isinstance(v, (set, frozenset)):
+            v = tuple(sorted(v))
+        elif isinstance(v, list):
+            v = tuple(v)
+        items.append((k, v))
+    return tuple(sorted(items))
+
+
+def _consume_error(task: asyncio.Task) -> None:
+    # Prefetch lỗi thì thôi, trang đó sẽ được tải lại khi thật sự cần
+    if not task.cancelled():
+        task.exception()
+
+
+def _failed(task: asyncio.Task) -> bool:
+    return task.done() and (task.cancelled() or task.exception() is not None)
+
+
+class PagePrefetcher:
+    """
+    Tải trang cho các tab danh sách, kèm prefetch trang kề.
+    - Sau khi trang N hiển thị: tải nền trang N+1 (và N-1)
+    - prev/next lấy ngay từ buffer, hoặc chờ request prefetch đang chạy
+    - Đổi bộ lọc / có ghi dữ liệu -> hủy prefetch cũ, bỏ buffer
+    - Trang trong buffer quá `ttl` giây (như query_cache) -> tải lại, thấy thay đổi từ máy khác
+    - Chỉ kết quả của lần load() mới nhất được trả về
+    """
+
+    def __init__(
+        self,
+        fetch_page_fn: Callable,
+        page_size: int,
+        prefetch_prev: bool = True,
+        ttl: float = DEFAULT_TTL_SECONDS
+    ):
+        self.fetch_page_fn = fetch_page_fn
+        self.page_size = page_size
+        self.prefetch_prev = prefetch_prev
+        self.ttl = ttl
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._started: Dict[int, float] = {}
+        self._key: Optional[tuple] = None
+        self._generation: Optional[int] = None
+        self._current: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        """Hủy mọi prefetch đang chạy và xóa buffer"""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._started.clear()
+
+    def _sync(self, filters: dict) -> None:
+        key = _filters_key(filters)
+        generation = query_cache.invalidations
+        if key != self._key or generation != self._generation:
+            self.reset()
+            self._key = key
+            self._generation = generation
+            return
+
+        deadline = time.monotonic() - self.ttl
+        for p in [p for p, started in self._started.items() if started < deadline]:
+            self._started.pop(p)
+            self._tasks.pop(p).cancel()
+
+    def _fetch(self, filters: dict, page: int) -> asyncio.Task:
+        task = asyncio.create_task(load_page_async(
+            self.fetch_page_fn, _snapshot(filters), page=page, page_size=self.page_size,
+        ))
+        task.add_done_callback(_consume_error)
+        return task
+
+    async def load(self, filters: dict, page: int) -> Optional[Tuple[list, int]]:
+        """
+        Lấy trang `page` - ưu tiên buffer prefetch.
+        Mỗi lần load() mới sẽ hủy request trước đó (latest-wins):
+        request bị thay thế trả về None, caller bỏ qua không render.
+        """
+        self._sync(filters)
+        if self._current is not None:
+            self._current.cancel()
+
+        task = self._tasks.pop(page, None)
+        self._started.pop(page, None)
+        prefetched = task is not None and not _failed(task)
+        if not prefetched:
+            task = self._fetch(filters, page)
+
+        self._current = task
+        await asyncio.wait({task})
+        if task is not self._current:
+            return None
+
+        # Prefetch lỗi -> tải lại một lần như request thường
+        if prefetched and _failed(task):
+            task = self._current = self._fetch(filters, page)
+            await asyncio.wait({task})
+            if task is not self._current:
+                return None
+
+        self._current = None
+        if task.cancelled():
+            return None
+        return task.result()
+
+    def prefetch_around(self, filters: dict, page: int, total: int) -> None:
+        """Lên lịch tải nền các trang kề trang vừa hiển thị"""
+        self._sync(filters)
+
+        wanted = []
+        if page * self.page_size < total:
+            wanted.append(page + 1)
+        if self.prefetch_prev and page > 1:
+            wanted.append(page - 1)
+
+        for p in list(self._tasks):
+            if p not in wanted:
+                self._started.pop(p)
+                self._tasks.pop(p).cancel()
+
+        for p in wanted:
+            if p not in self._tasks:
+                self._tasks[p] = self._fetch(filters, p)
+                self._started[p] = time.monotonic()
+
+
+SEARCH_DEBOUNCE_SECONDS = 0.4
+
+
+class Debouncer:
+    """
+    Gom sự kiện gõ phím của ô tìm kiếm / lọc: callback chỉ chạy khi người dùng
+    ngừng gõ `delay` giây. Enter (flush) chạy ngay và hủy lần chờ đang treo.
+    """
+
+    def __init__(self, page, callback: Callable, delay: float = SEARCH_DEBOUNCE_SECONDS):
+        self.page = page
+        self.callback = callback
+        self.delay = delay
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __call__(self, e=None) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.cancel()
+            self._pending = self.page.run_task(self._fire, e)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.cancel()
+                self._pending = None
+
+    def flush(self, e=None) -> None:
+        self.cancel()
+        self.callback(e)
+
+    async def _fire(self, e) -> None:
+        await asyncio.sleep(self.delay)
+        with self._lock:
+            self._pending = None
+        self.callback(e)
+
+
+class WindowPrefetcher:
+    """
+    Cache theo khóa (VD thứ 2 của tuần) cho các view duyệt theo cửa sổ, kèm prefetch cửa sổ kề.
+    - load(key): lấy từ buffer / request prefetch đang chạy, nếu chưa có thì tải
+    - prefetch(keys): tải nền các cửa sổ kề, bỏ các cửa sổ không còn cần
+    - Có ghi dữ liệu (query_cache bị invalidate) -> bỏ toàn bộ buffer
+    - Cửa sổ trong buffer quá `ttl` giây -> tải lại như PagePrefetcher
+    """
+
+    def __init__(self, fetch_fn: Callable, max_entries: int = 8, ttl: float = DEFAULT_TTL_SECONDS):
+        self.fetch_fn = fetch_fn
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tasks: Dict[object, asyncio.Task] = {}
+        self._started: Dict[object, float] = {}
+        self._generation: Optional[int] = None
+        self._current: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._started.clear()
+
+    def _sync(self) -> None:
+        generation = query_cache.invalidations
+        if generation != self._generation:
+            self.reset()
+            self._generation = generation
+            return
+
+        deadline = time.monotonic() - self.ttl
+        for key in [key for key, started in self._started.items() if started < deadline]:
+            self._started.pop(key)
+            self._tasks.pop(key).cancel()
+
+    def _fetch(self, key) -> asyncio.Task:
+        task = asyncio.create_task(asyncio.to_thread(self.fetch_fn, key))
+        task.add_done_callback(_consume_error)
+        return task
+
+    def _remember(self, key, task: asyncio.Task) -> None:
+        if self._tasks.pop(key, None) is not task:
+            self._started[key] = time.monotonic()
+        self._tasks[key] = task
+        while len(self._tasks) > self.max_entries:
+            oldest = next(iter(self._tasks))
+            self._started.pop(oldest)
+            self._tasks.pop(oldest).cancel()
+
+    async def load(self, key):
+        """Dữ liệu của cửa sổ `key`; None nếu đã có lần load() mới hơn (latest-wins)"""
+        self._sync()
+        task = self._tasks.get(key)
+        if task is None or _failed(task):
+            task = self._fetch(key)
+        self._remember(key, task)
+
+        self._current = task
+        await asyncio.wait({task})
+        if task is not self._current:
+            return None
+
+        self._current = None
+        if task.cancelled():
+            return None
+        if task.exception() is not None and self._tasks.get(key) is task:
+            self._tasks.pop(key)
+            self._started.pop(key)
+        return task.result()
+
+    def prefetch(self, keys) -> None:
+        """Tải nền các cửa sổ trong `keys` (đã có trong buffer thì bỏ qua)"""
+        self._sync()
+        for key in keys:
+            task = self._tasks.get(key)
+            if task is None or _failed(task):
+                self._remember(key, self._fetch(key))
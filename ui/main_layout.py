@@ -2,6 +2,7 @@
 import flet as ft
 import asyncio
 from core.auth import is_admin, logout
+from services.sync_scheduler import start_sheet_sync_scheduler, stop_sheet_sync_scheduler
 from ui.tab_students import StudentsTab
 from ui.tab_classes import ClassesTab
 from ui.tab_staff import StaffTab
@@ -39,6 +40,10 @@ def MainLayout(page: ft.Page, role: str, current_version: str = "", github_repo:
 
     dialog_manager = DialogManager(page)
 
+    # Admin: đồng bộ lịch trực từ Google Sheet định kỳ ở nền (chỉ khi đặt SHEET_SYNC_INTERVAL > 0)
+    if is_admin(actual_role):
+        start_sheet_sync_scheduler()
+
     def show_profile_popup(e):
         try:
             dialog_content = ft.Container(width=850, height=600)
@@ -275,6 +280,7 @@ def MainLayout(page: ft.Page, role: str, current_version: str = "", github_repo:
     def handle_logout(e):
         dialog_manager.close_all_dialogs()
         
+        stop_sheet_sync_scheduler()
         logout()
         try:
             page.session.clear()
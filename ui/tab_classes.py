@@ -2,8 +2,7 @@
 import flet as ft
 import asyncio
 from services.classes_service import (
-    fetch_classes,
-    count_classes,
+    fetch_classes_page,
     update_class,
     bulk_update_classes,
     create_class,
@@ -12,6 +11,7 @@ from services.classes_service import (
 from core.auth import is_admin
 from ui.icon_helper import CustomIcon, elevated_button
 from ui.message_manager import MessageManager
+from ui.data_loader import PagePrefetcher, Debouncer, loop_progress
 
 PAGE_SIZE = 100
 
@@ -30,6 +30,7 @@ def ClassesTab(page: ft.Page, role: str):
         "is_loading": False,
         "active_dialog": None,
     }
+    pager = PagePrefetcher(fetch_classes_page, PAGE_SIZE)
 
     loading_indicator = ft.ProgressRing(visible=False, width=30, height=30)
     
@@ -98,9 +99,6 @@ def ClassesTab(page: ft.Page, role: str):
 
     async def load_data_async():
         """Load data async"""
-        if state["is_loading"]:
-            return
-        
         state["is_loading"] = True
         loading_indicator.visible = True
         page.update()
@@ -111,12 +109,10 @@ def ClassesTab(page: ft.Page, role: str):
                 "trang_thai": state["filter_trang_thai"],
             }
             
-            total = count_classes(**filters)
-            classes = fetch_classes(
-                page=state["page_index"],
-                page_size=PAGE_SIZE,
-                **filters
-            )
+            result = await pager.load(filters, state["page_index"])
+            if result is None:
+                return  # Đã có request mới hơn thay thế
+            classes, total = result
             
             state["total_records"] = total
             state["classes"] = classes
@@ -130,6 +126,7 @@ def ClassesTab(page: ft.Page, role: str):
             update_pagination()
             selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
             page.update()
+            pager.prefetch_around(filters, state["page_index"], total)
             
         except Exception as load_error:
             error_msg = str(load_error)
@@ -850,7 +847,13 @@ def ClassesTab(page: ft.Page, role: str):
                 with open(file_path, "rb") as f:
                     file_bytes = f.read()
 
-                imported_count, errors = import_students(file_bytes)
+                def on_progress(done, total):
+                    progress = f"{done}/{total}" if total else f"{done}"
+                    message_manager.info(f"Đang import... {progress} dòng")
+
+                imported_count, errors = await asyncio.to_thread(
+                    import_students, file_bytes, on_progress=loop_progress(on_progress)
+                )
 
                 await load_data_async()
                 update_pagination()
@@ -1226,12 +1229,9 @@ def ClassesTab(page: ft.Page, role: str):
         
         async def _export():
             try:
-                from utils.import_export import export_students
-                
-                excel_bytes = export_students(selected)
+                from utils.import_export import write_students_excel
                 
-                with open(save_path, "wb") as f:
-                    f.write(excel_bytes)
+                await asyncio.to_thread(write_students_excel, save_path, selected)
                 
                 file_size = os.path.getsize(save_path) / 1024
                 
@@ -1327,12 +1327,14 @@ def ClassesTab(page: ft.Page, role: str):
         
         page.run_task(_export)
 
+    search_debouncer = Debouncer(page, on_search)
     search_field = ft.TextField(
         label="Tìm theo Chi đoàn",
         prefix_icon=ft.Icons.SEARCH,
         hint_text="VD: 76DCHT01",
         width=400,
-        on_submit=on_search,
+        on_change=search_debouncer,
+        on_submit=search_debouncer.flush,
     )
     
     filter_trang_thai_dropdown = ft.Dropdown(
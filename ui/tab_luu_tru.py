@@ -5,8 +5,7 @@ import threading
 import time
 from datetime import datetime
 from services.so_doan_service import (
-    fetch_so_doan,
-    count_so_doan,
+    fetch_so_doan_page,
     create_so_doan,
     update_so_doan,
     delete_so_doan,
@@ -14,8 +13,7 @@ from services.so_doan_service import (
     get_all_so_doan_for_export,
 )
 from services.tai_san_service import (
-    fetch_tai_san,
-    count_tai_san,
+    fetch_tai_san_page,
     create_tai_san,
     update_tai_san,
     delete_tai_san,
@@ -25,6 +23,7 @@ from services.tai_san_service import (
 from core.auth import is_admin
 from ui.icon_helper import CustomIcon, elevated_button
 from ui.message_manager import MessageManager
+from ui.data_loader import PagePrefetcher, Debouncer
 
 PAGE_SIZE = 100
 
@@ -48,6 +47,7 @@ def LuuTruTab(page: ft.Page, role: str):
             "is_loading": False,
             "active_dialog": None,
         }
+        pager = PagePrefetcher(fetch_so_doan_page, PAGE_SIZE)
         
         loading_indicator = ft.ProgressRing(visible=False, width=30, height=30)
         
@@ -118,25 +118,20 @@ def LuuTruTab(page: ft.Page, role: str):
                 pass
         
         async def load_data_async():
-            if state["is_loading"]:
-                return
-            
             state["is_loading"] = True
             loading_indicator.visible = True
             page.update()
             
             try:
-                total = count_so_doan(
-                    search=state["search_text"],
-                    trang_thai=state["filter_trang_thai"]
-                )
+                filters = {
+                    "search": state["search_text"],
+                    "trang_thai": state["filter_trang_thai"],
+                }
                 
-                records = fetch_so_doan(
-                    search=state["search_text"],
-                    trang_thai=state["filter_trang_thai"],
-                    page=state["page_index"],
-                    page_size=PAGE_SIZE
-                )
+                result = await pager.load(filters, state["page_index"])
+                if result is None:
+                    return  # Đã có request mới hơn thay thế
+                records, total = result
                 
                 state["total_records"] = total
                 state["records"] = records
@@ -150,6 +145,7 @@ def LuuTruTab(page: ft.Page, role: str):
                 update_pagination()
                 selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
                 page.update()
+                pager.prefetch_around(filters, state["page_index"], total)
                 
             except Exception as ex:
                 pagination_text.value = f"Lỗi: {ex}"
@@ -270,6 +266,7 @@ def LuuTruTab(page: ft.Page, role: str):
             state["page_index"] = 1
             state["selected_ids"].clear()
             
+            search_debouncer.cancel()
             search_field.value = ""
             filter_trang_thai_dropdown.value = ""
             select_all_checkbox.value = False
@@ -856,12 +853,14 @@ def LuuTruTab(page: ft.Page, role: str):
             show_dialog_safe(dialog)
         
         # ===================== UI LAYOUT =====================
+        search_debouncer = Debouncer(page, on_search)
         search_field = ft.TextField(
             label="Tìm theo họ tên / quê quán",
             prefix=CustomIcon.prefix_icon(CustomIcon.SEARCH),
             hint_text="Nhập từ khóa...",
             width=400,
-            on_submit=on_search,
+            on_change=search_debouncer,
+            on_submit=search_debouncer.flush,
         )
         
         filter_trang_thai_dropdown = ft.Dropdown(
@@ -954,6 +953,7 @@ def LuuTruTab(page: ft.Page, role: str):
             "is_loading": False,
             "active_dialog": None,
         }
+        pager = PagePrefetcher(fetch_tai_san_page, PAGE_SIZE)
         
         # Message manager for inline dialog/messages
         message_manager = MessageManager(page)
@@ -1049,24 +1049,21 @@ def LuuTruTab(page: ft.Page, role: str):
         
         # ===================== DATA LOADING =====================
         async def load_data_async():
-            """Load data using asyncio.to_thread for blocking DB calls."""
-            if state["is_loading"]:
-                return
-
+            """Load data: 1 request lấy trang + tổng số qua pager (ưu tiên trang đã prefetch)."""
             state["is_loading"] = True
             loading_indicator.visible = True
             safe_update()
 
             try:
-                total = await asyncio.to_thread(count_tai_san,
-                                                 search=state["search_text"],
-                                                 trang_thai=state["filter_trang_thai"])
+                filters = {
+                    "search": state["search_text"],
+                    "trang_thai": state["filter_trang_thai"],
+                }
 
-                records = await asyncio.to_thread(fetch_tai_san,
-                                                   search=state["search_text"],
-                                                   trang_thai=state["filter_trang_thai"],
-                                                   page=state["page_index"],
-                                                   page_size=PAGE_SIZE)
+                result = await pager.load(filters, state["page_index"])
+                if result is None:
+                    return  # Đã có request mới hơn thay thế
+                records, total = result
 
                 state["total_records"] = total
                 state["records"] = records
@@ -1083,6 +1080,7 @@ def LuuTruTab(page: ft.Page, role: str):
 
                 selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
                 page.update()
+                pager.prefetch_around(filters, state["page_index"], total)
 
             except Exception as ex:
                 pagination_text.value = f"⚠️ Lỗi: {ex}"
@@ -1207,6 +1205,7 @@ def LuuTruTab(page: ft.Page, role: str):
             state["page_index"] = 1
             state["selected_ids"].clear()
             
+            search_debouncer.cancel()
             search_field.value = ""
             filter_trang_thai_dropdown.value = ""
             select_all_checkbox.value = False
@@ -1718,12 +1717,14 @@ def LuuTruTab(page: ft.Page, role: str):
             show_dialog_safe(dialog)
         
         # ===================== UI LAYOUT - TÀI SẢN =====================
+        search_debouncer = Debouncer(page, on_search)
         search_field = ft.TextField(
             label="Tìm theo mã / tên tài sản",
             prefix=CustomIcon.prefix_icon(CustomIcon.SEARCH),
             hint_text="Nhập từ khóa...",
             width=400,
-            on_submit=on_search,
+            on_change=search_debouncer,
+            on_submit=search_debouncer.flush,
         )
         
         filter_trang_thai_dropdown = ft.Dropdown(
@@ -5,22 +5,27 @@ import asyncio
 from datetime import datetime, timedelta
 from services.noi_bo_service import (
     fetch_can_bo_bvp_bch,
-    count_can_bo_bvp_bch,
+    fetch_can_bo_bvp_bch_page,
     create_can_bo,
     update_can_bo,
     delete_can_bo,
     fetch_lich_truc,
-    count_lich_truc,
+    fetch_lich_truc_page,
     create_lich_truc,
     update_lich_truc,
+    delete_lich_truc,
     bulk_confirm_lich_truc,
     fetch_thong_ke_thang,
     get_thong_ke_tong_quan,
+    fetch_thong_ke_truc,
+    normalize_ho_ten,
 )
 from services.sync_google_sheet import sync_full_week
+from services.sync_scheduler import sheet_sync_scheduler
 from core.auth import is_admin
 from ui.icon_helper import CustomIcon, elevated_button
 from ui.message_manager import MessageManager
+from ui.data_loader import PagePrefetcher, WindowPrefetcher, Debouncer
 
 PAGE_SIZE = 100
 
@@ -104,6 +109,7 @@ def NoiBoTab(page: ft.Page, role: str):
             "is_loading": False,
             "active_dialog": None,
         }
+        pager = PagePrefetcher(fetch_can_bo_bvp_bch_page, PAGE_SIZE)
         
         loading_indicator = ft.ProgressRing(visible=False, width=30, height=30)
         
@@ -169,25 +175,20 @@ def NoiBoTab(page: ft.Page, role: str):
         
         # ===================== DATA LOADING =====================
         async def load_data_async():
-            if state["is_loading"]:
-                return
-            
             state["is_loading"] = True
             loading_indicator.visible = True
             page.update()
             
             try:
-                total = count_can_bo_bvp_bch(
-                    loai=state["filter_loai"],
-                    search=state["search_text"]
-                )
+                filters = {
+                    "loai": state["filter_loai"],
+                    "search": state["search_text"],
+                }
                 
-                can_bo = fetch_can_bo_bvp_bch(
-                    loai=state["filter_loai"],
-                    search=state["search_text"],
-                    page=state["page_index"],
-                    page_size=PAGE_SIZE
-                )
+                result = await pager.load(filters, state["page_index"])
+                if result is None:
+                    return  # Đã có request mới hơn thay thế
+                can_bo, total = result
                 
                 can_bo = sort_can_bo(can_bo)
                 
@@ -203,6 +204,7 @@ def NoiBoTab(page: ft.Page, role: str):
                 update_pagination()
                 selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
                 page.update()
+                pager.prefetch_around(filters, state["page_index"], total)
             
             except Exception as ex:
                 pagination_text.value = f"⚠️ Lỗi: {str(ex)}"
@@ -310,14 +312,14 @@ def NoiBoTab(page: ft.Page, role: str):
                 state["page_index"] -= 1
                 state["selected_ids"].clear()
                 select_all_checkbox.value = False
-                load_data_async()
+                page.run_task(load_data_async)
         
         def next_page(e):
             if state["page_index"] * PAGE_SIZE < state["total_records"]:
                 state["page_index"] += 1
                 state["selected_ids"].clear()
                 select_all_checkbox.value = False
-                load_data_async()
+                page.run_task(load_data_async)
             
         # ===================== IMPORT/EXPORT =====================
         def import_excel_dialog(e):
@@ -1242,12 +1244,14 @@ def NoiBoTab(page: ft.Page, role: str):
             show_dialog_safe(dialog)
 
         # ===================== UI LAYOUT =====================
+        search_debouncer = Debouncer(page, on_search)
         search_field = ft.TextField(
             label="Tìm theo Họ tên / MSSV / SĐT",
             prefix=CustomIcon.prefix_icon(CustomIcon.SEARCH),
             hint_text="VD: Nguyễn Văn A",
             width=400,
-            on_submit=on_search,
+            on_change=search_debouncer,
+            on_submit=search_debouncer.flush,
         )
         
         filter_loai_dropdown = ft.Dropdown(
@@ -1355,6 +1359,7 @@ def NoiBoTab(page: ft.Page, role: str):
             "view_mode": "list",
             "current_week_offset": 0,
         }
+        pager = PagePrefetcher(fetch_lich_truc_page, PAGE_SIZE)
         
         loading_indicator = ft.ProgressRing(visible=False, width=30, height=30, color=ft.Colors.BLUE_600)
         
@@ -1439,6 +1444,17 @@ def NoiBoTab(page: ft.Page, role: str):
             
             return target_monday, target_sunday
         
+        def fetch_week_lich_truc(monday):
+            return fetch_lich_truc(
+                page=1,
+                page_size=200,
+                tu_ngay=monday.isoformat(),
+                den_ngay=(monday + timedelta(days=6)).isoformat(),
+            )
+        
+        # Lịch từng tuần + prefetch tuần trước / sau -> chuyển tuần không phải chờ mạng
+        week_loader = WindowPrefetcher(fetch_week_lich_truc)
+        
         # ===================== DIALOG MANAGEMENT =====================
         def show_dialog_safe(dialog):
             try:
@@ -1569,6 +1585,7 @@ def NoiBoTab(page: ft.Page, role: str):
                         _build_stat_box("Tổng ca", total, ft.Colors.BLUE_50, ft.Colors.BLUE_700),
                         _build_stat_box("Thành công", result['total_success'], ft.Colors.GREEN_50, ft.Colors.GREEN_700),
                         _build_stat_box("Lỗi", result['total_errors'], ft.Colors.RED_50, ft.Colors.RED_700),
+                        _build_stat_box("Không đổi", result.get('total_skipped', 0), ft.Colors.GREY_100, ft.Colors.GREY_700),
                     ], spacing=10),
                     
                     ft.Divider(height=10, color=ft.Colors.GREY_100),
@@ -1777,7 +1794,6 @@ def NoiBoTab(page: ft.Page, role: str):
         # ===================== DELETE LICH TRUC =====================
         def delete_lich_truc_record(lich_id: str, lich_info: dict = None):
             """Xóa một dòng lịch trực"""
-            from core.supabase_client import supabase
             
             async def do_delete(e):
                 delete_btn.disabled = True
@@ -1785,7 +1801,7 @@ def NoiBoTab(page: ft.Page, role: str):
                 page.update()
                 
                 try:
-                    supabase.table('lich_truc').delete().eq('id', lich_id).execute()
+                    await asyncio.to_thread(delete_lich_truc, lich_id)
                     
                     close_dialog_safe()
                     message_manager.success("Đã xóa lịch trực")
@@ -2185,9 +2201,6 @@ def NoiBoTab(page: ft.Page, role: str):
 
         # ===================== DATA LOADING =====================
         async def load_data_async():
-            if state["is_loading"]:
-                return
-            
             state["is_loading"] = True
             loading_indicator.visible = True
             page.update()
@@ -2200,12 +2213,10 @@ def NoiBoTab(page: ft.Page, role: str):
                     "den_ngay": state["den_ngay"],
                 }
                 
-                total = count_lich_truc(**filters)
-                lich_truc = fetch_lich_truc(
-                    page=state["page_index"],
-                    page_size=PAGE_SIZE,
-                    **filters
-                )
+                result = await pager.load(filters, state["page_index"])
+                if result is None:
+                    return  # Đã có request mới hơn thay thế
+                lich_truc, total = result
                 
                 state["total_records"] = total
                 state["lich_truc"] = lich_truc
@@ -2219,6 +2230,7 @@ def NoiBoTab(page: ft.Page, role: str):
                 update_pagination()
                 selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
                 page.update()
+                pager.prefetch_around(filters, state["page_index"], total)
             
             except Exception as ex:
                 pagination_text.value = f"⚠️ Lỗi: {str(ex)}"
@@ -2227,9 +2239,6 @@ def NoiBoTab(page: ft.Page, role: str):
                 page.update()
         
         async def load_week_view():
-            if state["is_loading"]:
-                return
-            
             state["is_loading"] = True
             loading_indicator.visible = True
             page.update()
@@ -2237,12 +2246,9 @@ def NoiBoTab(page: ft.Page, role: str):
             try:
                 monday, sunday = get_week_range(state["current_week_offset"])
                 
-                lich_truc = fetch_lich_truc(
-                    page=1,
-                    page_size=200,
-                    tu_ngay=monday.isoformat(),
-                    den_ngay=sunday.isoformat(),
-                )
+                lich_truc = await week_loader.load(monday)
+                if lich_truc is None:
+                    return  # Đã chuyển sang tuần khác
                 
                 state["is_loading"] = False
                 loading_indicator.visible = False
@@ -2254,6 +2260,8 @@ def NoiBoTab(page: ft.Page, role: str):
                 list_view_container.visible = False
                 
                 page.update()
+                
+                week_loader.prefetch([monday - timedelta(weeks=1), monday + timedelta(weeks=1)])
             
             except Exception as ex:
                 state["is_loading"] = False
@@ -2817,13 +2825,11 @@ def NoiBoTab(page: ft.Page, role: str):
                     return
                 
                 try:
-                    from core.supabase_client import supabase
-                    
                     count = 0
                     errors = []
                     for lich_id in state["selected_ids"]:
                         try:
-                            supabase.table('lich_truc').update(payload).eq('id', lich_id).execute()
+                            await asyncio.to_thread(update_lich_truc, lich_id, dict(payload))
                             count += 1
                         except Exception as update_ex:
                             errors.append(f"ID {lich_id}: {str(update_ex)}")
@@ -3042,6 +3048,20 @@ def NoiBoTab(page: ft.Page, role: str):
             sync_loading_overlay,
         ], expand=True)
         
+        async def _reload_after_background_sync():
+            if state["view_mode"] == "list":
+                await load_data_async()
+            else:
+                await load_week_view()
+        
+        def on_background_sync(sync_result):
+            # Gọi từ thread sync nền -> chỉ lên lịch reload trên event loop của Flet
+            if sync_result.get('total_writes', 0) > 0:
+                page.run_task(_reload_after_background_sync)
+        
+        # Cùng key -> tab được tạo lại thay listener của lần tạo trước
+        sheet_sync_scheduler.add_listener(on_background_sync, key="lich_truc_tab")
+        
         async def _delayed_load():
             await asyncio.sleep(0.2)
             await load_data_async()
@@ -3188,106 +3208,16 @@ def NoiBoTab(page: ft.Page, role: str):
                 try:
                     monday, sunday = get_week_range(state["current_week_offset"])
                     
-                    # ✅ 1. Fetch danh sách cán bộ (để lấy thông tin đơn vị, chức danh)
-                    can_bo_list = fetch_can_bo_bvp_bch(page_size=1000)
-                    can_bo_map = {}  # Map: normalized_name -> {ho_ten_display, roles[]}
-                    
-                    def normalize_name(name: str) -> str:
-                        """Normalize tên: lowercase + strip spaces + remove extra spaces"""
-                        import re
-                        name = name.strip().lower()
-                        # Remove multiple spaces
-                        name = re.sub(r'\s+', ' ', name)
-                        return name
-                    
-                    for cb in can_bo_list:
-                        ho_ten = cb.get('ho_ten', '').strip()
-                        if not ho_ten:
-                            continue
-                        
-                        loai = cb.get('loai_can_bo', '')
-                        chuc_vu = cb.get('chuc_vu', '')
-                        
-                        # ✅ LOGIC CỨNG DUY NHẤT: UV Ban Kiểm tra KHÔNG tính (skip)
-                        if chuc_vu == 'UV Ban Kiểm tra':
-                            continue
-                        
-                        # ✅ Normalize tên để group đúng người
-                        normalized = normalize_name(ho_ten)
-                        
-                        # ✅ Lưu tên display (ưu tiên tên đầu tiên gặp)
-                        if normalized not in can_bo_map:
-                            can_bo_map[normalized] = {
-                                'ho_ten_display': ho_ten,  # Tên gốc để hiển thị
-                                'roles': []
-                            }
-                        
-                        # ✅ Thêm role (loại + chức vụ)
-                        can_bo_map[normalized]['roles'].append({
-                            'loai_can_bo': loai,
-                            'chuc_vu': chuc_vu,
-                        })
-                    
-                    # ✅ 2. Fetch lịch trực trong tuần
-                    lich_truc = fetch_lich_truc(
-                        page=1,
-                        page_size=200,
-                        tu_ngay=monday.isoformat(),
-                        den_ngay=sunday.isoformat(),
-                    )
-                    
-                    # ✅ 3. Group by họ tên (normalized) và đếm số buổi
-                    stats = {}  # normalized_name -> {ho_ten_display, so_buoi, loai_can_bo[], chuc_vu[]}
-                    
-                    for lt in lich_truc:
-                        ho_ten = lt.get('ho_ten', '').strip()
-                        if not ho_ten:
-                            continue
-                        
-                        trang_thai = lt.get('trang_thai', '')
-                        if trang_thai not in ['Đã đăng ký', 'Đã trực']:
-                            continue
-                        
-                        normalized = normalize_name(ho_ten)
-                        
-                        if normalized not in stats:
-                            stats[normalized] = {
-                                'ho_ten_display': ho_ten,
-                                'so_buoi': 0,
-                                'loai_can_bo': [],
-                                'chuc_vu': [],
-                            }
-                        
-                        stats[normalized]['so_buoi'] += 1
-                    
-                    # ✅ 4. Enrichment: Thêm thông tin đơn vị, chức danh từ can_bo_map
-                    for normalized, stat in stats.items():
-                        if normalized in can_bo_map:
-                            cb_info = can_bo_map[normalized]
-                            
-                            # Update display name (ưu tiên từ database)
-                            if cb_info['ho_ten_display']:
-                                stat['ho_ten_display'] = cb_info['ho_ten_display']
-                            
-                            # ✅ THÊM TẤT CẢ CÁC ROLE (không filter gì cả)
-                            for role in cb_info['roles']:
-                                loai = role['loai_can_bo']
-                                chuc_vu = role['chuc_vu']
-                                
-                                if loai and loai not in stat['loai_can_bo']:
-                                    stat['loai_can_bo'].append(loai)
-                                if chuc_vu and chuc_vu not in stat['chuc_vu']:
-                                    stat['chuc_vu'].append(chuc_vu)
-                    
-                    # ✅ 5. Convert to list và sort
-                    week_stats = list(stats.values())
+                    # ✅ 1. Số buổi theo người từ rollup tuần (đã kèm loại cán bộ, chức vụ)
+                    week_stats = await asyncio.to_thread(fetch_thong_ke_truc, monday, sunday)
                     
-                    # ✅ 6. Tính tổng quan (cho overview cards)
+                    # ✅ 2. Tính tổng quan (cho overview cards)
                     bch_hoi_set = set()
                     bch_doan_set = set()
                     ban_vp_set = set()
                     
-                    for normalized, stat in stats.items():
+                    for stat in week_stats:
+                        normalized = normalize_ho_ten(stat['ho_ten_display'])
                         loai_list = stat['loai_can_bo']
                         
                         # ✅ Đếm theo từng loại riêng biệt (không filter)
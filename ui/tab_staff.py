@@ -2,8 +2,7 @@
 import flet as ft
 import asyncio
 from services.staff_service import (
-    fetch_staff_with_filters,
-    count_staff_with_filters,
+    fetch_staff_page,
     update_staff,
     bulk_update_staff,
     create_staff,
@@ -12,6 +11,7 @@ from services.staff_service import (
 from core.auth import is_admin
 from ui.icon_helper import CustomIcon, elevated_button
 from ui.message_manager import MessageManager
+from ui.data_loader import PagePrefetcher, Debouncer
 
 PAGE_SIZE = 100
 
@@ -90,6 +90,7 @@ def StaffTab(page: ft.Page, role: str):
         "is_loading": False,
         "active_dialog": None,
     }
+    pager = PagePrefetcher(fetch_staff_page, PAGE_SIZE)
 
     loading_indicator = ft.ProgressRing(visible=False, width=30, height=30)
     
@@ -172,27 +173,21 @@ def StaffTab(page: ft.Page, role: str):
 
     async def load_data_async():
         """Load dữ liệu async với sorting"""
-        if state["is_loading"]:
-            return
-        
         state["is_loading"] = True
         loading_indicator.visible = True
         page.update()
 
         try:
-            total = count_staff_with_filters(
-                search=state["search_text"],
-                lop=state["filter_lop"],
-                khoa=state["filter_khoa"]
-            )
+            filters = {
+                "search": state["search_text"],
+                "lop": state["filter_lop"],
+                "khoa": state["filter_khoa"],
+            }
             
-            staff = fetch_staff_with_filters(
-                search=state["search_text"],
-                lop=state["filter_lop"],
-                khoa=state["filter_khoa"],
-                page=state["page_index"],
-                page_size=PAGE_SIZE,
-            )
+            result = await pager.load(filters, state["page_index"])
+            if result is None:
+                return  # Đã có request mới hơn thay thế
+            staff, total = result
             
             staff = sort_staff_data(staff)
             
@@ -208,6 +203,7 @@ def StaffTab(page: ft.Page, role: str):
             update_pagination()
             selected_count_text.value = f"Đã chọn: {len(state['selected_ids'])}"
             page.update()
+            pager.prefetch_around(filters, state["page_index"], total)
             
         except Exception as load_error:
             error_msg = str(load_error)
@@ -328,8 +324,11 @@ def StaffTab(page: ft.Page, role: str):
         state["page_index"] = 1
         state["selected_ids"].clear()
         
+        search_debouncer.cancel()
         search_field.value = ""
+        lop_debouncer.cancel()
         filter_lop_field.value = ""
+        khoa_debouncer.cancel()
         filter_khoa_field.value = ""
         select_all_checkbox.value = False
         
@@ -1356,26 +1355,32 @@ def StaffTab(page: ft.Page, role: str):
         
         page.run_task(_export)
 
+    search_debouncer = Debouncer(page, on_search)
     search_field = ft.TextField(
         label="Tìm theo Họ tên / Lớp",
         prefix_icon=ft.Icons.SEARCH,
         hint_text="VD: Nguyễn Văn A hoặc 74DCHT22",
         width=420,
-        on_submit=on_search,
+        on_change=search_debouncer,
+        on_submit=search_debouncer.flush,
     )
     
+    lop_debouncer = Debouncer(page, on_filter_lop)
     filter_lop_field = ft.TextField(
         label="Lọc lớp",
         hint_text="74DCHT22",
         width=150,
-        on_submit=on_filter_lop
+        on_change=lop_debouncer,
+        on_submit=lop_debouncer.flush
     )
     
+    khoa_debouncer = Debouncer(page, on_filter_khoa)
     filter_khoa_field = ft.TextField(
         label="Lọc khoa",
         hint_text="CNTT",
         width=150,
-        on_submit=on_filter_khoa
+        on_change=khoa_debouncer,
+        on_submit=khoa_debouncer.flush
     )
 
     buttons = []
@@ -2,15 +2,16 @@
 import flet as ft
 import asyncio
 from services.students_service import (
-    fetch_students,
-    count_students,
+    fetch_students_page,
     bulk_update_students,
     update_student,
     delete_student,
 )
+from services.student_index import local_index_enabled, fetch_students_local
 from core.auth import is_admin
 from ui.icon_helper import CustomIcon, elevated_button
 from ui.message_manager import MessageManager
+from ui.data_loader import PagePrefetcher, Debouncer, loop_progress
 
 PAGE_SIZE = 100
 
@@ -31,6 +32,11 @@ def StudentsTab(page: ft.Page, role: str):
         "active_dialog": None,
         "filter_trang_thai": set(),
     }
+    # STUDENT_LOCAL_INDEX=1: tìm / lọc / phân trang trên bản sao cục bộ của bảng
+    pager = PagePrefetcher(
+        fetch_students_local if local_index_enabled() else fetch_students_page,
+        PAGE_SIZE
+    )
 
     loading_indicator = ft.ProgressRing(visible=False, width=30, height=30)
     
@@ -108,9 +114,6 @@ def StudentsTab(page: ft.Page, role: str):
 
     async def load_data_async():
         """Load data async"""
-        if state["is_loading"]:
-            return
-        
         state["is_loading"] = True
         loading_indicator.visible = True
         page.update()
@@ -123,12 +126,10 @@ def StudentsTab(page: ft.Page, role: str):
                 "trang_thai": state["filter_trang_thai"] or None,
             }
             
-            total = count_students(**filters)
-            students = fetch_students(
-                page=state["page_index"],
-                page_size=PAGE_SIZE,
-                **filters
-            )
+            result = await pager.load(filters, state["page_index"])
+            if result is None:
+                return  # Đã có request mới hơn thay thế
+            students, total = result
             
             state["total_records"] = total
             state["students"] = students
@@ -142,6 +143,7 @@ def StudentsTab(page: ft.Page, role: str):
             update_pagination()
             selected_count_text.value = f"Đã chọn: {len(state['selected_mssv'])}"
             page.update()
+            pager.prefetch_around(filters, state["page_index"], total)
             
         except Exception as ex:
             pagination_text.value = f"Lỗi: {ex}"
@@ -961,8 +963,11 @@ def StudentsTab(page: ft.Page, role: str):
         state["page_index"] = 1
         state["selected_mssv"].clear()
         message_manager.info("Đã xóa bộ lọc trạng thái")
+        search_debouncer.cancel()
         search_field.value = ""
+        lop_debouncer.cancel()
         filter_lop_field.value = ""
+        khoa_debouncer.cancel()
         filter_khoa_field.value = ""
         select_all_checkbox.value = False
         
@@ -1257,7 +1262,13 @@ def StudentsTab(page: ft.Page, role: str):
                 with open(file_path, "rb") as f:
                     file_bytes = f.read()
 
-                imported_count, errors = import_students(file_bytes)
+                def on_progress(done, total):
+                    progress = f"{done}/{total}" if total else f"{done}"
+                    message_manager.info(f"Đang import... {progress} dòng")
+
+                imported_count, errors = await asyncio.to_thread(
+                    import_students, file_bytes, on_progress=loop_progress(on_progress)
+                )
 
                 await load_data_async()
                 update_pagination()
@@ -1633,12 +1644,9 @@ def StudentsTab(page: ft.Page, role: str):
         
         async def _export():
             try:
-                from utils.import_export import export_students
+                from utils.import_export import write_students_excel
                 
-                excel_bytes = export_students(selected)
-                
-                with open(save_path, "wb") as f:
-                    f.write(excel_bytes)
+                await asyncio.to_thread(write_students_excel, save_path, selected)
                 
                 file_size = os.path.getsize(save_path) / 1024
                 
@@ -1734,12 +1742,14 @@ def StudentsTab(page: ft.Page, role: str):
         
         page.run_task(_export)
 
+    search_debouncer = Debouncer(page, on_search)
     search_field = ft.TextField(
         label="Tìm theo MSSV / Họ tên",
         prefix=CustomIcon.prefix_icon(CustomIcon.SEARCH),
         hint_text="VD: 74123456",
         width=400,
-        on_submit=on_search,
+        on_change=search_debouncer,
+        on_submit=search_debouncer.flush,
     )
     
     filter_trang_thai_btn = ft.IconButton(
@@ -1751,8 +1761,10 @@ def StudentsTab(page: ft.Page, role: str):
         icon_color=ft.Colors.BLUE_600 if not state["filter_trang_thai"] else ft.Colors.WHITE,
     )
 
-    filter_lop_field = ft.TextField(label="Lọc lớp", hint_text="74DCHT22", width=150, on_submit=on_filter_lop)
-    filter_khoa_field = ft.TextField(label="Lọc khoa", hint_text="CNTT", width=150, on_submit=on_filter_khoa)
+    lop_debouncer = Debouncer(page, on_filter_lop)
+    khoa_debouncer = Debouncer(page, on_filter_khoa)
+    filter_lop_field = ft.TextField(label="Lọc lớp", hint_text="74DCHT22", width=150, on_change=lop_debouncer, on_submit=lop_debouncer.flush)
+    filter_khoa_field = ft.TextField(label="Lọc khoa", hint_text="CNTT", width=150, on_change=khoa_debouncer, on_submit=khoa_debouncer.flush)
 
     buttons = []
     if is_admin(role):
@@ -4,4 +4,4 @@ Utils package for Doan-Hoi App
 Contains helper functions for import/export, validation, etc.
 """
 
-__all__ = ['import_export', 'can_bo_import_export', 'excel', 'validator']
+__all__ = ['import_export', 'can_bo_import_export', 'excel', 'dates', 'validator', 'text']
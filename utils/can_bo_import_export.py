@@ -3,12 +3,19 @@ import pandas as pd
 from io import BytesIO
 from datetime import datetime
 from typing import Tuple, List
+from core.query_cache import invalidates
+from utils.excel import normalize_frame, format_errors, TEXT
 
 def get_can_bo_by_id(can_bo_id: str) -> dict | None:
     """Lazy import để tránh circular dependency"""
     from services.noi_bo_service import get_can_bo_by_id as _get
     return _get(can_bo_id)
 
+def get_can_bo_by_ids(can_bo_ids: List[str], columns: str = "*") -> list[dict]:
+    """Lazy import - lấy cán bộ theo lô in_(), giữ thứ tự ID truyền vào"""
+    from core.db_batch import fetch_in_order
+    return fetch_in_order("can_bo_cap_truong", "id", can_bo_ids, columns)
+
 def get_can_bo_list(limit: int = 100, offset: int = 0) -> list[dict]:
     """Lazy import để tránh circular dependency"""
     from services.noi_bo_service import fetch_can_bo_bvp_bch
@@ -21,6 +28,27 @@ def get_supabase():
 
 
 # ===================== IMPORT EXCEL =====================
+VALID_LOAI_CAN_BO = ["Ban Văn phòng", "BCH Đoàn", "BCH Hội", "CTV Ban Văn phòng"]
+
+CAN_BO_IMPORT_COLUMNS = {
+    "ho_ten": (TEXT, ""),
+    "chuc_vu": (TEXT, ""),
+    "loai_can_bo": (TEXT, ""),
+    "mssv": (TEXT, ""),
+    "khoa_hoc": (TEXT, ""),
+    "sdt": (TEXT, ""),
+    "email": (TEXT, ""),
+    "nhiem_ky": (TEXT, ""),
+}
+
+CAN_BO_IMPORT_CHECKS = [
+    ("ho_ten", "Dòng {row}: Họ tên rỗng"),
+    ("chuc_vu", "Dòng {row} ({ho_ten}): Chức vụ rỗng"),
+    (lambda f: ~f["loai_can_bo"].isin(VALID_LOAI_CAN_BO), "Dòng {row} ({ho_ten}): Loại cán bộ không hợp lệ"),
+]
+
+
+@invalidates("can_bo_cap_truong")
 def import_can_bo(
     file_bytes: bytes, 
     user_id: str = None, 
@@ -66,43 +94,19 @@ def import_can_bo(
         
         print(f"📂 [IMPORT_CB] Processing {len(df)} rows...")
         
-        # Process each row
-        for idx, row in df.iterrows():
-            row_num = idx + 2  # Excel row number (header = 1, data starts at 2)
-            
+        # Làm sạch + kiểm tra theo cột cho cả file
+        records, error_table = normalize_frame(df, CAN_BO_IMPORT_COLUMNS, CAN_BO_IMPORT_CHECKS)
+        for error_msg in format_errors(error_table):
+            errors.append(error_msg)
+            print(f"❌ [IMPORT_CB] {error_msg}")
+        
+        for row_num, data in records:
             try:
-                # Validate họ tên
-                ho_ten = str(row.get("ho_ten", "")).strip()
-                if not ho_ten or pd.isna(row.get("ho_ten")):
-                    errors.append(f"Dòng {row_num}: Họ tên rỗng")
-                    continue
-                
-                # Validate chức vụ
-                chuc_vu = str(row.get("chuc_vu", "")).strip()
-                if not chuc_vu or pd.isna(row.get("chuc_vu")):
-                    errors.append(f"Dòng {row_num} ({ho_ten}): Chức vụ rỗng")
-                    continue
-                
-                # Validate loại cán bộ
-                loai_can_bo = str(row.get("loai_can_bo", "")).strip()
-                valid_loai = ["Ban Văn phòng", "BCH Đoàn", "BCH Hội", "CTV Ban Văn phòng"]
-                if loai_can_bo not in valid_loai:
-                    errors.append(f"Dòng {row_num} ({ho_ten}): Loại cán bộ không hợp lệ")
-                    continue
-                
-                # Build data dict
-                data = {
-                    "ho_ten": ho_ten,
-                    "chuc_vu": chuc_vu,
-                    "loai_can_bo": loai_can_bo,
-                    "mssv": str(row.get("mssv", "")).strip() if not pd.isna(row.get("mssv")) else "",
-                    "khoa_hoc": str(row.get("khoa_hoc", "")).strip() if not pd.isna(row.get("khoa_hoc")) else "",
-                    "sdt": str(row.get("sdt", "")).strip() if not pd.isna(row.get("sdt")) else "",
-                    "email": str(row.get("email", "")).strip() if not pd.isna(row.get("email")) else "",
-                    "nhiem_ky": str(row.get("nhiem_ky", "")).strip() if not pd.isna(row.get("nhiem_ky")) else "",
-                    "trang_thai": "Đang hoạt động",
-                    "created_at": datetime.now().isoformat(),
-                }
+                ho_ten = data["ho_ten"]
+                loai_can_bo = data["loai_can_bo"]
+                chuc_vu = data["chuc_vu"]
+                data["trang_thai"] = "Đang hoạt động"
+                data["created_at"] = datetime.now().isoformat()
                 
                 # Check if exists by (ho_ten + loai_can_bo + chuc_vu)
                 existing = supabase.table("can_bo_cap_truong")\
@@ -155,6 +159,18 @@ def import_can_bo(
 
 
 # ===================== EXPORT EXCEL =====================
+CAN_BO_EXPORT_COLUMNS = {
+    "loai_can_bo": "Loại cán bộ",
+    "chuc_vu": "Chức vụ",
+    "ho_ten": "Họ tên",
+    "mssv": "MSSV",
+    "khoa_hoc": "Khóa",
+    "sdt": "SĐT",
+    "email": "Email",
+    "nhiem_ky": "Nhiệm kỳ",
+}
+
+
 def export_can_bo(
     selected_ids: List[str] = None,
     user_id: str = None,
@@ -178,15 +194,8 @@ def export_can_bo(
         
         # Fetch data
         if selected_ids:
-            # Export selected
-            data = []
-            for cb_id in selected_ids:
-                result = supabase.table("can_bo_cap_truong")\
-                    .select("*")\
-                    .eq("id", cb_id)\
-                    .execute()
-                if result.data:
-                    data.append(result.data[0])
+            # Export selected (lô in_() chỉ các cột export, đúng thứ tự đã chọn)
+            data = get_can_bo_by_ids(selected_ids, "id, " + ", ".join(CAN_BO_EXPORT_COLUMNS))
         else:
             # Export all active
             result = supabase.table("can_bo_cap_truong")\
@@ -206,16 +215,7 @@ def export_can_bo(
         df = pd.DataFrame(data)
         
         # Reorder and rename columns
-        column_mapping = {
-            "loai_can_bo": "Loại cán bộ",
-            "chuc_vu": "Chức vụ",
-            "ho_ten": "Họ tên",
-            "mssv": "MSSV",
-            "khoa_hoc": "Khóa",
-            "sdt": "SĐT",
-            "email": "Email",
-            "nhiem_ky": "Nhiệm kỳ",
-        }
+        column_mapping = CAN_BO_EXPORT_COLUMNS
         
         # Select and rename columns
         available_cols = [col for col in column_mapping.keys() if col in df.columns]
@@ -0,0 +1,110 @@
+# utils/dates.py
+"""
+Chuyển đổi ngày dùng chung cho import / export / validate.
+- DB lưu 'YYYY-MM-DD', Excel / giao diện dùng 'dd/mm/yyyy'
+- Chuỗi: dd/mm/yyyy, dd-mm-yyyy, yyyy-mm-dd, yyyy/mm/dd (bỏ qua phần giờ hh:mm[:ss] phía sau, ký tự khác -> không hợp lệ)
+- Timestamp / datetime / date; số serial Excel chỉ khi ô là số (int / float), không nhận chuỗi "12345"
+"""
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+import pandas as pd
+
+
+DB_FORMAT = "%Y-%m-%d"
+DISPLAY_FORMAT = "%d/%m/%Y"
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_EXCEL_MAX_SERIAL = 2958465  # 31/12/9999
+_DATE_RE = re.compile(
+    r"^(\d{1,4})[/\-](\d{1,2})[/\-](\d{1,4})"
+    r"(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+\-]\d{2}:?\d{2})?)?$"
+)
+_DB_DATE_RE = r"^\d{4}-\d{2}-\d{2}"
+
+
+def _from_serial(serial: float) -> Optional[str]:
+    if 1 <= serial <= _EXCEL_MAX_SERIAL:
+        return (_EXCEL_EPOCH + timedelta(days=int(serial))).strftime(DB_FORMAT)
+    return None
+
+
+@lru_cache(maxsize=32768)
+def parse_date_str(text: str) -> Optional[str]:
+    """Chuỗi ngày -> 'YYYY-MM-DD', None nếu không đọc được (có cache - ngày sinh lặp lại nhiều)"""
+    text = text.strip()
+    if not text:
+        return None
+
+    match = _DATE_RE.match(text)
+    if not match:
+        return None
+
+    a, b, c = match.groups()
+    if len(a) == 4:
+        year, month, day = a, b, c
+    elif len(c) == 4:
+        day, month, year = a, b, c
+    else:
+        return None
+    try:
+        return date(int(year), int(month), int(day)).strftime(DB_FORMAT)
+    except ValueError:
+        return None
+
+
+def to_db_date(value) -> str:
+    """Một giá trị bất kỳ -> 'YYYY-MM-DD' ('' nếu trống / không đọc được)"""
+    if value is None or value is pd.NaT:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime(DB_FORMAT)
+    if isinstance(value, bool):
+        return ""
+    if isinstance(value, (int, float)):
+        if value != value:  # NaN
+            return ""
+        return _from_serial(value) or ""
+    return parse_date_str(str(value)) or ""
+
+
+def to_db_dates(s: pd.Series) -> Tuple[pd.Series, pd.Index]:
+    """
+    Chuyển cả cột sang 'YYYY-MM-DD' trong 1 lượt, mỗi giá trị khác nhau chỉ parse 1 lần.
+    Returns: (cột đã chuyển - ô trống / lỗi thành '', index các dòng có dữ liệu nhưng không đọc được)
+    """
+    missing = s.isna() | (s.astype(str).str.strip() == "")
+
+    if pd.api.types.is_datetime64_any_dtype(s):
+        converted = s.dt.strftime(DB_FORMAT)
+    elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        in_range = s.between(1, _EXCEL_MAX_SERIAL)
+        days = pd.to_timedelta(s.where(in_range).fillna(0).astype("int64"), unit="D")
+        converted = (pd.Timestamp(_EXCEL_EPOCH) + days).dt.strftime(DB_FORMAT).where(in_range)
+    else:
+        present = s[~missing]
+        mapping = {value: to_db_date(value) for value in pd.unique(present)}
+        converted = present.map(mapping)
+
+    converted = converted.reindex(s.index)
+    invalid = ~missing & (converted.isna() | (converted == ""))
+    return converted.where(~missing & ~invalid, "").astype(object), s.index[invalid]
+
+
+def to_display_date(value) -> str:
+    """Một ngày từ DB ('YYYY-MM-DD...') -> 'dd/mm/yyyy'; giá trị khác giữ nguyên, trống -> ''"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    text = str(value).strip()
+    if re.match(_DB_DATE_RE, text):
+        return f"{text[8:10]}/{text[5:7]}/{text[0:4]}"
+    return text
+
+
+def to_display_dates(s: pd.Series) -> pd.Series:
+    """Cột ngày từ DB ('YYYY-MM-DD...') -> 'dd/mm/yyyy'; giá trị khác giữ nguyên, trống -> ''"""
+    text = s.astype(str).str.strip()
+    is_db = text.str.match(_DB_DATE_RE)
+    display = text.str[8:10] + "/" + text.str[5:7] + "/" + text.str[0:4]
+    return display.where(is_db, text).where(s.notna(), "")
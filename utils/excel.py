@@ -1,6 +1,11 @@
 # utils/excel.py
+import queue
+import threading
+import zipfile
+import numpy as np
 import pandas as pd
 from io import BytesIO
+from typing import Iterable, Iterator, Optional
 
 def read_excel(file_bytes: bytes, sheet_name: str = 0) -> pd.DataFrame:
     """
@@ -9,6 +14,195 @@ def read_excel(file_bytes: bytes, sheet_name: str = 0) -> pd.DataFrame:
     return pd.read_excel(BytesIO(file_bytes), sheet_name=sheet_name)
 
 
+# ===================== ĐỌC EXCEL THEO LÔ =====================
+# openpyxl read-only: không nạp style / cả workbook, bộ nhớ không tăng theo số dòng
+EXCEL_CHUNK_ROWS = 1000
+EXCEL_READ_AHEAD = 2
+
+
+def _is_xlsx(file_bytes: bytes) -> bool:
+    return zipfile.is_zipfile(BytesIO(file_bytes))
+
+
+def count_excel_rows(file_bytes: bytes, sheet_name: str = 0) -> Optional[int]:
+    """Số dòng dữ liệu (trừ header) theo kích thước sheet lưu trong file - dùng cho tiến độ, None nếu không biết"""
+    if not _is_xlsx(file_bytes):
+        return None
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        return max(ws.max_row - 1, 0) if ws.max_row else None
+    finally:
+        wb.close()
+
+
+def iter_excel_chunks(
+    file_bytes: bytes,
+    chunk_size: int = EXCEL_CHUNK_ROWS,
+    sheet_name: str = 0
+) -> Iterator[pd.DataFrame]:
+    """
+    Đọc Excel theo lô `chunk_size` dòng, trả từng DataFrame ngay khi đọc xong.
+    - Dòng 1 là header
+    - index = dòng_excel - 2 (normalize_frame với row_offset=2 ra đúng số dòng Excel)
+    - Bỏ qua dòng trống hoàn toàn
+    - Sheet không có dữ liệu -> vẫn trả 1 DataFrame rỗng có header (để kiểm tra cột)
+    File .xls cũ (không phải xlsx) -> đọc bằng pandas rồi chia lô.
+    """
+    if not _is_xlsx(file_bytes):
+        df = pd.read_excel(BytesIO(file_bytes), sheet_name=sheet_name)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size].copy()
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+
+        header = next(rows, None) or ()
+        columns = [
+            str(name).strip() if name is not None else f"Unnamed: {i}"
+            for i, name in enumerate(header)
+        ]
+        width = len(columns)
+
+        records, index = [], []
+        yielded = False
+        for position, row in enumerate(rows):
+            if all(value is None or value == "" for value in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            records.append(row)
+            index.append(position)
+            if len(records) >= chunk_size:
+                yield pd.DataFrame.from_records(records, columns=columns, index=index)
+                yielded = True
+                records, index = [], []
+
+        if records or not yielded:
+            yield pd.DataFrame.from_records(records, columns=columns, index=index)
+    finally:
+        wb.close()
+
+
+def read_ahead(chunks: Iterable, depth: int = EXCEL_READ_AHEAD) -> Iterator:
+    """
+    Chạy iterator ở thread nền, giữ tối đa `depth` lô chờ xử lý:
+    lô sau được đọc trong khi lô trước đang ghi DB. Lỗi khi đọc được ném lại ở phía dùng.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put((chunk, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+            return
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        put((done, None))
+
+    threading.Thread(target=produce, name="excel-reader", daemon=True).start()
+    try:
+        while True:
+            chunk, error = buffer.get()
+            if chunk is done:
+                if error is not None:
+                    raise error
+                return
+            yield chunk
+    finally:
+        # Bên dùng dừng sớm (lỗi / break) -> thread đọc thoát, workbook được đóng
+        stop.set()
+
+
+# ===================== GHI EXCEL THEO LUỒNG =====================
+# openpyxl write-only: dòng được ghi dần ra file tạm, không dựng DataFrame / giữ cả bảng
+EXCEL_WIDTH_SAMPLE_ROWS = 1000
+EXCEL_MAX_COLUMN_WIDTH = 50
+
+
+def write_excel_stream(
+    rows: Iterable[dict],
+    target,
+    columns: dict,
+    sheet_name: str = "Data"
+) -> int:
+    """
+    Ghi các dòng (dict) ra Excel theo luồng.
+
+    Args:
+        rows: iterable/generator các dòng - đọc lần lượt, không giữ lại
+        target: đường dẫn file hoặc file-like (BytesIO)
+        columns: {khóa_trong_dòng: tiêu_đề_cột} theo thứ tự cột
+
+    Độ rộng cột tính dần theo tiêu đề + EXCEL_WIDTH_SAMPLE_ROWS dòng đầu
+    (sheet write-only phải khai báo độ rộng trước dòng đầu tiên).
+
+    Returns: số dòng dữ liệu đã ghi
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    keys = list(columns)
+    widths = [len(str(title)) for title in columns.values()]
+
+    rows = iter(rows)
+    head = []
+    for row in rows:
+        values = [row.get(key) for key in keys]
+        head.append(values)
+        widths = [max(width, len(str(value)) if value is not None else 0) for width, value in zip(widths, values)]
+        if len(head) >= EXCEL_WIDTH_SAMPLE_ROWS:
+            break
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(idx)].width = min(width + 2, EXCEL_MAX_COLUMN_WIDTH)
+
+    header = []
+    for title in columns.values():
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for values in head:
+        ws.append(values)
+        count += 1
+    for row in rows:
+        ws.append([row.get(key) for key in keys])
+        count += 1
+
+    wb.save(target)
+    return count
+
+
 def write_excel(data: list[dict], columns: list[str] = None) -> bytes:
     """
     Ghi dữ liệu ra Excel dạng bytes
@@ -46,3 +240,121 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
     df = df.where(pd.notnull(df), None)
     return df
+
+
+# ===================== CHUẨN HÓA DỮ LIỆU IMPORT =====================
+# Xử lý theo cột cho cả DataFrame (không iterrows / pd.isna từng ô)
+# Khai báo cột: {tên_cột: (kiểu, mặc_định)}
+#   kiểu: "text" | "int" | "float" | "bool" | hàm nhận Series trả Series
+#   mặc_định: giá trị khi ô trống / thiếu cột; None -> bỏ trường khỏi payload
+TEXT, INT, FLOAT, BOOL = "text", "int", "float", "bool"
+TRUE_VALUES = ["true", "yes", "có", "1", "x"]
+
+
+def _missing_column(df: pd.DataFrame) -> pd.Series:
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def text_series(s: pd.Series, default: str = "") -> pd.Series:
+    """NaN -> default, còn lại str + strip. Số nguyên đọc thành float (MSSV 2021.0) -> bỏ '.0'"""
+    missing = s.isna()
+    text = s.astype(str)
+    if pd.api.types.is_float_dtype(s):
+        # Từng giá trị qua int() của Python: không tràn int64 như astype("Int64")
+        whole = ~missing & (s % 1 == 0)
+        text = text.where(~whole, s[whole].map(lambda value: str(int(value))))
+    return text.str.strip().mask(missing, default)
+
+
+def number_series(s: pd.Series, default=0, integer: bool = False) -> pd.Series:
+    """Ép kiểu số, ô trống / sai định dạng -> default (integer: số lẻ như 3.5 cũng là sai định dạng)"""
+    numbers = pd.to_numeric(s, errors="coerce")
+    if integer:
+        numbers = numbers.where(numbers % 1 == 0)
+    numbers = numbers.fillna(default)
+    return numbers.astype("int64") if integer else numbers.astype("float64")
+
+
+def _to_bool(value) -> bool:
+    # Cùng quy tắc với parse_boolean (utils/import_export): số > 0 chỉ tính khi ô là số, không phải chuỗi
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return value > 0
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return False
+
+
+def bool_series(s: pd.Series) -> pd.Series:
+    """Giống parse_boolean: True, ô số > 0, chuỗi Có / x / 1 / true / yes; ô trống -> False"""
+    present = s[s.notna()]
+    mapping = {value: _to_bool(value) for value in pd.unique(present)}
+    return present.map(mapping).reindex(s.index, fill_value=False).astype(bool)
+
+
+def normalize_frame(
+    df: pd.DataFrame,
+    columns: dict,
+    checks: list = None,
+    row_offset: int = 2
+) -> tuple[list[tuple[int, dict]], pd.DataFrame]:
+    """
+    Làm sạch + ép kiểu + kiểm tra bắt buộc cho toàn bộ DataFrame.
+
+    checks: [(điều_kiện, thông_báo)] xét theo thứ tự, mỗi dòng chỉ báo lỗi đầu tiên
+        điều_kiện: tên cột (lỗi khi rỗng) hoặc hàm(frame_đã_làm_sạch) -> Series bool (True = lỗi)
+        thông_báo: chuỗi format theo giá trị dòng + {row} ("Dòng {row} (MSSV {mssv}): Họ tên rỗng")
+                   hoặc hàm(dict) -> str
+
+    Returns:
+        (records, errors) - records: [(dòng_excel, payload)], errors: DataFrame[row, error]
+    """
+    frame = pd.DataFrame(index=df.index)
+    for column, (kind, default) in columns.items():
+        s = df[column] if column in df.columns else _missing_column(df)
+        if kind == TEXT:
+            frame[column] = text_series(s, default)
+        elif kind == INT:
+            frame[column] = number_series(s, default, integer=True)
+        elif kind == FLOAT:
+            frame[column] = number_series(s, default)
+        elif kind == BOOL:
+            frame[column] = bool_series(s)
+        else:
+            frame[column] = kind(s)
+
+    invalid = pd.Series(False, index=frame.index)
+    error_rows, error_messages = [], []
+    for condition, message in checks or []:
+        if callable(condition):
+            failed = condition(frame).fillna(True).astype(bool)
+        else:
+            failed = frame[condition].isna() | (frame[condition].astype(str) == "")
+        failed &= ~invalid
+        invalid |= failed
+
+        for idx, values in frame[failed].to_dict("index").items():
+            values["row"] = idx + row_offset
+            error_rows.append(values["row"])
+            error_messages.append(message(values) if callable(message) else message.format(**values))
+
+    errors = pd.DataFrame({"row": error_rows, "error": error_messages})
+    errors = errors.sort_values("row", kind="stable").reset_index(drop=True)
+
+    valid = frame[~invalid]
+    omit = [c for c, (_, default) in columns.items() if default is None]
+    records = []
+    for idx, payload in zip(valid.index, valid.to_dict("records")):
+        for column in omit:
+            value = payload[column]
+            if value == "" or pd.isna(value):
+                del payload[column]
+        records.append((idx + row_offset, payload))
+
+    return records, errors
+
+
+def format_errors(errors: pd.DataFrame) -> list[str]:
+    """Bảng lỗi -> danh sách thông báo theo thứ tự dòng"""
+    return errors["error"].tolist()
@@ -1,20 +1,31 @@
 # utils/import_export.py - FIXED: Date format conversion
 import pandas as pd
 from io import BytesIO
+from itertools import chain
 from datetime import datetime
-from typing import Tuple, List
+from typing import Callable, Optional, Tuple, List
 from core.db_retry import retry_standard, retry_patient
+from utils.excel import (
+    normalize_frame, format_errors, TEXT, BOOL,
+    count_excel_rows, iter_excel_chunks, read_ahead, write_excel_stream
+)
+from utils.dates import to_db_date, to_db_dates, to_display_date
 
 # ✅ FIXED: Import đúng cách để tránh circular import
-def get_student_by_mssv(mssv: str) -> dict | None:
-    """Lazy import để tránh circular dependency"""
-    from services.students_service import get_student_by_mssv as _get
-    return _get(mssv)
+def get_students_by_mssv(mssv_list: List[str], columns: str = "*") -> list[dict]:
+    """Lazy import - lấy sinh viên theo lô in_(), giữ thứ tự MSSV truyền vào"""
+    from core.db_batch import fetch_in_order
+    return fetch_in_order("doan_vien_k74_k75", "mssv", mssv_list, columns)
 
-def get_students_list(limit: int = 100, offset: int = 0) -> list[dict]:
+def upsert_students(rows: list[tuple[int, dict]]) -> tuple[int, list[str]]:
     """Lazy import để tránh circular dependency"""
-    from services.students_service import get_students
-    return get_students(limit, offset)
+    from services.students_service import upsert_students as _upsert
+    return _upsert(rows)
+
+def iter_all_students(columns: str = "*"):
+    """Lazy import - duyệt toàn bộ sinh viên theo keyset MSSV"""
+    from core.db_batch import stream_table
+    return stream_table("doan_vien_k74_k75", columns, keys=("mssv",))
 
 def get_supabase():
     """Lazy import Supabase client"""
@@ -25,64 +36,48 @@ def get_supabase():
 # ===================== DATE CONVERSION =====================
 def convert_date_to_db_format(date_str: str) -> str:
     """
-    Convert date từ nhiều format sang YYYY-MM-DD
+    Convert date từ nhiều format sang YYYY-MM-DD (xem utils/dates.py)
     
     Hỗ trợ:
     - dd/mm/yyyy (Excel VN)
     - dd-mm-yyyy
     - yyyy-mm-dd (DB format)
-    - Excel datetime object
+    - Excel datetime object / số serial
     """
-    if not date_str or pd.isna(date_str):
-        return ""
-    
-    # Nếu là string rỗng
-    if isinstance(date_str, str) and not date_str.strip():
-        return ""
-    
-    # Nếu đã là datetime object từ pandas
-    if isinstance(date_str, (pd.Timestamp, datetime)):
-        return date_str.strftime("%Y-%m-%d")
-    
-    # Convert string
-    date_str = str(date_str).strip()
-    
-    # Đã đúng format YYYY-MM-DD
-    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
-        return date_str
-    
-    # Try parse dd/mm/yyyy
-    try:
-        dt = datetime.strptime(date_str, "%d/%m/%Y")
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-    
-    # Try parse dd-mm-yyyy
-    try:
-        dt = datetime.strptime(date_str, "%d-%m-%Y")
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-    
-    # Try parse yyyy/mm/dd
-    try:
-        dt = datetime.strptime(date_str, "%Y/%m/%d")
-        return dt.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-    
-    # Không parse được - return empty
-    print(f"⚠️ [DATE] Cannot parse: {date_str}")
-    return ""
+    result = to_db_date(date_str)
+    if not result and not pd.isna(date_str) and str(date_str).strip():
+        # Không parse được - return empty
+        print(f"⚠️ [DATE] Cannot parse: {date_str}")
+    return result
 
 
 # ===================== IMPORT EXCEL =====================
+STUDENT_IMPORT_COLUMNS = {
+    "mssv": (TEXT, ""),
+    "ho_ten": (TEXT, ""),
+    "ngay_sinh": (TEXT, ""),  # ✅ YYYY-MM-DD (đã convert cả cột bằng to_db_dates)
+    "noi_sinh": (TEXT, ""),
+    "lop": (TEXT, ""),
+    "khoa": (TEXT, ""),
+    "trang_thai_so": (TEXT, "Chưa tiếp nhận"),
+    "vi_tri_luu_so": (TEXT, ""),
+    "ghi_chu": (TEXT, ""),
+    "da_nop_doan_phi": (BOOL, False),
+    "da_nop_hoi_phi": (BOOL, False),
+}
+
+STUDENT_IMPORT_CHECKS = [
+    ("mssv", "Dòng {row}: MSSV rỗng"),
+    ("ho_ten", "Dòng {row} (MSSV {mssv}): Họ tên rỗng"),
+]
+
+
 @retry_patient
 def import_students(
     file_bytes: bytes, 
     user_id: str = None, 
-    user_email: str = None
+    user_email: str = None,
+    on_progress: Callable[[int, Optional[int]], None] = None
 ) -> Tuple[int, List[str]]:
     """
     Import sinh viên từ file Excel
@@ -91,9 +86,12 @@ def import_students(
         file_bytes: Nội dung file Excel dạng bytes
         user_id: ID người thực hiện import (để log)
         user_email: Email người thực hiện import (để log)
+        on_progress: gọi sau mỗi lô đã ghi - (số_dòng_đã_xử_lý, tổng_số_dòng | None)
     
     Returns:
-        (số_lượng_import_thành_công, danh_sách_lỗi)
+        (số_dòng_import_thành_công, danh_sách_lỗi)
+        Đếm theo dòng Excel: MSSV lặp lại ở nhiều dòng được đếm mỗi dòng 1 lần
+        (trong cùng lô hay khác lô đều vậy, dòng sau ghi đè dòng trước)
     
     Excel format yêu cầu:
         - MSSV (bắt buộc)
@@ -109,88 +107,53 @@ def import_students(
     """
     errors = []
     success_count = 0
-    supabase = get_supabase()
     
     try:
-        # Đọc Excel
-        df = pd.read_excel(BytesIO(file_bytes), sheet_name=0)
-        
-        # Clean column names
-        df.columns = df.columns.str.strip().str.lower()
-        
-        # Validate required columns
-        required_cols = ["mssv", "ho_ten"]
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            raise ValueError(f"Thiếu các cột bắt buộc: {', '.join(missing_cols)}")
+        # Đọc Excel theo lô (openpyxl read-only ở thread nền): lô đầu được ghi
+        # trong khi các lô sau còn đang đọc, bộ nhớ không tăng theo kích thước file
+        total_rows = count_excel_rows(file_bytes)
+        print(f"📂 [IMPORT] Processing {total_rows if total_rows is not None else '?'} rows...")
         
-        print(f"📂 [IMPORT] Processing {len(df)} rows...")
-        
-        # Process each row
-        for idx, row in df.iterrows():
-            row_num = idx + 2  # Excel row number (header = 1, data starts at 2)
+        for df in read_ahead(iter_excel_chunks(file_bytes)):
+            # Clean column names
+            df.columns = df.columns.str.strip().str.lower()
             
-            try:
-                # Validate MSSV
-                mssv = str(row.get("mssv", "")).strip()
-                if not mssv or pd.isna(row.get("mssv")):
-                    errors.append(f"Dòng {row_num}: MSSV rỗng")
-                    continue
-                
-                # Validate họ tên
-                ho_ten = str(row.get("ho_ten", "")).strip()
-                if not ho_ten or pd.isna(row.get("ho_ten")):
-                    errors.append(f"Dòng {row_num} (MSSV {mssv}): Họ tên rỗng")
-                    continue
-                
-                # ✅ Convert ngày sinh sang DB format
-                ngay_sinh_raw = row.get("ngay_sinh", "")
-                ngay_sinh = convert_date_to_db_format(ngay_sinh_raw)
-                
-                # Build data dict
-                data = {
-                    "mssv": mssv,
-                    "ho_ten": ho_ten,
-                    "ngay_sinh": ngay_sinh,  # ✅ Đã convert sang YYYY-MM-DD
-                    "noi_sinh": str(row.get("noi_sinh", "")).strip() if not pd.isna(row.get("noi_sinh")) else "",
-                    "lop": str(row.get("lop", "")).strip() if not pd.isna(row.get("lop")) else "",
-                    "khoa": str(row.get("khoa", "")).strip() if not pd.isna(row.get("khoa")) else "",
-                    "trang_thai_so": str(row.get("trang_thai_so", "Chưa tiếp nhận")).strip(),
-                    "vi_tri_luu_so": str(row.get("vi_tri_luu_so", "")).strip() if not pd.isna(row.get("vi_tri_luu_so")) else "",
-                    "ghi_chu": str(row.get("ghi_chu", "")).strip() if not pd.isna(row.get("ghi_chu")) else "",
-                }
-                
-                # Parse boolean fields
-                data["da_nop_doan_phi"] = parse_boolean(row.get("da_nop_doan_phi", False))
-                data["da_nop_hoi_phi"] = parse_boolean(row.get("da_nop_hoi_phi", False))
-                
-                # Check if student exists
-                existing = get_student_by_mssv(mssv)
-                
-                if existing:
-                    # Update existing student (exclude mssv and ho_ten)
-                    update_data = {k: v for k, v in data.items() if k not in ["mssv", "ho_ten"]}
-                    
-                    supabase.table("doan_vien_k74_k75")\
-                        .update(update_data)\
-                        .eq("mssv", mssv)\
-                        .execute()
-                    
-                    print(f"✅ [IMPORT] Updated: {mssv}")
-                else:
-                    # Insert new student
-                    supabase.table("doan_vien_k74_k75")\
-                        .insert(data)\
-                        .execute()
-                    
-                    print(f"✅ [IMPORT] Inserted: {mssv}")
-                
-                success_count += 1
-                
-            except Exception as e:
-                error_msg = f"Dòng {row_num} (MSSV {mssv if 'mssv' in locals() else '?'}): {str(e)}"
+            # Validate required columns
+            required_cols = ["mssv", "ho_ten"]
+            missing_cols = [col for col in required_cols if col not in df.columns]
+            if missing_cols:
+                raise ValueError(f"Thiếu các cột bắt buộc: {', '.join(missing_cols)}")
+            
+            if df.empty:
+                continue
+            
+            # Convert ngày sinh cả lô 1 lượt, ngày không đọc được -> báo lỗi, bỏ dòng đó
+            rows = df
+            if "ngay_sinh" in df.columns:
+                raw_dates = df["ngay_sinh"]
+                df["ngay_sinh"], bad_dates = to_db_dates(raw_dates)
+                for idx in bad_dates:
+                    error_msg = f"Dòng {idx + 2}: Không đọc được ngày sinh '{raw_dates[idx]}'"
+                    errors.append(error_msg)
+                    print(f"❌ [IMPORT] {error_msg}")
+                rows = df.drop(index=bad_dates)
+            
+            # Làm sạch + kiểm tra theo cột cho cả lô
+            pending_rows, error_table = normalize_frame(rows, STUDENT_IMPORT_COLUMNS, STUDENT_IMPORT_CHECKS)
+            for error_msg in format_errors(error_table):
                 errors.append(error_msg)
                 print(f"❌ [IMPORT] {error_msg}")
+            
+            # Ghi hàng loạt: 1 lượt in_() lấy MSSV đã có + các lô upsert
+            print(f"📤 [IMPORT] Upserting {len(pending_rows)} rows...")
+            written, write_errors = upsert_students(pending_rows)
+            success_count += written  # số dòng, không phải số MSSV khác nhau
+            errors.extend(write_errors)
+            for error_msg in write_errors:
+                print(f"❌ [IMPORT] {error_msg}")
+            
+            if on_progress:
+                on_progress(int(df.index[-1]) + 1, total_rows)
         
         # Log import activity
         if user_id or user_email:
@@ -226,126 +189,97 @@ def parse_boolean(value) -> bool:
 
 
 # ===================== EXPORT EXCEL =====================
+STUDENT_EXPORT_COLUMNS = {
+    "mssv": "MSSV",
+    "ho_ten": "Họ tên",
+    "ngay_sinh": "Ngày sinh",
+    "noi_sinh": "Nơi sinh",
+    "lop": "Lớp",
+    "khoa": "Khoa",
+    "trang_thai_so": "Trạng thái sổ",
+    "vi_tri_luu_so": "Vị trí lưu sổ",
+    "da_nop_doan_phi": "Đã nộp đoàn phí",
+    "da_nop_hoi_phi": "Đã nộp hội phí",
+    "ghi_chu": "Ghi chú",
+}
+
+
+def _format_export_row(student: dict) -> dict:
+    """Dòng DB -> dòng Excel: ngày dd/mm/yyyy, cờ đã nộp -> Có/Không"""
+    row = dict(student)
+    row["ngay_sinh"] = to_display_date(row.get("ngay_sinh"))
+    for col in ["da_nop_doan_phi", "da_nop_hoi_phi"]:
+        row[col] = "Có" if row.get(col) else "Không"
+    return row
+
+
 @retry_standard
-def export_students(
+def write_students_excel(
+    target,
     selected_mssv: List[str] = None,
     user_id: str = None,
     user_email: str = None
-) -> bytes:
+) -> int:
     """
-    Export sinh viên ra Excel
+    Export sinh viên ra Excel theo luồng: từng trang keyset (theo MSSV) được ghi
+    thẳng vào workbook write-only, bộ nhớ không tăng theo số sinh viên
     
     Args:
+        target: Đường dẫn file .xlsx (hoặc file-like) để ghi
         selected_mssv: Danh sách MSSV cần export (None = export tất cả)
         user_id: ID người thực hiện export (để log)
         user_email: Email người thực hiện export (để log)
     
     Returns:
-        bytes: Nội dung file Excel
+        int: Số sinh viên đã export
     """
     try:
         print(f"💾 [EXPORT] Starting... (selected: {len(selected_mssv) if selected_mssv else 'all'})")
         
         # Fetch data
+        columns = ", ".join(STUDENT_EXPORT_COLUMNS)
         if selected_mssv:
-            # Export selected students
-            data = []
-            for mssv in selected_mssv:
-                student = get_student_by_mssv(mssv)
-                if student:
-                    data.append(student)
+            # Export selected students (lô in_(), đúng thứ tự đã chọn)
+            students = iter(get_students_by_mssv(selected_mssv, columns))
         else:
-            # Export all students (in batches to avoid memory issues)
-            data = []
-            offset = 0
-            batch_size = 1000
-            
-            while True:
-                batch = get_students_list(limit=batch_size, offset=offset)
-                if not batch:
-                    break
-                data.extend(batch)
-                offset += batch_size
-                
-                if len(batch) < batch_size:
-                    break
+            # Export all students (keyset theo MSSV, 1 trang / lần)
+            students = iter_all_students(columns)
         
-        if not data:
+        first = next(students, None)
+        if first is None:
             raise ValueError("Không có dữ liệu để export")
         
-        print(f"💾 [EXPORT] Fetched {len(data)} records")
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # ✅ Convert ngày sinh về format dd/mm/yyyy cho Excel
-        if "ngay_sinh" in df.columns:
-            def format_date_for_excel(date_str):
-                if not date_str or pd.isna(date_str):
-                    return ""
-                try:
-                    # Parse YYYY-MM-DD
-                    dt = datetime.strptime(str(date_str).strip()[:10], "%Y-%m-%d")
-                    return dt.strftime("%d/%m/%Y")
-                except:
-                    return str(date_str)
-            
-            df["ngay_sinh"] = df["ngay_sinh"].apply(format_date_for_excel)
-        
-        # Reorder and rename columns
-        column_mapping = {
-            "mssv": "MSSV",
-            "ho_ten": "Họ tên",
-            "ngay_sinh": "Ngày sinh",
-            "noi_sinh": "Nơi sinh",
-            "lop": "Lớp",
-            "khoa": "Khoa",
-            "trang_thai_so": "Trạng thái sổ",
-            "vi_tri_luu_so": "Vị trí lưu sổ",
-            "da_nop_doan_phi": "Đã nộp đoàn phí",
-            "da_nop_hoi_phi": "Đã nộp hội phí",
-            "ghi_chu": "Ghi chú",
-        }
-        
-        # Select and rename columns
-        df = df[[col for col in column_mapping.keys() if col in df.columns]]
-        df.rename(columns=column_mapping, inplace=True)
-        
-        # Format boolean columns
-        for col in ["Đã nộp đoàn phí", "Đã nộp hội phí"]:
-            if col in df.columns:
-                df[col] = df[col].map(lambda x: "Có" if x else "Không")
-        
-        # Write to Excel
-        output = BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sinh viên')
-            
-            # Auto-adjust column width
-            worksheet = writer.sheets['Sinh viên']
-            for idx, col in enumerate(df.columns, 1):
-                max_length = max(
-                    df[col].astype(str).map(len).max(),
-                    len(str(col))
-                )
-                worksheet.column_dimensions[chr(64 + idx)].width = min(max_length + 2, 50)
+        rows = (_format_export_row(student) for student in chain([first], students))
+        count = write_excel_stream(rows, target, STUDENT_EXPORT_COLUMNS, sheet_name='Sinh viên')
         
         # Log export activity
         if user_id or user_email:
             try:
-                log_export_activity(user_id, user_email, len(data))
+                log_export_activity(user_id, user_email, count)
             except Exception as e:
                 print(f"⚠️ [EXPORT] Cannot log activity: {e}")
         
-        print(f"✅ [EXPORT] Done: {len(data)} records")
-        return output.getvalue()
+        print(f"✅ [EXPORT] Done: {count} records")
+        return count
         
     except Exception as e:
         print(f"❌ [EXPORT] Error: {e}")
         raise Exception(f"Lỗi export Excel: {str(e)}")
 
 
+def export_students(
+    selected_mssv: List[str] = None,
+    user_id: str = None,
+    user_email: str = None
+) -> bytes:
+    """
+    Export sinh viên ra Excel (nội dung file dạng bytes) - xem write_students_excel
+    """
+    output = BytesIO()
+    write_students_excel(output, selected_mssv, user_id, user_email)
+    return output.getvalue()
+
+
 # ===================== LOGGING (OPTIONAL) =====================
 def log_import_activity(user_id: str, user_email: str, success_count: int, error_count: int):
     """Log import activity to audit table"""
@@ -0,0 +1,33 @@
+# utils/text.py
+import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def fold_vietnamese(text: str) -> str:
+    """
+    Chuẩn hóa để so khớp không dấu: bỏ dấu, đ -> d, chữ thường, gộp khoảng trắng
+    VD: "  Nguyễn  Văn Đức " -> "nguyen van duc"
+    """
+    if not text:
+        return ""
+    text = str(text).replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(text.lower().split())
+
+
+def fold_tokens(text: str) -> tuple:
+    """Tách chuỗi đã bỏ dấu thành các từ: "Nguyễn Văn A" -> ("nguyen", "van", "a")"""
+    return tuple(fold_vietnamese(text).split())
+
+
+def tokens_match_prefix(query_tokens: tuple, tokens: tuple) -> bool:
+    """Mỗi từ trong query phải là tiền tố của một từ khác nhau trong tokens"""
+    if not query_tokens:
+        return True
+    first, rest = query_tokens[0], query_tokens[1:]
+    for i, token in enumerate(tokens):
+        if token.startswith(first) and tokens_match_prefix(rest, tokens[:i] + tokens[i + 1:]):
+            return True
+    return False